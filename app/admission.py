@@ -0,0 +1,101 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from app.config import (
+    ADMISSION_API_LIMIT,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_REDIRECT_LIMIT,
+    ADMISSION_RETRY_AFTER,
+)
+from app.metrics import Counter, Gauge, registry
+
+admission_in_flight = registry.register(
+    Gauge(
+        "admission_in_flight",
+        "Requests currently admitted to the database",
+        ["budget"],
+    )
+)
+admission_queue_depth = registry.register(
+    Gauge(
+        "admission_queue_depth",
+        "Requests waiting for admission to the database",
+        ["budget"],
+    )
+)
+admission_rejections = registry.register(
+    Counter(
+        "admission_rejections",
+        "Requests rejected with 503 after the admission queue timeout",
+        ["budget"],
+    )
+)
+
+
+class Overloaded(Exception):
+    """Запрос не дождался допуска к базе"""
+
+    def __init__(self, budget: str, retry_after: int):
+        super().__init__(f"Too many concurrent requests for '{budget}'")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Ограничение числа запросов, одновременно работающих с базой
+
+    Без ограничения запросы при всплеске трафика ждут соединения в пуле
+    SQLAlchemy, и задержка растёт до таймаута nginx. Здесь сверх limit
+    запросов ждут не дольше queue_timeout секунд, после чего получают
+    Overloaded и отвечают 503 с Retry-After. limit 0 снимает ограничение.
+    """
+
+    def __init__(
+        self, budget: str, limit: int, queue_timeout: float, retry_after: int = 1
+    ):
+        self.budget = budget
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max(limit, 1))
+        admission_in_flight.set(0, budget=budget)
+        admission_queue_depth.set(0, budget=budget)
+
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+
+        admission_queue_depth.inc(budget=self.budget)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except TimeoutError:
+            admission_rejections.inc(budget=self.budget)
+            raise Overloaded(self.budget, self.retry_after) from None
+        finally:
+            admission_queue_depth.dec(budget=self.budget)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Занять место на время работы с базой"""
+        if self.limit <= 0:
+            yield
+            return
+
+        await self._acquire()
+        admission_in_flight.inc(budget=self.budget)
+        try:
+            yield
+        finally:
+            admission_in_flight.dec(budget=self.budget)
+            self._semaphore.release()
+
+
+# Отдельные бюджеты, чтобы запросы списков /api/links не вытесняли редиректы
+redirect_admission = AdmissionLimiter(
+    "redirect", ADMISSION_REDIRECT_LIMIT, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
+api_admission = AdmissionLimiter(
+    "api", ADMISSION_API_LIMIT, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
@@ -1,27 +1,164 @@
+from collections.abc import Sequence
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
 
+from app.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    query_tag,
+    set_validators,
+    timestamp_tag,
+)
+from app.config import (
+    EXPORT_BATCH_SIZE,
+    IMPORT_BATCH_SIZE,
+    IMPORT_MAX_REPORTED_ISSUES,
+    LINKS_COUNT_MODE,
+)
 from app.dependencies import get_url_repository
-from app.dto import PaginationParams, URLCreate, URLResponse, URLUpdate
-from app.repository import URLRepositoryProtocol
+from app.dto import (
+    ImportReport,
+    KeysetCursor,
+    LinkFilter,
+    PaginationParams,
+    URLCreate,
+    URLResponse,
+    URLUpdate,
+    url_rows_to_json,
+)
+from app.exporter import EXPORT_FORMATS, export_csv, export_ndjson
+from app.importer import (
+    CSV_CONTENT_TYPES,
+    NDJSON_CONTENT_TYPES,
+    ImportRowError,
+    import_links,
+    iter_lines,
+)
+from app.repository import (
+    EXPORT_COLUMNS,
+    AsyncURLRepositoryProtocol,
+    ShortNameExistsError,
+)
 
 router = APIRouter()
 
 
 @router.get("/links", response_model=List[URLResponse])
 async def get_links(
+    request: Request,
     response: Response,
     range: str = Query(None, description="Pagination range in format [start,end]"),
-    repository: URLRepositoryProtocol = Depends(get_url_repository),
-) -> List[URLResponse]:
-    """Получает список ссылок с поддержкой пагинации"""
-    # Парсим параметры пагинации
+    cursor: str = Query(
+        None, description="Keyset pagination cursor, empty for the first page"
+    ),
+    filter: str = Query(
+        None,
+        description=(
+            'Filter as a JSON object: {"short_name": prefix, "original_url": '
+            'substring, "created_at_gte": from, "created_at_lte": to, "id": [ids]}'
+        ),
+    ),
+    original_url: str = Query(
+        None, description="Exact original URL, looked up by its digest index"
+    ),
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
+) -> Response:
+    """Получает список ссылок с поддержкой пагинации и фильтра
+
+    Валидатором служит версия таблицы ссылок вместе с хешем разобранных
+    параметров запроса: если таблица не менялась, клиент получает 304 без
+    чтения страницы. Параметры проверяются до сравнения валидаторов, поэтому
+    некорректный запрос получает 400, а не 304. Сброс счётчиков переходов
+    версию не меняет: click_count и last_accessed_at в ответе 304 могут
+    отставать до следующего изменения ссылок.
+
+    Страница читается кортежами столбцов и кодируется в JSON напрямую,
+    минуя создание и повторную проверку моделей URLResponse; response_model
+    описывает формат ответа в схеме OpenAPI.
+    """
+    # Парсим параметры пагинации и фильтр
     pagination = PaginationParams.from_range(range) if range else PaginationParams()
+    if pagination.limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid range '{range}': the page must not be empty",
+        )
+    try:
+        link_filter = LinkFilter.from_query(filter) if filter else None
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        ) from error
+    if original_url:
+        link_filter = (link_filter or LinkFilter()).model_copy(
+            update={"original_url_eq": original_url}
+        )
+    if link_filter is not None and link_filter.is_empty():
+        link_filter = None
+    after_id = None
+    if cursor:
+        try:
+            after_id = KeysetCursor.decode(cursor).last_id
+        except ValueError as error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+            ) from error
+
+    version = await repository.get_version()
+    if version is not None:
+        etag = make_etag(
+            "links",
+            version[0],
+            query_tag(
+                pagination.offset,
+                pagination.limit,
+                cursor is not None,
+                after_id,
+                link_filter.model_dump_json(exclude_none=True) if link_filter else "",
+            ),
+        )
+        if is_not_modified(request, etag, version[1]):
+            return not_modified_response(etag, version[1])
+        set_validators(response, etag, version[1])
+
+    # Keyset-пагинация: страница после курсора и курсор следующей страницы
+    if cursor is not None:
+        # Лишняя запись показывает, что за страницей есть продолжение
+        urls = await repository.get_after(
+            after_id, limit=pagination.limit + 1, link_filter=link_filter
+        )
+        if len(urls) > pagination.limit:
+            urls = urls[: pagination.limit]
+            next_cursor = KeysetCursor(last_id=urls[-1].id)
+            response.headers["X-Next-Cursor"] = next_cursor.encode()
+
+        return links_response(urls, response)
 
-    # Получаем данные с пагинацией
-    urls = repository.get_all(offset=pagination.offset, limit=pagination.limit)
-    total_count = repository.get_total_count()
+    # Получаем данные с пагинацией и общее количество в выбранном режиме.
+    # Кэш и оценка описывают всю таблицу, поэтому для отфильтрованного
+    # списка количество всегда точное
+    if link_filter is not None:
+        urls, total_count = await repository.get_page(
+            offset=pagination.offset, limit=pagination.limit, link_filter=link_filter
+        )
+    elif LINKS_COUNT_MODE == "cached":
+        urls = await repository.get_rows(
+            offset=pagination.offset, limit=pagination.limit
+        )
+        total_count = await repository.get_cached_count()
+    elif LINKS_COUNT_MODE == "estimate":
+        urls = await repository.get_rows(
+            offset=pagination.offset, limit=pagination.limit
+        )
+        total_count = await repository.get_estimated_count()
+    else:
+        urls, total_count = await repository.get_page(
+            offset=pagination.offset, limit=pagination.limit
+        )
 
     # Формируем заголовок Content-Range
     start = pagination.offset
@@ -36,79 +173,166 @@ async def get_links(
 
     response.headers["Content-Range"] = f"links {start}-{end}/{total_count}"
 
-    return [URLResponse.from_url(url) for url in urls]
+    return links_response(urls, response)
+
+
+def links_response(rows: Sequence[Row], response: Response) -> Response:
+    """Готовый JSON-ответ со списком ссылок и заголовками из response"""
+    return Response(
+        content=url_rows_to_json(rows),
+        media_type="application/json",
+        headers=response.headers,
+    )
+
+
+@router.get("/links/export")
+async def export_links(
+    format: str = Query("ndjson", description="Export format: ndjson or csv"),
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
+) -> StreamingResponse:
+    """Выгружает все ссылки потоком NDJSON или CSV
+
+    Строки читаются из серверного курсора и отправляются клиенту по мере
+    чтения, поэтому память не зависит от размера таблицы.
+    """
+    media_type = EXPORT_FORMATS.get(format)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format '{format}'",
+        )
+
+    encode = export_csv if format == "csv" else export_ndjson
+    columns = [column.name for column in EXPORT_COLUMNS]
+    return StreamingResponse(
+        encode(columns, repository.stream_all(batch_size=EXPORT_BATCH_SIZE)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="links.{format}"'},
+    )
 
 
 @router.get("/links/{link_id}", response_model=URLResponse)
 async def get_link(
-    link_id: int, repository: URLRepositoryProtocol = Depends(get_url_repository)
+    link_id: int,
+    request: Request,
+    response: Response,
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
 ) -> URLResponse:
-    """Получает данные ссылки по идентификатору"""
-    url = repository.get_by_id(link_id)
+    """Получает данные ссылки по идентификатору
+
+    Для условного запроса сначала читается только время изменения ссылки,
+    и если она не менялась, клиент получает 304.
+    """
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        updated_at = await repository.get_updated_at(link_id)
+        if updated_at is not None:
+            etag = make_etag(link_id, timestamp_tag(updated_at))
+            if is_not_modified(request, etag, updated_at):
+                return not_modified_response(etag, updated_at)
+
+    url = await repository.get_by_id(link_id)
     if not url:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Link with id {link_id} not found",
         )
 
+    set_validators(
+        response, make_etag(url.id, timestamp_tag(url.updated_at)), url.updated_at
+    )
     return URLResponse.from_url(url)
 
 
 @router.post("/links", response_model=URLResponse, status_code=status.HTTP_201_CREATED)
 async def create_link(
-    url_data: URLCreate, repository: URLRepositoryProtocol = Depends(get_url_repository)
+    url_data: URLCreate,
+    response: Response,
+    deduplicate: bool = Query(
+        False, description="Return an existing link with the same original_url"
+    ),
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
 ) -> URLResponse:
-    """Создает новую короткую ссылку"""
-    if not url_data.short_name:
+    """Создает новую короткую ссылку
+
+    Если short_name не передан, короткое имя генерируется на сервере.
+    С deduplicate=true и без short_name возвращается уже существующая
+    ссылка на тот же адрес с кодом 200 вместо создания дубликата.
+    """
+    try:
+        if deduplicate and not url_data.short_name:
+            created_url, created = await repository.get_or_create(url_data)
+            if not created:
+                response.status_code = status.HTTP_200_OK
+        else:
+            created_url = await repository.create(url_data)
+    except ShortNameExistsError as error:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Field 'short_name' is required",
-        )
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        ) from error
+
+    return URLResponse.from_url(created_url)
 
-    existing_url = repository.get_by_short_name(url_data.short_name)
-    if existing_url:
+
+@router.post("/links/import", response_model=ImportReport)
+async def bulk_import_links(
+    request: Request,
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
+) -> ImportReport:
+    """Массово импортирует ссылки из потока NDJSON или CSV
+
+    Тело читается построчно и загружается пакетами. Строки с занятыми
+    короткими именами и некорректные строки пропускаются и попадают в отчёт.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_CONTENT_TYPES + CSV_CONTENT_TYPES:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Short name '{url_data.short_name}' already exists",
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected NDJSON or CSV body",
         )
 
-    created_url = repository.create(url_data)
-    return URLResponse.from_url(created_url)
+    try:
+        return await import_links(
+            iter_lines(request.stream()),
+            content_type,
+            repository,
+            batch_size=IMPORT_BATCH_SIZE,
+            max_reported_issues=IMPORT_MAX_REPORTED_ISSUES,
+        )
+    except ImportRowError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        ) from error
 
 
 @router.put("/links/{link_id}", response_model=URLResponse)
 async def update_link(
     link_id: int,
     url_data: URLUpdate,
-    repository: URLRepositoryProtocol = Depends(get_url_repository),
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
 ) -> URLResponse:
     """Обновляет существующую ссылку"""
-    # Проверяем существование ссылки
-    existing_url = repository.get_by_id(link_id)
-    if not existing_url:
+    try:
+        updated_url = await repository.update(link_id, url_data)
+    except ShortNameExistsError as error:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Link with id {link_id} not found",
-        )
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        ) from error
 
-    # Проверяем, не занято ли новое короткое имя другой ссылкой
-    url_with_same_short_name = repository.get_by_short_name(url_data.short_name)
-    if url_with_same_short_name and url_with_same_short_name.id != link_id:
+    if not updated_url:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Short name '{url_data.short_name}' already exists",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Link with id {link_id} not found",
         )
 
-    updated_url = repository.update(link_id, url_data)
     return URLResponse.from_url(updated_url)
 
 
 @router.delete("/links/{link_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_link(
-    link_id: int, repository: URLRepositoryProtocol = Depends(get_url_repository)
+    link_id: int, repository: AsyncURLRepositoryProtocol = Depends(get_url_repository)
 ) -> None:
     """Удаляет ссылку"""
-    deleted = repository.delete(link_id)
+    deleted = await repository.delete(link_id)
     if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
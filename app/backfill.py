@@ -0,0 +1,66 @@
+"""Заполнение дайджеста original_url у старых строк: python -m app.backfill
+
+Новые и изменённые строки получают дайджест триггером, поэтому команду
+достаточно выполнить один раз после обновления схемы. Строки обновляются
+небольшими пакетами, каждый в своей транзакции, и команду можно прервать
+и запустить снова.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.database import AsyncSessionLocal, SessionFactory, async_engine
+from app.repository import AsyncURLRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_original_url_hashes(
+    session_factory: SessionFactory, batch_size: int, pause: float = 0
+) -> int:
+    """Обновлять пакеты, пока не останется строк без дайджеста
+
+    Между пакетами делается пауза в pause секунд, чтобы не мешать
+    рабочей нагрузке. Возвращает общее число обновлённых строк.
+    """
+    total = 0
+    while True:
+        async with session_factory() as session:
+            updated = await AsyncURLRepository(session).backfill_original_url_hashes(
+                batch_size
+            )
+        if not updated:
+            return total
+        total += updated
+        logger.info("Filled original_url digests for %d rows", total)
+        if pause:
+            await asyncio.sleep(pause)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.backfill", description="Fill original_url digests"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--pause", type=float, default=0.1, help="seconds to sleep between batches"
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    try:
+        total = await backfill_original_url_hashes(
+            AsyncSessionLocal, args.batch_size, args.pause
+        )
+    finally:
+        await async_engine.dispose()
+    logger.info("Done, %d rows updated", total)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,222 @@
+import hashlib
+import math
+from collections.abc import AsyncIterable, Callable, Iterable
+from dataclasses import dataclass
+
+from app.config import SHORT_NAME_FILTER_ERROR_RATE, SHORT_NAME_FILTER_MIN_CAPACITY
+from app.metrics import CallbackMetric, Sample, registry
+
+# Во сколько раз ёмкость фильтра при перестроении превышает число имён, чтобы
+# до следующего перестроения оставалось место для новых ссылок
+CAPACITY_HEADROOM = 2
+
+
+class BloomFilter:
+    """Фильтр Блума для строк
+
+    Отвечает, что строки точно нет или что она, возможно, есть. Размер
+    выбирается по ожидаемому числу строк и допустимой доле ложных
+    срабатываний. Индексы битов получаются двойным хешированием из одного
+    дайджеста BLAKE2b.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        if not 0 < error_rate < 1:
+            raise ValueError("Error rate must be between 0 and 1")
+
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(item)
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Размер битового массива в байтах"""
+        return len(self._bits)
+
+    def add(self, item: str) -> None:
+        """Добавить строку"""
+        for index in self._indexes(item):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]) -> None:
+        """Добавить несколько строк"""
+        for item in items:
+            self.add(item)
+
+    def false_positive_rate(self) -> float:
+        """Ожидаемая доля ложных срабатываний при текущем числе строк"""
+        return (
+            1 - math.exp(-self.hash_count * self.count / self.size)
+        ) ** self.hash_count
+
+    def _indexes(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+
+@dataclass
+class FilterStats:
+    """Счётчики проверок фильтра коротких имён
+
+    rejected — имени точно нет, passed — имя, возможно, есть,
+    false_positives — фильтр пропустил имя, которого не оказалось в базе.
+    """
+
+    rejected: int = 0
+    passed: int = 0
+    false_positives: int = 0
+
+    def false_positive_rate(self) -> float:
+        """Наблюдаемая доля ложных срабатываний среди отсутствующих имён"""
+        misses = self.rejected + self.false_positives
+        return self.false_positives / misses if misses else 0.0
+
+
+class ShortNameFilter:
+    """Фильтр всех существующих коротких имён для отсечения заведомых 404
+
+    Пока фильтр не построен, любое имя считается возможно существующим.
+    Удалённые и переименованные имена остаются в фильтре до следующего
+    перестроения, что даёт только лишние запросы к базе, но не ложные 404.
+    Имена, добавленные во время перестроения, переносятся в новый фильтр.
+
+    Фильтр хранится в памяти процесса и узнаёт только о ссылках, созданных
+    этим процессом, поэтому включать его можно только при единственном
+    процессе приложения.
+    """
+
+    def __init__(self, error_rate: float, min_capacity: int):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.stats = FilterStats()
+        self._bloom: BloomFilter | None = None
+        self._added_during_rebuild: list[str] | None = None
+
+    @property
+    def bloom(self) -> BloomFilter | None:
+        return self._bloom
+
+    def might_contain(self, short_name: str) -> bool:
+        """Проверить, может ли имя существовать"""
+        if self._bloom is None:
+            return True
+
+        if short_name in self._bloom:
+            self.stats.passed += 1
+            return True
+
+        self.stats.rejected += 1
+        return False
+
+    def record_false_positive(self) -> None:
+        """Учесть имя, которое фильтр пропустил, но в базе его не оказалось"""
+        if self._bloom is not None:
+            self.stats.false_positives += 1
+
+    def add(self, short_name: str) -> None:
+        """Добавить имя новой или переименованной ссылки"""
+        if self._bloom is not None:
+            self._bloom.add(short_name)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(short_name)
+
+    async def rebuild(
+        self, short_names: AsyncIterable[Iterable[str]], expected_count: int
+    ) -> None:
+        """Построить фильтр заново из пакетов имён и заменить им текущий
+
+        Ёмкость берётся с запасом от ожидаемого числа имён.
+        """
+        bloom = BloomFilter(
+            max(expected_count * CAPACITY_HEADROOM, self.min_capacity), self.error_rate
+        )
+        self._added_during_rebuild = []
+        try:
+            async for batch in short_names:
+                bloom.update(batch)
+            bloom.update(self._added_during_rebuild)
+            self._bloom = bloom
+        finally:
+            self._added_during_rebuild = None
+
+    def clear(self) -> None:
+        """Сбросить фильтр в непостроенное состояние и обнулить счётчики"""
+        self._bloom = None
+        self._added_during_rebuild = None
+        self.stats = FilterStats()
+
+
+# Фильтр коротких имён для /r/{short_name}
+short_name_filter = ShortNameFilter(
+    error_rate=SHORT_NAME_FILTER_ERROR_RATE,
+    min_capacity=SHORT_NAME_FILTER_MIN_CAPACITY,
+)
+
+
+def _bloom_samples(value: Callable[[BloomFilter], float]) -> list[Sample]:
+    """Значение построенного фильтра для метрики, пока фильтра нет — пусто"""
+    bloom = short_name_filter.bloom
+    return [] if bloom is None else [({}, value(bloom))]
+
+
+def _false_positive_rate_samples() -> list[Sample]:
+    """Наблюдаемая и ожидаемая доля ложных срабатываний"""
+    observed = ({"kind": "observed"}, short_name_filter.stats.false_positive_rate())
+    expected = [
+        ({"kind": "expected"}, rate)
+        for _, rate in _bloom_samples(BloomFilter.false_positive_rate)
+    ]
+    return [observed, *expected]
+
+
+registry.register(
+    CallbackMetric(
+        "short_name_filter_lookups",
+        "Short name filter lookups by result",
+        "counter",
+        lambda: [
+            ({"result": "rejected"}, short_name_filter.stats.rejected),
+            ({"result": "passed"}, short_name_filter.stats.passed),
+            ({"result": "false_positive"}, short_name_filter.stats.false_positives),
+        ],
+    )
+)
+registry.register(
+    CallbackMetric(
+        "short_name_filter_false_positive_rate",
+        "Short name filter false positive rate",
+        "gauge",
+        _false_positive_rate_samples,
+    )
+)
+registry.register(
+    CallbackMetric(
+        "short_name_filter_bytes",
+        "Short name filter memory footprint",
+        "gauge",
+        lambda: _bloom_samples(lambda bloom: bloom.nbytes),
+    )
+)
+registry.register(
+    CallbackMetric(
+        "short_name_filter_items",
+        "Short names added to the filter",
+        "gauge",
+        lambda: _bloom_samples(len),
+    )
+)
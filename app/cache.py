@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import Generic, TypeVar
+
+from app.config import (
+    LINKS_COUNT_CACHE_TTL,
+    REDIRECT_CACHE_SIZE,
+    REDIRECT_CACHE_TTL,
+)
+from app.metrics import CallbackMetric, registry
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class RedirectTarget:
+    """Адрес перехода по короткому имени и срок действия ссылки в UTC"""
+
+    original_url: str
+    expires_at: datetime | None = None
+
+
+@dataclass
+class CacheStats:
+    """Счётчики обращений к кэшу"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class LRUCache(Generic[K, V]):
+    """Ограниченный по размеру LRU-кэш с временем жизни записей
+
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    Просроченные записи удаляются при чтении и считаются промахом.
+    Нулевой размер отключает кэш.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._timer = timer
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        """Получить значение по ключу или None, если его нет или оно устарело"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return None
+
+            expires_at, value = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                self.stats.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Сохранить значение, вытеснив самые старые записи при переполнении
+
+        ttl задаёт время жизни этой записи, если оно короче общего.
+        """
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (self._timer() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        """Удалить запись по ключу, если она есть"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Удалить все записи и сбросить счётчики"""
+        with self._lock:
+            self._data.clear()
+            self.stats = CacheStats()
+
+
+class ExpiringValue(Generic[V]):
+    """Одно значение с временем жизни, которое можно сбросить досрочно"""
+
+    def __init__(self, ttl: float, timer: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._timer = timer
+        self._value: V | None = None
+        self._expires_at = 0.0
+
+    def get(self) -> V | None:
+        """Получить значение или None, если оно не задано или устарело"""
+        if self._expires_at <= self._timer():
+            return None
+        return self._value
+
+    def set(self, value: V) -> None:
+        """Сохранить значение на время жизни"""
+        self._value = value
+        self._expires_at = self._timer() + self.ttl
+
+    def invalidate(self) -> None:
+        """Сбросить значение"""
+        self._value = None
+        self._expires_at = 0.0
+
+
+# Кэш адресов перехода для /r/{short_name}: короткое имя -> исходный URL и срок
+redirect_cache: LRUCache[str, RedirectTarget] = LRUCache(
+    maxsize=REDIRECT_CACHE_SIZE, ttl=REDIRECT_CACHE_TTL
+)
+
+# Общее количество ссылок для режима подсчёта cached
+links_count_cache: ExpiringValue[int] = ExpiringValue(ttl=LINKS_COUNT_CACHE_TTL)
+
+registry.register(
+    CallbackMetric(
+        "redirect_cache_events",
+        "Redirect cache lookups and evictions",
+        "counter",
+        lambda: [
+            ({"event": "hit"}, redirect_cache.stats.hits),
+            ({"event": "miss"}, redirect_cache.stats.misses),
+            ({"event": "eviction"}, redirect_cache.stats.evictions),
+        ],
+    )
+)
+registry.register(
+    CallbackMetric(
+        "redirect_cache_entries",
+        "Redirect cache size",
+        "gauge",
+        lambda: [({}, len(redirect_cache))],
+    )
+)
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from app.database import AsyncSessionLocal
+from app.repository import AsyncURLRepository, AsyncURLRepositoryProtocol
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """Буфер переходов по ссылкам для отложенной записи в базу
+
+    Хранит по каждому короткому имени число переходов и время последнего из
+    них с момента предыдущей записи.
+    """
+
+    def __init__(self):
+        self._clicks: dict[str, tuple[int, datetime]] = {}
+
+    def __len__(self) -> int:
+        return len(self._clicks)
+
+    def record(self, short_name: str, accessed_at: datetime | None = None) -> None:
+        """Учесть переход по короткому имени"""
+        accessed_at = accessed_at or datetime.utcnow()
+        clicks, last_accessed_at = self._clicks.get(short_name, (0, accessed_at))
+        self._clicks[short_name] = (clicks + 1, max(last_accessed_at, accessed_at))
+
+    def drain(self) -> dict[str, tuple[int, datetime]]:
+        """Забрать накопленные переходы, очистив буфер"""
+        clicks, self._clicks = self._clicks, {}
+        return clicks
+
+    def restore(self, clicks: dict[str, tuple[int, datetime]]) -> None:
+        """Вернуть в буфер переходы, которые не удалось записать"""
+        for short_name, (count, accessed_at) in clicks.items():
+            pending, last_accessed_at = self._clicks.get(short_name, (0, accessed_at))
+            self._clicks[short_name] = (
+                pending + count,
+                max(last_accessed_at, accessed_at),
+            )
+
+    def clear(self) -> None:
+        """Удалить накопленные переходы"""
+        self._clicks.clear()
+
+
+async def flush_clicks(
+    buffer: ClickBuffer, repository: AsyncURLRepositoryProtocol
+) -> int:
+    """Записать накопленные переходы в базу одним запросом
+
+    При ошибке переходы возвращаются в буфер и попадут в следующую запись.
+    Возвращает число ссылок, по которым были переходы.
+    """
+    clicks = buffer.drain()
+    if not clicks:
+        return 0
+
+    try:
+        await repository.add_clicks(clicks)
+    except Exception:
+        buffer.restore(clicks)
+        raise
+    return len(clicks)
+
+
+async def flush_clicks_to_database(buffer: ClickBuffer) -> None:
+    """Записать накопленные переходы через отдельную сессию"""
+    try:
+        async with AsyncSessionLocal() as session:
+            await flush_clicks(buffer, AsyncURLRepository(session))
+    except Exception:
+        logger.exception("Failed to flush %d link click counters", len(buffer))
+
+
+async def run_click_flusher(buffer: ClickBuffer, interval: float) -> None:
+    """Периодически записывать переходы в базу до отмены задачи"""
+    while True:
+        await asyncio.sleep(interval)
+        await flush_clicks_to_database(buffer)
+
+
+# Переходы по /r/{short_name}, ожидающие записи в базу
+click_buffer = ClickBuffer()
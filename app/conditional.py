@@ -0,0 +1,84 @@
+import hashlib
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+# Ответ можно сохранить, но перед использованием его нужно перепроверить
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    """Слабый ETag из частей версии ресурса"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def query_tag(*parts: object) -> str:
+    """Короткий хеш разобранных параметров запроса для ETag
+
+    Разные страницы и фильтры одного ресурса получают разные ETag, а
+    одинаковые запросы с параметрами в другой записи — один и тот же.
+    """
+    payload = "\x1f".join(str(part) for part in parts).encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def timestamp_tag(moment: datetime) -> int:
+    """Момент времени в UTC как число микросекунд для ETag"""
+    return int(_as_utc(moment).timestamp() * 1_000_000)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Проверяет условные заголовки запроса по правилам RFC 9110
+
+    If-None-Match проверяется слабым сравнением и, если он передан,
+    If-Modified-Since не учитывается.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque_tag(etag) in {
+            _opaque_tag(tag) for tag in if_none_match.split(",")
+        }
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # Last-Modified передаётся с точностью до секунды
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime) -> None:
+    """Добавляет к ответу ETag, Last-Modified и требование перепроверки"""
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_datetime(
+        _as_utc(last_modified), usegmt=True
+    )
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified_response(etag: str, last_modified: datetime) -> Response:
+    """Ответ 304 с теми же валидаторами"""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def _opaque_tag(tag: str) -> str:
+    """ETag без признака слабости для слабого сравнения"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _as_utc(moment: datetime) -> datetime:
+    """Время из базы хранится в UTC без часового пояса"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -12,3 +13,129 @@ DATABASE_URL = os.getenv(
 
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg://")
+
+# Реплики для чтения: адреса через запятую. Чтения, которым в том же запросе
+# не предшествовала запись, выполняются на репликах. Реплика выбирается
+# по кругу (round_robin) или по наименьшему числу занятых соединений пула
+# (least_connections). Недоступная реплика пропускается
+# DATABASE_REPLICA_RETRY_INTERVAL секунд, без доступных реплик чтения идут
+# в основную базу
+DATABASE_REPLICA_URLS = [
+    url.strip().replace("postgres://", "postgresql+psycopg://", 1)
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+DATABASE_REPLICA_SELECTION = os.getenv("DATABASE_REPLICA_SELECTION", "round_robin")
+DATABASE_REPLICA_RETRY_INTERVAL = float(
+    os.getenv("DATABASE_REPLICA_RETRY_INTERVAL", "30")
+)
+
+# Создавать таблицы при запуске приложения. Многопроцессный запуск
+# (python -m app.server) создаёт их один раз до запуска процессов и выключает
+# этот шаг в каждом из них
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Прогрев при запуске: сколько соединений пула открыть до готовности
+# (не больше размера пула) и сколько самых посещаемых ссылок загрузить
+# в кэш редиректов (0 — не загружать)
+DB_POOL_WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM_CONNECTIONS", "5"))
+PRELOAD_REDIRECTS = int(os.getenv("PRELOAD_REDIRECTS", "0"))
+
+# Допуск запросов к базе: сколько запросов редиректов и API одновременно
+# работают с базой (0 — без ограничения). Вместе бюджеты не должны
+# превышать пул соединений (по умолчанию 5 + 10 overflow), чтобы запросы
+# не ждали в самом пуле. Запрос сверх бюджета ждёт не дольше
+# ADMISSION_QUEUE_TIMEOUT секунд и получает 503 с Retry-After
+ADMISSION_REDIRECT_LIMIT = int(os.getenv("ADMISSION_REDIRECT_LIMIT", "10"))
+ADMISSION_API_LIMIT = int(os.getenv("ADMISSION_API_LIMIT", "5"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Ответ /r/{short_name}: код редиректа (301, 302, 307 или 308) и сколько
+# секунд его можно хранить в кэше nginx и браузера (0 — не кэшировать;
+# для ссылки со сроком действия — не дольше её срока).
+# Закэшированные nginx переходы не доходят до приложения и не попадают
+# в click_count. После изменения ссылки приложение обновляет запись кэша
+# nginx запросом на REDIRECT_PURGE_URL
+REDIRECT_STATUS_CODE = int(os.getenv("REDIRECT_STATUS_CODE", "307"))
+REDIRECT_MAX_AGE = int(os.getenv("REDIRECT_MAX_AGE", "0"))
+REDIRECT_PURGE_URL = os.getenv("REDIRECT_PURGE_URL", "http://127.0.0.1:80")
+
+# /r/{short_name} обслуживается лёгким ASGI-обработчиком в обход FastAPI;
+# false возвращает обычный маршрут с зависимостями
+REDIRECT_FAST_PATH = os.getenv("REDIRECT_FAST_PATH", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Кэш редиректов: максимальное число записей (0 отключает кэш) и время жизни в секундах.
+# Изменение или удаление ссылки сбрасывает запись только в своём процессе, поэтому
+# при нескольких процессах кэш по умолчанию выключен (см. app.server)
+REDIRECT_CACHE_SIZE = int(os.getenv("REDIRECT_CACHE_SIZE", "10000"))
+REDIRECT_CACHE_TTL = float(os.getenv("REDIRECT_CACHE_TTL", "60"))
+
+# Подсчёт ссылок для Content-Range: exact (точный), cached (точный, кэшируемый
+# на LINKS_COUNT_CACHE_TTL секунд и сбрасываемый при записи) или estimate
+# (оценка планировщика из pg_class.reltuples)
+LINKS_COUNT_MODE = os.getenv("LINKS_COUNT_MODE", "exact")
+LINKS_COUNT_CACHE_TTL = float(os.getenv("LINKS_COUNT_CACHE_TTL", "30"))
+
+# Массовый импорт: размер пакета и сколько проблемных строк каждого вида
+# перечислять в отчёте
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "10000"))
+IMPORT_MAX_REPORTED_ISSUES = int(os.getenv("IMPORT_MAX_REPORTED_ISSUES", "1000"))
+
+# Выгрузка ссылок: сколько строк читать из серверного курсора за раз
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Счётчики переходов копятся в памяти и записываются в базу раз в
+# CLICK_FLUSH_INTERVAL секунд
+CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", "5"))
+
+# Ссылки со сроком действия: просроченные сразу перестают открываться, а из
+# базы удаляются фоновой задачей раз в LINK_PURGE_INTERVAL секунд пакетами
+# по LINK_PURGE_BATCH_SIZE строк (0 в интервале отключает удаление)
+LINK_PURGE_INTERVAL = float(os.getenv("LINK_PURGE_INTERVAL", "60"))
+LINK_PURGE_BATCH_SIZE = int(os.getenv("LINK_PURGE_BATCH_SIZE", "1000"))
+
+# Профилирование отдельных запросов: запрос с заголовком X-Profile или
+# параметром profile, равным PROFILE_SECRET, профилируется cProfile вместе
+# с его SQL-запросами; кроме того, профилируется доля PROFILE_SAMPLE_RATE
+# (от 0 до 1) случайных запросов. Хранятся PROFILE_MAX_COUNT последних
+# профилей в PROFILE_DIR, список и файлы отдаются /debug/profiles с тем же
+# заголовком. Пустой секрет и нулевая доля выключают профилирование
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "urlshortener-profiles")
+)
+PROFILE_MAX_COUNT = int(os.getenv("PROFILE_MAX_COUNT", "50"))
+
+# Вывод всех SQL-запросов в лог, только для отладки
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "yes")
+
+# Фильтр Блума существующих коротких имён: отсекает редиректы на несуществующие
+# имена без запроса к базе. Строится при запуске с ёмкостью не меньше
+# SHORT_NAME_FILTER_MIN_CAPACITY и перестраивается раз в
+# SHORT_NAME_FILTER_REBUILD_INTERVAL секунд, чтобы забыть удалённые имена.
+# Фильтр знает только о ссылках, созданных своим процессом: при нескольких
+# контейнерах или рабочих процессах ссылки соседей получают ложный 404 до
+# перестроения, а nginx может его закэшировать. Поэтому по умолчанию фильтр
+# выключен и включается только для единственного процесса
+SHORT_NAME_FILTER_ENABLED = os.getenv("SHORT_NAME_FILTER_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SHORT_NAME_FILTER_ERROR_RATE = float(os.getenv("SHORT_NAME_FILTER_ERROR_RATE", "0.01"))
+SHORT_NAME_FILTER_MIN_CAPACITY = int(
+    os.getenv("SHORT_NAME_FILTER_MIN_CAPACITY", "100000")
+)
+SHORT_NAME_FILTER_REBUILD_INTERVAL = float(
+    os.getenv("SHORT_NAME_FILTER_REBUILD_INTERVAL", "600")
+)
@@ -1,17 +1,139 @@
-from sqlalchemy.orm import sessionmaker
-from sqlmodel import Session, SQLModel, create_engine
+import hashlib
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
 
-from app.config import DATABASE_URL
+from sqlalchemy import (
+    Connection,
+    Engine,
+    create_mock_engine,
+    func,
+    make_url,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-engine = create_engine(DATABASE_URL, echo=True)
+from app.config import DATABASE_REPLICA_URLS, DATABASE_URL, SQL_ECHO
+from app.metrics import instrument_engine, instrumented_pool
+from app.models import SCHEMA_VERSION_ID, SchemaVersion
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Ключ advisory-блокировки, под которой создаётся схема
+SCHEMA_LOCK_ID = 0x75726C73
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+def get_async_database_url(database_url: str) -> str:
+    """Преобразует адрес базы данных для асинхронного драйвера asyncpg
 
+    asyncpg не понимает параметр sslmode из libpq, поэтому он передаётся
+    под именем ssl.
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    sslmode = url.query.get("sslmode")
+    if sslmode is not None:
+        url = url.difference_update_query(["sslmode"]).update_query_dict(
+            {"ssl": sslmode}
+        )
+    return url.render_as_string(hide_password=False)
 
-def get_session():
-    with Session(engine) as session:
+
+engine = create_engine(
+    DATABASE_URL, echo=SQL_ECHO, poolclass=instrumented_pool(QueuePool, "sync")
+)
+instrument_engine(engine, "sync")
+
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL),
+    echo=SQL_ECHO,
+    poolclass=instrumented_pool(AsyncAdaptedQueuePool, "async"),
+)
+instrument_engine(async_engine.sync_engine, "async")
+
+# Движки реплик для чтения по именам replica1, replica2, ...
+replica_engines: dict[str, AsyncEngine] = {}
+for number, replica_url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    name = f"replica{number}"
+    replica_engines[name] = create_async_engine(
+        get_async_database_url(replica_url),
+        echo=SQL_ECHO,
+        poolclass=instrumented_pool(AsyncAdaptedQueuePool, name),
+    )
+    instrument_engine(replica_engines[name].sync_engine, name)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Фабрика сессий для работы, которая не должна зависеть от сессии запроса
+SessionFactory = Callable[[], AbstractAsyncContextManager[AsyncSession]]
+
+
+def schema_fingerprint() -> str:
+    """Отпечаток схемы: SHA-256 от всех команд, которые выполнил бы create_all
+
+    Команды собираются без обращения к базе, поэтому отпечаток меняется при
+    любом изменении моделей, индексов и DDL из событий after_create.
+    """
+    digest = hashlib.sha256()
+
+    def executor(statement, *args, **kwargs) -> None:
+        digest.update(str(statement.compile(dialect=mock.dialect)).encode())
+
+    mock = create_mock_engine(make_url("postgresql+psycopg://"), executor)
+    SQLModel.metadata.create_all(mock, checkfirst=False)
+    return digest.hexdigest()
+
+
+def stored_schema_fingerprint(connection: Connection) -> str | None:
+    """Сохранённый отпечаток схемы или None, если схема ещё не создавалась"""
+    table_exists = connection.scalar(
+        select(func.to_regclass(SchemaVersion.__tablename__))
+    )
+    if table_exists is None:
+        return None
+    return connection.scalar(
+        select(SchemaVersion.fingerprint).where(SchemaVersion.id == SCHEMA_VERSION_ID)
+    )
+
+
+def create_db_and_tables(target: Engine = engine) -> bool:
+    """Создать схему, если сохранённый отпечаток не совпадает с текущим
+
+    Обычно схема актуальна, и запуск обходится одним чтением без DDL и
+    отражения метаданных. Иначе create_all выполняется в транзакции под
+    advisory-блокировкой, чтобы одновременно запущенные процессы не создавали
+    таблицы наперегонки. Возвращает True, если DDL выполнялся.
+    """
+    fingerprint = schema_fingerprint()
+    with target.connect() as connection:
+        if stored_schema_fingerprint(connection) == fingerprint:
+            return False
+
+    with target.begin() as connection:
+        connection.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK_ID)))
+        if stored_schema_fingerprint(connection) == fingerprint:
+            return False
+        SQLModel.metadata.create_all(connection)
+        connection.execute(
+            pg_insert(SchemaVersion)
+            .values(id=SCHEMA_VERSION_ID, fingerprint=fingerprint)
+            .on_conflict_do_update(
+                index_elements=[SchemaVersion.id],
+                set_={
+                    "fingerprint": fingerprint,
+                    "applied_at": func.timezone("utc", func.now()),
+                },
+            )
+        )
+    return True
+
+
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
         yield session
@@ -1,12 +1,103 @@
-from fastapi import Depends
-from sqlmodel import Session
+from collections.abc import AsyncIterator
 
-from app.database import get_session
-from app.repository import URLRepository, URLRepositoryProtocol
+from fastapi import Depends, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.admission import AdmissionLimiter, api_admission, redirect_admission
+from app.bloom import ShortNameFilter, short_name_filter
+from app.cache import (
+    ExpiringValue,
+    LRUCache,
+    RedirectTarget,
+    links_count_cache,
+    redirect_cache,
+)
+from app.clicks import ClickBuffer, click_buffer
+from app.database import AsyncSessionLocal, SessionFactory, get_async_session
+from app.edge_cache import REFRESH_HEADER, RedirectPurger, redirect_purger
+from app.replicas import ReplicaSet, replica_set
+from app.repository import AsyncURLRepository, AsyncURLRepositoryProtocol
+from app.short_names import ShortNameAllocator, short_name_allocator
+
+
+def get_redirect_cache() -> LRUCache[str, RedirectTarget]:
+    """Dependency для получения кэша редиректов"""
+    return redirect_cache
+
+
+def get_click_buffer() -> ClickBuffer:
+    """Dependency для получения буфера переходов по ссылкам"""
+    return click_buffer
+
+
+def get_links_count_cache() -> ExpiringValue[int]:
+    """Dependency для получения кэша количества ссылок"""
+    return links_count_cache
+
+
+def get_short_name_allocator() -> ShortNameAllocator:
+    """Dependency для получения генератора коротких имён"""
+    return short_name_allocator
+
+
+def get_short_name_filter() -> ShortNameFilter:
+    """Dependency для получения фильтра существующих коротких имён"""
+    return short_name_filter
+
+
+def get_session_factory() -> SessionFactory:
+    """Dependency для получения фабрики сессий вне сессии запроса"""
+    return AsyncSessionLocal
+
+
+def get_redirect_purger() -> RedirectPurger:
+    """Dependency для получения обновления кэша редиректов nginx"""
+    return redirect_purger
+
+
+def get_replica_set(request: Request) -> ReplicaSet | None:
+    """Dependency для получения реплик для чтения
+
+    Запросы обновления кэша nginx читают основную базу: их ответ сохранится
+    в кэше, и отставание реплики в нём закрепится.
+    """
+    if REFRESH_HEADER in request.headers:
+        return None
+    return replica_set
+
+
+def get_admission_limiter(request: Request) -> AdmissionLimiter:
+    """Dependency для получения бюджета допуска к базе
+
+    У редиректов свой бюджет, и запросы API их не вытесняют.
+    """
+    if request.url.path.startswith("/r/"):
+        return redirect_admission
+    return api_admission
+
+
+async def admit_request(
+    limiter: AdmissionLimiter = Depends(get_admission_limiter),
+) -> AsyncIterator[None]:
+    """Dependency, допускающая запрос к базе на всё время его обработки
+
+    Не дождавшийся допуска запрос завершается исключением Overloaded.
+    """
+    async with limiter.admit():
+        yield
 
 
 def get_url_repository(
-    session: Session = Depends(get_session),
-) -> URLRepositoryProtocol:
-    """Dependency для получения экземпляра URLRepository"""
-    return URLRepository(session)
+    _: None = Depends(admit_request),
+    session: AsyncSession = Depends(get_async_session),
+    cache: LRUCache[str, RedirectTarget] = Depends(get_redirect_cache),
+    count_cache: ExpiringValue[int] = Depends(get_links_count_cache),
+    short_names: ShortNameAllocator = Depends(get_short_name_allocator),
+    name_filter: ShortNameFilter = Depends(get_short_name_filter),
+    purger: RedirectPurger = Depends(get_redirect_purger),
+    replicas: ReplicaSet | None = Depends(get_replica_set),
+) -> AsyncURLRepositoryProtocol:
+    """Dependency для получения экземпляра AsyncURLRepository"""
+    return AsyncURLRepository(
+        session, cache, count_cache, short_names, name_filter, purger, replicas
+    )
@@ -1,17 +1,37 @@
-from pydantic import BaseModel
+import base64
+import json
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from pydantic import BaseModel, field_validator
+from pydantic_core import to_json
+from sqlalchemy import Row
 
 from app.config import BASE_URL
 from app.models import URL
 
 
+def to_naive_utc(moment: datetime | None) -> datetime | None:
+    """Даты в базе хранятся в UTC без часового пояса"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(UTC).replace(tzinfo=None)
+
+
 class URLCreate(BaseModel):
     original_url: str
-    short_name: str
+    short_name: str | None = None
+    expires_at: datetime | None = None
+
+    _expires_at_to_utc = field_validator("expires_at")(to_naive_utc)
 
 
 class URLUpdate(BaseModel):
     original_url: str
     short_name: str
+    expires_at: datetime | None = None
+
+    _expires_at_to_utc = field_validator("expires_at")(to_naive_utc)
 
 
 class URLResponse(BaseModel):
@@ -19,6 +39,9 @@ class URLResponse(BaseModel):
     original_url: str
     short_name: str
     short_url: str
+    click_count: int
+    last_accessed_at: datetime | None
+    expires_at: datetime | None
 
     @classmethod
     def from_url(cls, url: "URL") -> "URLResponse":
@@ -28,9 +51,36 @@ class URLResponse(BaseModel):
             original_url=url.original_url,
             short_name=url.short_name,
             short_url=f"{BASE_URL}/r/{url.short_name}",
+            click_count=url.click_count,
+            last_accessed_at=url.last_accessed_at,
+            expires_at=url.expires_at,
         )
 
 
+def url_rows_to_json(rows: Iterable[Row]) -> bytes:
+    """Список ссылок в JSON в формате URLResponse без создания моделей
+
+    Строки с полями id, original_url, short_name, click_count,
+    last_accessed_at и expires_at кодируются напрямую в UTF-8, байт в байт как
+    список URLResponse в ответе FastAPI.
+    """
+    short_url_prefix = f"{BASE_URL}/r/"
+    return to_json(
+        [
+            {
+                "id": row.id,
+                "original_url": row.original_url,
+                "short_name": row.short_name,
+                "short_url": short_url_prefix + row.short_name,
+                "click_count": row.click_count,
+                "last_accessed_at": row.last_accessed_at,
+                "expires_at": row.expires_at,
+            }
+            for row in rows
+        ]
+    )
+
+
 class PaginationParams(BaseModel):
     """Параметры пагинации"""
 
@@ -47,3 +97,102 @@ class PaginationParams(BaseModel):
             return cls(offset=start, limit=end - start)
         except (ValueError, AttributeError):
             return cls()
+
+
+class KeysetCursor(BaseModel):
+    """Курсор keyset-пагинации: ID последней ссылки на странице"""
+
+    last_id: int
+
+    def encode(self) -> str:
+        """Кодирует курсор в непрозрачную строку"""
+        payload = json.dumps({"last_id": self.last_id}).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "KeysetCursor":
+        """Декодирует курсор из строки, полученной от encode"""
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            payload = base64.urlsafe_b64decode(cursor + padding)
+            return cls.model_validate(json.loads(payload))
+        except ValueError as error:
+            raise ValueError(f"Invalid cursor '{cursor}'") from error
+
+
+class LinkFilter(BaseModel):
+    """Фильтр списка ссылок из параметра filter в формате react-admin
+
+    filter={"short_name": "ab", "original_url": "example",
+    "created_at_gte": "2024-01-01T00:00:00Z"}: short_name ищется по префиксу,
+    original_url — по подстроке без учёта регистра, original_url_eq — по
+    точному совпадению через индекс по дайджесту, created_at_gte
+    и created_at_lte ограничивают дату создания включительно, id выбирает
+    ссылки по списку ID. Пустые значения и неизвестные ключи не учитываются.
+    """
+
+    id: list[int] | None = None
+    short_name: str | None = None
+    original_url: str | None = None
+    original_url_eq: str | None = None
+    created_at_gte: datetime | None = None
+    created_at_lte: datetime | None = None
+
+    _created_at_to_utc = field_validator("created_at_gte", "created_at_lte")(
+        to_naive_utc
+    )
+
+    @classmethod
+    def from_query(cls, filter_str: str) -> "LinkFilter":
+        """Парсит JSON-объект фильтра из строки запроса"""
+        try:
+            return cls.model_validate_json(filter_str)
+        except ValueError as error:
+            raise ValueError(f"Invalid filter '{filter_str}'") from error
+
+    def is_empty(self) -> bool:
+        """Фильтр не ограничивает список"""
+        return not any(
+            (
+                self.id is not None,
+                self.short_name,
+                self.original_url,
+                self.original_url_eq,
+                self.created_at_gte,
+                self.created_at_lte,
+            )
+        )
+
+
+class ImportIssue(BaseModel):
+    """Строка импорта, которая не была загружена"""
+
+    line: int
+    short_name: str | None = None
+    detail: str
+
+
+class ImportReport(BaseModel):
+    """Итог массового импорта ссылок
+
+    Списки conflicts и errors ограничены по длине, полное число проблем
+    хранится в conflicts_total и errors_total.
+    """
+
+    created: int = 0
+    conflicts_total: int = 0
+    errors_total: int = 0
+    conflicts: list[ImportIssue] = []
+    errors: list[ImportIssue] = []
+
+    def add_conflict(self, issue: ImportIssue, limit: int) -> None:
+        """Учитывает конфликт короткого имени"""
+        self.conflicts_total += 1
+        if len(self.conflicts) < limit:
+            self.conflicts.append(issue)
+
+    def add_error(self, issue: ImportIssue, limit: int) -> None:
+        """Учитывает некорректную строку"""
+        self.errors_total += 1
+        if len(self.errors) < limit:
+            self.errors.append(issue)
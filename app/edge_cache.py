@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+from urllib.parse import quote
+
+import httpx
+
+from app.config import REDIRECT_MAX_AGE, REDIRECT_PURGE_URL
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, по которому nginx обходит свой кэш и сохраняет свежий ответ.
+# nginx учитывает его только для запросов с локального адреса
+REFRESH_HEADER = "X-Cache-Refresh"
+
+
+def redirect_cache_headers(
+    max_age: int, expires_at: datetime | None = None
+) -> dict[str, str]:
+    """Заголовки, разрешающие кэшировать ответ /r/{short_name} max_age секунд
+
+    При нулевом max_age заголовков нет и ответ не кэшируется. Редирект
+    ссылки со сроком действия (expires_at в UTC без часового пояса)
+    кэшируется не дольше, чем ссылка проживёт, а истекающий в течение
+    секунды — запрещается кэшировать совсем.
+    """
+    if max_age <= 0:
+        return {}
+    now = datetime.now(UTC)
+    if expires_at is not None:
+        lifetime = expires_at.replace(tzinfo=UTC) - now
+        max_age = min(max_age, int(lifetime.total_seconds()))
+        if max_age <= 0:
+            return {"Cache-Control": "no-store"}
+    expires = now + timedelta(seconds=max_age)
+    return {
+        "Cache-Control": f"public, max-age={max_age}",
+        "Expires": format_datetime(expires, usegmt=True),
+    }
+
+
+class RedirectPurger:
+    """Обновляет закэшированные в nginx ответы /r/{short_name} после записи
+
+    Открытая версия nginx не умеет удалять записи кэша, поэтому для каждого
+    изменённого имени nginx получает запрос с REFRESH_HEADER: он минует кэш,
+    и новый ответ приложения (редирект или 404) заменяет старую запись.
+    Запросы отправляются в фоне и не задерживают ответ API. Без base_url
+    обновление выключено.
+    """
+
+    def __init__(
+        self, base_url: str, transport: httpx.AsyncBaseTransport | None = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._transport = transport
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def purge_later(self, short_names: Iterable[str]) -> None:
+        """Запланировать обновление ответов для коротких имён"""
+        if not self.enabled:
+            return
+        task = asyncio.create_task(self.purge(list(short_names)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def purge(self, short_names: list[str]) -> None:
+        """Обновить ответы для коротких имён, ошибки только логируются"""
+        async with httpx.AsyncClient(
+            base_url=self.base_url, transport=self._transport, timeout=5
+        ) as client:
+            for short_name in short_names:
+                try:
+                    await client.get(
+                        f"/r/{quote(short_name, safe='')}",
+                        headers={REFRESH_HEADER: "1"},
+                    )
+                except httpx.HTTPError:
+                    logger.warning("Failed to purge cached redirect %r", short_name)
+
+    async def wait(self) -> None:
+        """Дождаться отправки запланированных обновлений"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+# Обновление кэша редиректов nginx; включается, только если ответы кэшируются
+redirect_purger = RedirectPurger(REDIRECT_PURGE_URL if REDIRECT_MAX_AGE > 0 else "")
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+from app.cache import links_count_cache, redirect_cache
+from app.database import AsyncSessionLocal
+from app.edge_cache import redirect_purger
+from app.repository import AsyncURLRepository, AsyncURLRepositoryProtocol
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_expired_links(
+    repository: AsyncURLRepositoryProtocol, batch_size: int
+) -> int:
+    """Удалить все просроченные ссылки пакетами по batch_size строк
+
+    Каждый пакет удаляется своей короткой транзакцией, поэтому удаление
+    не держит долгих блокировок. Возвращает число удалённых ссылок.
+    """
+    total = 0
+    while True:
+        deleted = len(await repository.purge_expired(batch_size))
+        total += deleted
+        if deleted < batch_size:
+            return total
+        # Между пакетами обрабатываются запросы
+        await asyncio.sleep(0)
+
+
+async def purge_expired_links_from_database(batch_size: int) -> int:
+    """Удалить просроченные ссылки через отдельную сессию
+
+    Ошибка только логируется: оставшиеся ссылки удалит следующий запуск,
+    а до тех пор они не отдаются как просроченные.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            repository = AsyncURLRepository(
+                session,
+                redirect_cache,
+                links_count_cache,
+                purger=redirect_purger,
+            )
+            deleted = await purge_expired_links(repository, batch_size)
+    except Exception:
+        logger.exception("Failed to purge expired links")
+        return 0
+    if deleted:
+        logger.info("Purged %d expired links", deleted)
+    return deleted
+
+
+async def run_link_purger(interval: float, batch_size: int) -> None:
+    """Периодически удалять просроченные ссылки до отмены задачи"""
+    while True:
+        await asyncio.sleep(interval)
+        await purge_expired_links_from_database(batch_size)
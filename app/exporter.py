@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
+from datetime import datetime
+from typing import Any
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _to_json(value: Any) -> Any:
+    """Приводит значения, которые не понимает json, к строкам"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def export_ndjson(
+    columns: Sequence[str], batches: AsyncIterable[Sequence[Sequence[Any]]]
+) -> AsyncIterator[bytes]:
+    """Кодирует пакеты строк в NDJSON, по одному фрагменту ответа на пакет"""
+    async for batch in batches:
+        lines = (
+            json.dumps(dict(zip(columns, row, strict=True)), default=_to_json)
+            for row in batch
+        )
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def export_csv(
+    columns: Sequence[str], batches: AsyncIterable[Sequence[Sequence[Any]]]
+) -> AsyncIterator[bytes]:
+    """Кодирует пакеты строк в CSV с заголовком, по одному фрагменту на пакет"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
@@ -0,0 +1,158 @@
+import json
+from contextlib import nullcontext
+from urllib.parse import quote
+
+from starlette.types import Receive, Scope, Send
+
+from app.admission import AdmissionLimiter, Overloaded
+from app.bloom import ShortNameFilter
+from app.cache import LRUCache, RedirectTarget
+from app.clicks import ClickBuffer
+from app.config import REDIRECT_MAX_AGE, REDIRECT_STATUS_CODE
+from app.database import SessionFactory
+from app.edge_cache import REFRESH_HEADER, redirect_cache_headers
+from app.replicas import ReplicaSet
+from app.repository import AsyncURLRepository
+from app.single_flight import SingleFlight
+
+# Символы, которые остаются в Location как есть, как в RedirectResponse
+LOCATION_SAFE_CHARS = ":/%#?=@[]!$&'()*+,;"
+
+REFRESH_HEADER_KEY = REFRESH_HEADER.lower().encode()
+
+
+def link_not_found_detail(short_name: str) -> str:
+    """Текст ошибки для несуществующего короткого имени"""
+    return f"Link with short name '{short_name}' not found"
+
+
+class RedirectEndpoint:
+    """ASGI-обработчик /r/{short_name} в обход FastAPI
+
+    Делает то же, что маршрут redirect_link, но без разрешения зависимостей,
+    валидации и объектов ответа: берёт короткое имя из параметров пути,
+    проверяет кэш и фильтр имён, читает из базы только original_url и сам
+    отправляет ответ. Запрос на обновление кэша nginx минует кэш процесса
+    и реплики. Редирект ссылки со сроком действия кэшируется не дольше её
+    срока. Сессия открывается только при промахе кэша, если имя прошло
+    фильтр, и только после допуска к базе; не дождавшийся допуска запрос
+    получает 503.
+    Одновременные промахи по одному имени выполняют одно чтение из базы.
+    """
+
+    def __init__(
+        self,
+        session_factory: SessionFactory,
+        cache: LRUCache[str, RedirectTarget],
+        name_filter: ShortNameFilter,
+        clicks: ClickBuffer,
+        replicas: ReplicaSet | None = None,
+        admission: AdmissionLimiter | None = None,
+        lookups: SingleFlight[str, RedirectTarget | None] | None = None,
+    ):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.name_filter = name_filter
+        self.clicks = clicks
+        self.replicas = replicas
+        self.admission = admission
+        self.lookups = lookups
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        short_name = scope["path_params"]["short_name"]
+        refresh = any(name == REFRESH_HEADER_KEY for name, _ in scope["headers"])
+        # Обновление кэша nginx не доверяет кэшу процесса и читает основную базу
+        target = None if refresh else self.cache.get(short_name)
+        # Имя, отсечённое фильтром, не занимает допуск к базе и не открывает
+        # сессию
+        if target is None and self.name_filter.might_contain(short_name):
+            try:
+                if self.lookups is None or refresh:
+                    target = await self._read_target(short_name, refresh)
+                else:
+                    target = await self.lookups.do(
+                        short_name,
+                        lambda: self._read_target(short_name, refresh=False),
+                    )
+            except Overloaded as error:
+                await self._respond_overloaded(scope, send, error)
+                return
+
+        cache_headers = redirect_cache_headers(
+            REDIRECT_MAX_AGE, target.expires_at if target else None
+        )
+        headers = [
+            (name.lower().encode(), value.encode())
+            for name, value in cache_headers.items()
+        ]
+        if target is None:
+            body = json.dumps(
+                {"detail": link_not_found_detail(short_name)},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode()
+            headers += [
+                (b"content-length", str(len(body)).encode()),
+                (b"content-type", b"application/json"),
+            ]
+            await self._respond(scope, send, 404, headers, body)
+            return
+
+        if not refresh:
+            self.clicks.record(short_name)
+        headers += [
+            (b"content-length", b"0"),
+            (
+                b"location",
+                quote(target.original_url, safe=LOCATION_SAFE_CHARS).encode(),
+            ),
+        ]
+        await self._respond(scope, send, REDIRECT_STATUS_CODE, headers, b"")
+
+    async def _read_target(
+        self, short_name: str, refresh: bool
+    ) -> RedirectTarget | None:
+        admission = self.admission.admit() if self.admission else nullcontext()
+        async with admission, self.session_factory() as session:
+            # Ответ на обновление кэша nginx читается из основной базы.
+            # Репозиторий сохраняет адрес в кэше с учётом срока действия.
+            # Фильтр уже проверен, поэтому репозиторию он не передаётся
+            repository = AsyncURLRepository(
+                session,
+                self.cache,
+                replicas=None if refresh else self.replicas,
+            )
+            target = await repository.load_redirect_target(short_name)
+        if target is None:
+            self.name_filter.record_false_positive()
+        return target
+
+    async def _respond_overloaded(
+        self, scope: Scope, send: Send, error: Overloaded
+    ) -> None:
+        body = json.dumps({"detail": str(error)}, separators=(",", ":")).encode()
+        headers = [
+            (b"content-length", str(len(body)).encode()),
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(error.retry_after).encode()),
+        ]
+        await self._respond(scope, send, 503, headers, body)
+
+    @staticmethod
+    async def _respond(
+        scope: Scope,
+        send: Send,
+        status_code: int,
+        headers: list[tuple[bytes, bytes]],
+        body: bytes,
+    ) -> None:
+        await send(
+            {"type": "http.response.start", "status": status_code, "headers": headers}
+        )
+        # На HEAD отвечаем теми же заголовками без тела
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"" if scope["method"] == "HEAD" else body,
+            }
+        )
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import Gauge, registry
+
+# Этапы запуска пишутся в журнал uvicorn: он настроен при любом способе запуска
+logger = logging.getLogger("uvicorn.error")
+
+app_startup_phase = registry.register(
+    Gauge(
+        "app_startup_phase_seconds",
+        "Duration of the last process startup by phase",
+        ["phase"],
+    )
+)
+
+
+class Readiness:
+    """Готовность процесса принимать трафик для проверки /ready
+
+    Процесс не готов, пока не прогрет пул соединений, и перестаёт быть
+    готовым, когда начинается остановка.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.reason = "starting"
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.reason = "ready"
+
+    def mark_not_ready(self, reason: str) -> None:
+        self.ready = False
+        self.reason = reason
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int | None = None) -> int:
+    """Открыть сразу постоянные соединения пула и проверить их
+
+    Открывается connections соединений, но не больше размера пула: лишние
+    пул закрыл бы при возврате. Без connections прогревается весь пул.
+    Первые запросы после запуска не ждут установки соединений. Возвращает
+    число прогретых соединений; пулы без постоянных соединений не прогреваются.
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+
+    size = pool.size() if connections is None else min(connections, pool.size())
+    # Соединения открываются одновременно, чтобы пул держал их все сразу
+    connections = [engine.connect() for _ in range(size)]
+    try:
+        for connection in connections:
+            await connection.start()
+        await asyncio.gather(
+            *(connection.execute(text("SELECT 1")) for connection in connections)
+        )
+    finally:
+        for connection in connections:
+            await connection.close()
+    return size
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Замерить этап запуска: длительность пишется в лог и в метрику"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        app_startup_phase.set(duration, phase=name)
+        logger.info("Startup phase %s took %.1f ms", name, duration * 1000)
+
+
+# Готовность этого процесса приложения
+readiness = Readiness()
@@ -0,0 +1,163 @@
+import codecs
+import csv
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+
+from pydantic import ValidationError
+
+from app.dto import ImportIssue, ImportReport, URLCreate
+from app.models import URL
+from app.repository import AsyncURLRepositoryProtocol
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_CONTENT_TYPES = ("text/csv",)
+
+
+class ImportRowError(ValueError):
+    """Строка импорта не содержит корректную ссылку"""
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Разбивает поток байтов на строки, не накапливая его целиком"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    tail = ""
+    async for chunk in chunks:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+def parse_ndjson_row(line: str) -> URLCreate:
+    """Разбирает строку NDJSON в ссылку"""
+    try:
+        return URLCreate.model_validate_json(line)
+    except ValidationError as error:
+        raise ImportRowError(_describe_validation_error(error)) from error
+
+
+class CSVRowParser:
+    """Разбирает строки CSV, первая из которых содержит заголовок"""
+
+    def __init__(self, header: str):
+        self.columns = next(csv.reader([header]))
+        missing = {"original_url", "short_name"} - set(self.columns)
+        if missing:
+            raise ImportRowError(
+                f"CSV header is missing columns: {', '.join(sorted(missing))}"
+            )
+
+    def __call__(self, line: str) -> URLCreate:
+        values = next(csv.reader([line]))
+        if len(values) != len(self.columns):
+            raise ImportRowError(
+                f"Expected {len(self.columns)} columns, got {len(values)}"
+            )
+        data = dict(zip(self.columns, values, strict=True))
+        # Выгрузка пишет бессрочную ссылку с пустым expires_at
+        if not data.get("expires_at"):
+            data.pop("expires_at", None)
+        try:
+            return URLCreate.model_validate(data)
+        except ValidationError as error:
+            raise ImportRowError(_describe_validation_error(error)) from error
+
+
+def check_row(url_data: URLCreate) -> None:
+    """Проверяет ограничения таблицы, которые иначе прервали бы пакет целиком"""
+    if not url_data.short_name:
+        raise ImportRowError("Field 'short_name' is required")
+
+    for field in ("original_url", "short_name"):
+        max_length = URL.__table__.c[field].type.length
+        if len(getattr(url_data, field)) > max_length:
+            raise ImportRowError(
+                f"Field '{field}' is longer than {max_length} characters"
+            )
+
+
+async def import_links(
+    lines: AsyncIterable[str],
+    content_type: str,
+    repository: AsyncURLRepositoryProtocol,
+    batch_size: int,
+    max_reported_issues: int,
+) -> ImportReport:
+    """Загружает ссылки из потока строк пакетами по batch_size
+
+    В памяти одновременно находится не больше одного пакета, а отчёт хранит
+    не больше max_reported_issues конфликтов и ошибок каждого вида.
+    Конфликт короткого имени не прерывает загрузку: строка пропускается и
+    попадает в отчёт.
+    """
+    report = ImportReport()
+    parse: Callable[[str], URLCreate] | None = (
+        parse_ndjson_row if content_type in NDJSON_CONTENT_TYPES else None
+    )
+    batch: list[tuple[int, URLCreate]] = []
+
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+
+        if parse is None:
+            parse = CSVRowParser(line)
+            continue
+
+        try:
+            url_data = parse(line)
+            check_row(url_data)
+        except ImportRowError as error:
+            report.add_error(
+                ImportIssue(line=line_number, detail=str(error)), max_reported_issues
+            )
+            continue
+
+        batch.append((line_number, url_data))
+        if len(batch) >= batch_size:
+            await _import_batch(batch, repository, report, max_reported_issues)
+            batch = []
+
+    if batch:
+        await _import_batch(batch, repository, report, max_reported_issues)
+
+    return report
+
+
+async def _import_batch(
+    batch: list[tuple[int, URLCreate]],
+    repository: AsyncURLRepositoryProtocol,
+    report: ImportReport,
+    max_reported_issues: int,
+) -> None:
+    """Загружает пакет и записывает в отчёт строки с занятыми именами
+
+    Из нескольких строк пакета с одинаковым именем создаётся первая.
+    """
+    created = await repository.import_batch(batch)
+    report.created += len(created)
+
+    for line_number, url_data in batch:
+        if url_data.short_name in created:
+            created.discard(url_data.short_name)
+            continue
+        report.add_conflict(
+            ImportIssue(
+                line=line_number,
+                short_name=url_data.short_name,
+                detail=f"Short name '{url_data.short_name}' already exists",
+            ),
+            max_reported_issues,
+        )
+
+
+def _describe_validation_error(error: ValidationError) -> str:
+    """Краткое описание ошибки валидации строки"""
+    return "; ".join(
+        f"{'.'.join(map(str, item['loc'])) or 'row'}: {item['msg']}"
+        for item in error.errors()
+    )
@@ -0,0 +1,104 @@
+"""Создание индексов моделей на существующих таблицах: python -m app.indexes
+
+create_all при запуске создаёт индексы только вместе с новыми таблицами.
+Индексы, добавленные к уже существующей таблице, создаются этой командой
+через CREATE INDEX CONCURRENTLY: построение не блокирует запись в таблицу.
+Уже созданные индексы пропускаются, поэтому команду можно запускать повторно.
+Индекс, оставшийся невалидным после прерванного построения, удаляется и
+строится заново.
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import Connection, Engine, Index, text
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def create_index_statement(index: Index, connection: Connection) -> str | None:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS для индекса модели
+
+    Возвращает None, если индекс не нужен этой базе по условию ddl_if,
+    например индекс по триграммам без расширения pg_trgm.
+    """
+    create = CreateIndex(index, if_not_exists=True)
+    if index._ddl_if is not None and not index._ddl_if._should_execute(
+        create, index, connection
+    ):
+        return None
+    statement = str(create.compile(dialect=connection.dialect))
+    # Диалект добавляет CONCURRENTLY только по параметру самого индекса, а
+    # в моделях его ставить нельзя: create_all выполняется в транзакции
+    return statement.replace(
+        "INDEX IF NOT EXISTS", "INDEX CONCURRENTLY IF NOT EXISTS", 1
+    )
+
+
+def index_is_invalid(connection: Connection, name: str) -> bool:
+    """Индекс существует, но помечен невалидным после прерванного построения"""
+    return bool(
+        connection.scalar(
+            text(
+                "SELECT NOT i.indisvalid FROM pg_index i"
+                " JOIN pg_class c ON c.oid = i.indexrelid"
+                " WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+            ),
+            {"name": name},
+        )
+    )
+
+
+def create_missing_indexes(target: Engine = engine) -> list[str]:
+    """Создать недостающие индексы всех таблиц моделей
+
+    CONCURRENTLY нельзя выполнять в транзакции, поэтому соединение работает
+    в режиме AUTOCOMMIT. Возвращает имена индексов, для которых выполнялась
+    команда.
+    """
+    created = []
+    with target.connect().execution_options(isolation_level="AUTOCOMMIT") as (
+        connection
+    ):
+        for table in SQLModel.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                statement = create_index_statement(index, connection)
+                if statement is None:
+                    logger.info("Skipping %s", index.name)
+                    continue
+                if index_is_invalid(connection, index.name):
+                    logger.warning("Rebuilding invalid index %s", index.name)
+                    connection.exec_driver_sql(
+                        f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'
+                    )
+                logger.info("%s", statement)
+                connection.exec_driver_sql(statement)
+                created.append(index.name)
+    return created
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.indexes",
+        description="Create missing model indexes with CREATE INDEX CONCURRENTLY",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parse_args(argv)
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    try:
+        created = create_missing_indexes()
+    finally:
+        engine.dispose()
+    logger.info("Done, %d indexes checked", len(created))
+
+
+if __name__ == "__main__":
+    main()
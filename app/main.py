@@ -1,20 +1,120 @@
+import asyncio
+import hmac
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+)
+from starlette.routing import Route
 
+from app.admission import Overloaded, redirect_admission
 from app.api import router
-from app.database import create_db_and_tables
-from app.dependencies import get_url_repository
-from app.repository import URLRepositoryProtocol
+from app.bloom import ShortNameFilter, short_name_filter
+from app.cache import LRUCache, RedirectTarget, redirect_cache
+from app.clicks import (
+    ClickBuffer,
+    click_buffer,
+    flush_clicks_to_database,
+    run_click_flusher,
+)
+from app.config import (
+    CLICK_FLUSH_INTERVAL,
+    CREATE_TABLES_ON_STARTUP,
+    DB_POOL_WARM_CONNECTIONS,
+    LINK_PURGE_BATCH_SIZE,
+    LINK_PURGE_INTERVAL,
+    PRELOAD_REDIRECTS,
+    PROFILE_SECRET,
+    REDIRECT_FAST_PATH,
+    REDIRECT_MAX_AGE,
+    REDIRECT_STATUS_CODE,
+    SHORT_NAME_FILTER_ENABLED,
+    SHORT_NAME_FILTER_REBUILD_INTERVAL,
+)
+from app.database import (
+    AsyncSessionLocal,
+    SessionFactory,
+    async_engine,
+    create_db_and_tables,
+)
+from app.dependencies import (
+    get_click_buffer,
+    get_redirect_cache,
+    get_replica_set,
+    get_session_factory,
+    get_short_name_filter,
+    get_url_repository,
+)
+from app.edge_cache import REFRESH_HEADER, redirect_cache_headers, redirect_purger
+from app.expiry import run_link_purger
+from app.fast_redirect import RedirectEndpoint, link_not_found_detail
+from app.health import readiness, startup_phase, warm_up_pool
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.name_filter import (
+    rebuild_short_name_filter_from_database,
+    run_short_name_filter_rebuilder,
+)
+from app.preload import preload_redirects_from_database
+from app.profiling import (
+    PROFILE_HEADER,
+    PROFILES_PATH,
+    ProfilingMiddleware,
+    profile_store,
+)
+from app.replicas import ReplicaSet, replica_set
+from app.repository import AsyncURLRepository, AsyncURLRepositoryProtocol
+from app.single_flight import redirect_lookups
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    create_db_and_tables()
+    with startup_phase("total"):
+        if CREATE_TABLES_ON_STARTUP:
+            with startup_phase("schema"):
+                create_db_and_tables()
+        with startup_phase("pool"):
+            await warm_up_pool(async_engine, DB_POOL_WARM_CONNECTIONS)
+        background_tasks = [
+            asyncio.create_task(run_click_flusher(click_buffer, CLICK_FLUSH_INTERVAL))
+        ]
+        if LINK_PURGE_INTERVAL > 0:
+            background_tasks.append(
+                asyncio.create_task(
+                    run_link_purger(LINK_PURGE_INTERVAL, LINK_PURGE_BATCH_SIZE)
+                )
+            )
+        if SHORT_NAME_FILTER_ENABLED:
+            with startup_phase("short_name_filter"):
+                await rebuild_short_name_filter_from_database(short_name_filter)
+            background_tasks.append(
+                asyncio.create_task(
+                    run_short_name_filter_rebuilder(
+                        short_name_filter, SHORT_NAME_FILTER_REBUILD_INTERVAL
+                    )
+                )
+            )
+        if PRELOAD_REDIRECTS > 0:
+            with startup_phase("preload_redirects"):
+                await preload_redirects_from_database(
+                    redirect_cache, PRELOAD_REDIRECTS, replica_set
+                )
+    readiness.mark_ready()
     yield
+    readiness.mark_not_ready("shutting down")
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await flush_clicks_to_database(click_buffer)
+    await redirect_purger.wait()
+    await async_engine.dispose()
+    await replica_set.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -29,8 +129,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
-    expose_headers=["Content-Range"],
+    expose_headers=["Content-Range", "X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def handle_overloaded(_: Request, error: Overloaded) -> JSONResponse:
+    """Запрос не дождался допуска к базе: клиенту стоит повторить позже"""
+    return JSONResponse(
+        {"detail": str(error)},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(error.retry_after)},
+    )
 
 
 @app.get("/ping")
@@ -38,19 +150,138 @@ async def get_pong():
     return "pong"
 
 
+@app.get("/ready")
+async def get_readiness() -> JSONResponse:
+    """Готовность принимать трафик: 503, пока пул соединений не прогрет"""
+    status_code = (
+        status.HTTP_200_OK if readiness.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    return JSONResponse({"status": readiness.reason}, status_code=status_code)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """Метрики приложения в формате Prometheus"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+def require_profile_secret(
+    secret: str | None = Header(None, alias=PROFILE_HEADER),
+) -> None:
+    """Профили доступны только с секретом PROFILE_SECRET в заголовке X-Profile"""
+    if (
+        not PROFILE_SECRET
+        or secret is None
+        or not hmac.compare_digest(secret.encode(), PROFILE_SECRET.encode())
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+
+@app.get(
+    PROFILES_PATH,
+    include_in_schema=False,
+    dependencies=[Depends(require_profile_secret)],
+)
+async def get_profiles() -> list[dict]:
+    """Сохранённые профили запросов, новые первыми"""
+    return await asyncio.to_thread(profile_store.summaries)
+
+
+@app.get(
+    PROFILES_PATH + "/{profile_id}",
+    include_in_schema=False,
+    dependencies=[Depends(require_profile_secret)],
+)
+async def get_profile(profile_id: str) -> dict:
+    """Сводка профиля: SQL-запросы с длительностью и статистика cProfile"""
+    summary = await asyncio.to_thread(profile_store.get, profile_id)
+    if summary is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return summary
+
+
+@app.get(
+    PROFILES_PATH + "/{profile_id}/download",
+    include_in_schema=False,
+    dependencies=[Depends(require_profile_secret)],
+)
+async def download_profile(profile_id: str) -> FileResponse:
+    """Файл профиля для pstats или snakeviz"""
+    path = profile_store.stats_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
 @app.get("/r/{short_name}", name="redirect_link")
 async def redirect_link(
     short_name: str,
-    repository: URLRepositoryProtocol = Depends(get_url_repository),
+    request: Request,
+    repository: AsyncURLRepositoryProtocol = Depends(get_url_repository),
+    clicks: ClickBuffer = Depends(get_click_buffer),
+    session_factory: SessionFactory = Depends(get_session_factory),
+    cache: LRUCache[str, RedirectTarget] = Depends(get_redirect_cache),
+    name_filter: ShortNameFilter = Depends(get_short_name_filter),
+    replicas: ReplicaSet | None = Depends(get_replica_set),
 ) -> RedirectResponse:
-    """Редирект по короткому имени ссылки"""
-    url = repository.get_by_short_name(short_name)
-    if url is None:
+    """Редирект по короткому имени ссылки
+
+    Ответ, в том числе 404, можно кэшировать REDIRECT_MAX_AGE секунд, но
+    не дольше срока действия ссылки. Запрос на обновление кэша nginx минует
+    кэш процесса, читается из основной базы и не считается переходом.
+    Одновременные запросы одного имени ждут одного чтения из базы. Оно
+    идёт в своей сессии: сессия запроса закрывается при его отмене, а
+    чтение продолжается для остальных ожидающих.
+    """
+
+    async def read_target() -> RedirectTarget | None:
+        async with session_factory() as session:
+            shared = AsyncURLRepository(
+                session, cache, name_filter=name_filter, replicas=replicas
+            )
+            return await shared.get_redirect_target(short_name)
+
+    refresh = REFRESH_HEADER in request.headers
+    if refresh:
+        target = await repository.load_redirect_target(short_name)
+    else:
+        target = await redirect_lookups.do(short_name, read_target)
+    headers = redirect_cache_headers(
+        REDIRECT_MAX_AGE, target.expires_at if target else None
+    )
+    if target is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Link with short name '{short_name}' not found",
+            detail=link_not_found_detail(short_name),
+            headers=headers,
         )
-    return RedirectResponse(url.original_url)
+    if not refresh:
+        clicks.record(short_name)
+    return RedirectResponse(
+        target.original_url, status_code=REDIRECT_STATUS_CODE, headers=headers
+    )
 
 
 app.include_router(router, prefix="/api")
+
+# Быстрый обработчик редиректов стоит первым и перехватывает GET /r/{short_name}
+# до маршрута redirect_link, который остаётся в схеме OpenAPI
+redirect_endpoint = RedirectEndpoint(
+    AsyncSessionLocal,
+    redirect_cache,
+    short_name_filter,
+    click_buffer,
+    replica_set,
+    redirect_admission,
+    redirect_lookups,
+)
+if REDIRECT_FAST_PATH:
+    app.router.routes.insert(
+        0,
+        Route(
+            "/r/{short_name}",
+            redirect_endpoint,
+            methods=["GET"],
+            name="redirect_link_fast",
+        ),
+    )
@@ -0,0 +1,361 @@
+import math
+import time
+from collections.abc import Callable, Iterable, Sequence
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, TypeVar
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+M = TypeVar("M", bound="Metric")
+LabelValues = tuple[str, ...]
+Sample = tuple[dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """Метки в формате Prometheus с экранированием значений"""
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Метрика в текстовом формате Prometheus"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        """Значения метрики: суффикс имени, метки и значение"""
+        return ()
+
+    def render(self) -> str:
+        """Метрика в текстовом формате Prometheus"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(
+            f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+            for suffix, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "_total", dict(zip(self.labelnames, key, strict=True)), value
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и уменьшаться"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", dict(zip(self.labelnames, key, strict=True)), value
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = REQUEST_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def get_count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._label_values(labels), ()))
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            values = [
+                (key, list(counts), self._sums[key])
+                for key, counts in self._counts.items()
+            ]
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key, strict=True))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_count", labels, cumulative
+            yield "_sum", labels, total
+
+
+class CallbackMetric(Metric):
+    """Метрика, значения которой вычисляются в момент чтения"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type: str,
+        callback: Callable[[], Iterable[Sample]],
+    ):
+        super().__init__(name, documentation)
+        self.type = type
+        self.callback = callback
+
+    def samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        suffix = "_total" if self.type == "counter" else ""
+        for labels, value in self.callback():
+            yield suffix, labels, value
+
+
+class MetricsRegistry:
+    """Набор метрик, отдаваемых эндпоинтом /metrics"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Добавить метрику в набор"""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(
+    Counter("http_requests", "HTTP requests handled", ["method", "route", "status"])
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency",
+        ["method", "route"],
+    )
+)
+db_queries = registry.register(
+    Counter("db_queries", "SQL statements executed", ["engine", "operation"])
+)
+db_query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "SQL statement execution time",
+        ["engine", "operation"],
+        buckets=QUERY_BUCKETS,
+    )
+)
+db_pool_wait = registry.register(
+    Histogram(
+        "db_pool_wait_seconds",
+        "Time spent waiting for a pool connection",
+        ["engine"],
+        buckets=QUERY_BUCKETS,
+    )
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware, считающее запросы и их длительность по маршрутам
+
+    Маршрут берётся из шаблона пути FastAPI (например /api/links/{link_id}),
+    чтобы число рядов метрик не зависело от значений параметров.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(
+                time.perf_counter() - started, method=method, route=route_path
+            )
+            http_requests.inc(method=method, route=route_path, status=str(status_code))
+
+
+# SQL-запросы профилируемого HTTP-запроса: движок, текст и длительность.
+# Вне профилирования None, и запросы не записываются
+query_trace: ContextVar[list[tuple[str, str, float]] | None] = ContextVar(
+    "query_trace", default=None
+)
+
+
+def _statement_operation(statement: str) -> str:
+    """Вид SQL-запроса по первому слову: SELECT, INSERT, UPDATE и т. п."""
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Подключает к движку учёт запросов и состояния пула соединений
+
+    Для асинхронного движка передаётся его sync_engine.
+    """
+    _engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        operation = _statement_operation(statement)
+        db_queries.inc(engine=name, operation=operation)
+        db_query_duration.observe(duration, engine=name, operation=operation)
+        trace = query_trace.get()
+        if trace is not None:
+            trace.append((name, statement, duration))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context: Any) -> None:
+        connection = context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def instrumented_pool(pool_class: type[QueuePool], name: str) -> type[QueuePool]:
+    """Подкласс пула соединений, измеряющий время ожидания свободного соединения
+
+    Пул пересоздаётся SQLAlchemy через self.__class__, поэтому имя движка
+    хранится в самом классе.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        finally:
+            db_pool_wait.observe(time.perf_counter() - started, engine=name)
+
+    return type(
+        f"Instrumented{pool_class.__name__}", (pool_class,), {"_do_get": _do_get}
+    )
+
+
+def _pool_samples() -> Iterable[Sample]:
+    """Состояние пулов соединений всех подключённых движков"""
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        yield {"engine": name, "state": "size"}, pool.size()
+        yield {"engine": name, "state": "checked_in"}, pool.checkedin()
+        yield {"engine": name, "state": "checked_out"}, pool.checkedout()
+        yield {"engine": name, "state": "overflow"}, max(pool.overflow(), 0)
+
+
+_engines: dict[str, Engine] = {}
+
+registry.register(
+    CallbackMetric(
+        "db_pool_connections",
+        "Pool connections by state",
+        "gauge",
+        _pool_samples,
+    )
+)
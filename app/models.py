@@ -1,14 +1,266 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import DDL, Connection, Index, LargeBinary, Sequence, event, text
 from sqlmodel import Field, SQLModel
 
+# Сколько номеров для коротких имён процесс резервирует за одно обращение к базе
+SHORT_NAME_BLOCK_SIZE = 1000
+
+# Каждое значение последовательности открывает блок из SHORT_NAME_BLOCK_SIZE
+# номеров, из которых генерируются короткие имена
+short_name_sequence = Sequence(
+    "url_short_name_seq",
+    start=1,
+    increment=SHORT_NAME_BLOCK_SIZE,
+    metadata=SQLModel.metadata,
+)
+
 
 class URLBase(SQLModel):
     original_url: str = Field(max_length=2048)
 
 
+def trigram_extension_installed(ddl, target, bind, **kw) -> bool:
+    """Индекс по триграммам создаётся, только если установлен pg_trgm
+
+    Без расширения поиск по подстроке работает, но без индекса. При сборе
+    команд без соединения с базой индекс учитывается.
+    """
+    if not isinstance(bind, Connection):
+        return True
+    return bool(
+        bind.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+    )
+
+
 class URL(URLBase, table=True):
+    # Индексы фильтров списка ссылок: префикс short_name (text_pattern_ops
+    # подходит для LIKE 'abc%' при любой collation), подстрока original_url
+    # (триграммы pg_trgm для ILIKE '%abc%') и диапазон created_at
+    __table_args__ = (
+        Index(
+            "ix_url_short_name_pattern",
+            "short_name",
+            postgresql_ops={"short_name": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_url_original_url_trgm",
+            "original_url",
+            postgresql_using="gin",
+            postgresql_ops={"original_url": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql", callable_=trigram_extension_installed),
+        Index("ix_url_created_at", "created_at"),
+        # Частичный индекс для удаления просроченных ссылок: в нём только
+        # ссылки со сроком действия
+        Index(
+            "ix_url_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     short_name: str = Field(unique=True, index=True, max_length=50)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    click_count: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    last_accessed_at: Optional[datetime] = Field(default=None)
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        sa_column_kwargs={"server_default": text("timezone('utc', now())")},
+    )
+    # Первые 16 байт SHA-256 от original_url для поиска по полному адресу.
+    # Заполняется триггером при каждой записи; у строк, созданных до
+    # появления столбца, пуст до запуска python -m app.backfill
+    original_url_hash: Optional[bytes] = Field(
+        default=None, sa_type=LargeBinary, index=True
+    )
+    # Момент в UTC, после которого ссылка считается удалённой; None — бессрочно
+    expires_at: Optional[datetime] = Field(default=None)
+
+
+# Расширение для индекса по триграммам. Если его нельзя установить (нет
+# прав или пакета postgresql-contrib), схема создаётся без этого индекса
+event.listen(
+    SQLModel.metadata,
+    "before_create",
+    DDL(
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm is not available: %%', SQLERRM;
+        END;
+        $$;
+        """
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Счётчики переходов добавляются и к таблице, созданной до их появления
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        """
+        ALTER TABLE url
+            ADD COLUMN IF NOT EXISTS click_count integer NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS last_accessed_at timestamp;
+        """
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Время изменения ссылки добавляется и к таблице, созданной до его появления;
+# у старых строк оно равно времени обновления схемы
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        """
+        ALTER TABLE url ADD COLUMN IF NOT EXISTS updated_at timestamp
+            NOT NULL DEFAULT timezone('utc', now());
+        """
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Срок действия ссылки добавляется и к таблице, созданной до его появления
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL("ALTER TABLE url ADD COLUMN IF NOT EXISTS expires_at timestamp").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+
+# Дайджест original_url вычисляется в базе функцией url_digest, поэтому его
+# заполняют все способы записи: запросы приложения, COPY и ручной SQL.
+# Столбец добавляется и к таблице, созданной до его появления
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        """
+        ALTER TABLE url ADD COLUMN IF NOT EXISTS original_url_hash bytea;
+
+        CREATE OR REPLACE FUNCTION url_digest(url text) RETURNS bytea AS $$
+            SELECT substring(sha256(convert_to(url, 'UTF8')) FROM 1 FOR 16);
+        $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+        CREATE OR REPLACE FUNCTION set_original_url_hash() RETURNS trigger AS $$
+        BEGIN
+            NEW.original_url_hash = url_digest(NEW.original_url);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE TRIGGER url_set_original_url_hash
+        BEFORE INSERT OR UPDATE OF original_url ON url
+        FOR EACH ROW EXECUTE FUNCTION set_original_url_hash();
+        """
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Идентификатор единственной строки url_version
+URL_VERSION_ID = 1
+
+
+class URLVersion(SQLModel, table=True):
+    """Версия таблицы url, которая растёт, когда меняются сами ссылки
+
+    Используется как дешёвый валидатор списка ссылок: чтобы узнать, менялся
+    ли список, достаточно прочитать одну строку. Сброс счётчиков переходов
+    версию не меняет, иначе под трафиком редиректов она менялась бы каждые
+    CLICK_FLUSH_INTERVAL секунд.
+    """
+
+    __tablename__ = "url_version"
+
+    id: int = Field(default=URL_VERSION_ID, primary_key=True)
+    version: int = Field(default=0)
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Идентификатор единственной строки schema_version
+SCHEMA_VERSION_ID = 1
+
+
+class SchemaVersion(SQLModel, table=True):
+    """Отпечаток схемы, которую последним создавал create_all
+
+    При запуске отпечаток текущих моделей сравнивается с сохранённым, и DDL
+    выполняется, только если они различаются.
+    """
+
+    __tablename__ = "schema_version"
+
+    id: int = Field(default=SCHEMA_VERSION_ID, primary_key=True)
+    fingerprint: str = Field(max_length=64)
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Версию увеличивают триггеры на изменяющие url запросы, поэтому она
+# учитывает и изменения из других процессов. Запрос, который не затронул ни
+# одной строки (импорт с одними конфликтами, удаление отсутствующей ссылки,
+# пустой проход очистки) или изменил только счётчики переходов, дайджест
+# и updated_at, версию не трогает и не ждёт блокировки её строки.
+# Переходные таблицы можно объявить только у триггера на одно событие,
+# поэтому триггеров несколько. Команды идемпотентны и выполняются при
+# каждом create_all, в том числе когда таблица url уже существует.
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        f"""
+        INSERT INTO url_version (id, version, changed_at)
+        VALUES ({URL_VERSION_ID}, 0, timezone('utc', now()))
+        ON CONFLICT (id) DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION bump_url_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM FROM new_rows LIMIT 1;
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM FROM old_rows LIMIT 1;
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM FROM new_rows JOIN old_rows USING (id)
+                WHERE (new_rows.original_url, new_rows.short_name,
+                       new_rows.created_at, new_rows.expires_at)
+                    IS DISTINCT FROM
+                      (old_rows.original_url, old_rows.short_name,
+                       old_rows.created_at, old_rows.expires_at)
+                LIMIT 1;
+            END IF;
+            IF TG_OP = 'TRUNCATE' OR FOUND THEN
+                UPDATE url_version
+                SET version = version + 1, changed_at = timezone('utc', now())
+                WHERE id = {URL_VERSION_ID};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS url_bump_version ON url;
+
+        CREATE OR REPLACE TRIGGER url_bump_version_insert
+        AFTER INSERT ON url REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_url_version();
+
+        CREATE OR REPLACE TRIGGER url_bump_version_update
+        AFTER UPDATE ON url REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_url_version();
+
+        CREATE OR REPLACE TRIGGER url_bump_version_delete
+        AFTER DELETE ON url REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_url_version();
+
+        CREATE OR REPLACE TRIGGER url_bump_version_truncate
+        AFTER TRUNCATE ON url
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_url_version();
+        """
+    ).execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from app.bloom import ShortNameFilter
+from app.database import AsyncSessionLocal
+from app.repository import AsyncURLRepository, AsyncURLRepositoryProtocol
+
+logger = logging.getLogger(__name__)
+
+# Сколько коротких имён читать из серверного курсора за раз при построении
+REBUILD_BATCH_SIZE = 10000
+
+
+async def rebuild_short_name_filter(
+    name_filter: ShortNameFilter, repository: AsyncURLRepositoryProtocol
+) -> None:
+    """Построить фильтр коротких имён по всем ссылкам в базе"""
+    expected_count = await repository.get_estimated_count()
+    await name_filter.rebuild(
+        repository.stream_short_names(REBUILD_BATCH_SIZE), expected_count
+    )
+
+
+async def rebuild_short_name_filter_from_database(name_filter: ShortNameFilter) -> None:
+    """Построить фильтр коротких имён через отдельную сессию
+
+    Ошибка только логируется: до следующей попытки продолжает работать
+    прежний фильтр или, если его ещё нет, все имена проверяются по базе.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            await rebuild_short_name_filter(name_filter, AsyncURLRepository(session))
+    except Exception:
+        logger.exception("Failed to rebuild the short name filter")
+
+
+async def run_short_name_filter_rebuilder(
+    name_filter: ShortNameFilter, interval: float
+) -> None:
+    """Периодически перестраивать фильтр, чтобы забыть удалённые имена"""
+    while True:
+        await asyncio.sleep(interval)
+        await rebuild_short_name_filter_from_database(name_filter)
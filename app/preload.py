@@ -0,0 +1,47 @@
+import logging
+
+from app.cache import LRUCache, RedirectTarget
+from app.database import AsyncSessionLocal
+from app.replicas import ReplicaSet
+from app.repository import (
+    AsyncURLRepository,
+    AsyncURLRepositoryProtocol,
+    cache_original_url,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def preload_redirects(
+    cache: LRUCache[str, RedirectTarget],
+    repository: AsyncURLRepositoryProtocol,
+    limit: int,
+) -> int:
+    """Загрузить в кэш редиректов адреса самых посещаемых ссылок
+
+    Загружается не больше ссылок, чем помещается в кэш. Возвращает число
+    загруженных ссылок.
+    """
+    limit = min(limit, cache.maxsize)
+    if limit <= 0:
+        return 0
+    rows = await repository.get_most_clicked(limit)
+    for short_name, original_url, expires_at in rows:
+        cache_original_url(cache, short_name, original_url, expires_at)
+    return len(rows)
+
+
+async def preload_redirects_from_database(
+    cache: LRUCache[str, RedirectTarget], limit: int, replicas: ReplicaSet | None = None
+) -> int:
+    """Загрузить кэш редиректов через отдельную сессию
+
+    Ошибка только логируется: без предзагрузки кэш заполнится запросами.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            repository = AsyncURLRepository(session, replicas=replicas)
+            return await preload_redirects(cache, repository, limit)
+    except Exception:
+        logger.exception("Failed to preload the redirect cache")
+        return 0
@@ -0,0 +1,250 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import secrets
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import (
+    PROFILE_DIR,
+    PROFILE_MAX_COUNT,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SECRET,
+)
+from app.metrics import Counter, query_trace, registry
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+# Заголовок ответа с идентификатором сохранённого профиля
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Ресурсы профилей сами не профилируются
+PROFILES_PATH = "/debug/profiles"
+
+# Сколько функций с наибольшим суммарным временем попадает в сводку профиля
+TOP_FUNCTIONS = 40
+
+PROFILE_ID_PATTERN = re.compile(r"\d{8}T\d{12}-[0-9a-f]{8}")
+
+PROFILE_HEADER_KEY = PROFILE_HEADER.lower().encode()
+PROFILE_QUERY_KEY = PROFILE_QUERY_PARAM.encode() + b"="
+
+request_profiles = registry.register(
+    Counter("request_profiles", "Profiled HTTP requests", ["trigger"])
+)
+
+
+def new_profile_id() -> str:
+    """Идентификатор профиля: время в UTC и случайный суффикс
+
+    Идентификаторы упорядочены по времени, суффикс различает профили
+    разных процессов, сохранённые в одну микросекунду.
+    """
+    moment = datetime.now(UTC).strftime("%Y%m%dT%H%M%S%f")
+    return f"{moment}-{secrets.token_hex(4)}"
+
+
+def format_stats(profiler: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> str:
+    """Текстовая сводка профиля: функции с наибольшим суммарным временем"""
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+class ProfileStore:
+    """Кольцо профилей на диске
+
+    Профиль — два файла: сводка <id>.json с SQL-запросами и текстовой
+    статистикой и <id>.prof для pstats или snakeviz. Хранятся не больше
+    max_profiles последних профилей, старые удаляются при сохранении.
+    Каталог можно разделять между процессами.
+    """
+
+    def __init__(self, directory: Path, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, profiler: cProfile.Profile, summary: dict) -> None:
+        """Сохранить профиль и удалить вышедшие за размер кольца"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = summary["id"]
+        profiler.dump_stats(self.directory / f"{profile_id}.prof")
+        summary = {**summary, "stats": format_stats(profiler)}
+        # Сводка пишется последней: по ней профиль попадает в список
+        temporary = self.directory / f"{profile_id}.json.tmp"
+        temporary.write_text(json.dumps(summary, ensure_ascii=False))
+        temporary.replace(self.directory / f"{profile_id}.json")
+        self._trim()
+
+    def summaries(self) -> list[dict]:
+        """Сводки профилей без SQL-запросов и статистики, новые первыми"""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            summary = self.get(profile_id)
+            if summary is not None:
+                summary.pop("queries", None)
+                summary.pop("stats", None)
+                profiles.append(summary)
+        return profiles
+
+    def get(self, profile_id: str) -> dict | None:
+        """Сводка профиля или None, если его нет"""
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        try:
+            return json.loads((self.directory / f"{profile_id}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def stats_path(self, profile_id: str) -> Path | None:
+        """Путь к файлу pstats профиля или None, если его нет"""
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.is_file() else None
+
+    def _ids(self) -> list[str]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    def _trim(self) -> None:
+        for profile_id in self._ids()[: -self.max_profiles or None]:
+            for suffix in (".json", ".prof"):
+                (self.directory / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware, профилирующее отдельные запросы
+
+    Запрос профилируется, если в нём передан секрет (заголовок X-Profile
+    или параметр profile) или он выбран случайно с долей sample_rate.
+    Профиль cProfile сохраняется вместе с SQL-запросами, выполненными
+    в контексте запроса, а его идентификатор возвращается в заголовке
+    X-Profile-Id. Остальные запросы проходят без дополнительной работы,
+    кроме сравнения случайного числа и поиска заголовка при заданном
+    секрете.
+
+    cProfile видит все задачи цикла событий, поэтому в профиль попадает
+    и работа запросов, выполнявшихся одновременно с профилируемым.
+    В процессе одновременно профилируется только один запрос.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: ProfileStore | None = None,
+        secret: str = PROFILE_SECRET,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        random: Callable[[], float] = random.random,
+    ):
+        self.app = app
+        self.store = store or profile_store
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.random = random
+        self._active = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None or scope["path"].startswith(PROFILES_PATH):
+            await self.app(scope, receive, send)
+            return
+        await self._profile(scope, receive, send, trigger)
+
+    def _trigger(self, scope: Scope) -> str | None:
+        """Причина профилировать запрос или None"""
+        if self.secret and self._has_secret(scope):
+            return "request"
+        if self.sample_rate > 0 and self.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def _has_secret(self, scope: Scope) -> bool:
+        secret = self.secret.encode()
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER_KEY and hmac.compare_digest(value, secret):
+                return True
+        query_string = scope.get("query_string", b"")
+        if PROFILE_QUERY_KEY not in query_string:
+            return False
+        return any(
+            name == PROFILE_QUERY_PARAM and hmac.compare_digest(value.encode(), secret)
+            for name, value in parse_qsl(query_string.decode("latin-1"))
+        )
+
+    async def _profile(
+        self, scope: Scope, receive: Receive, send: Send, trigger: str
+    ) -> None:
+        profile_id = new_profile_id()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_ID_HEADER.lower().encode(), profile_id.encode()),
+                ]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        queries: list[tuple[str, str, float]] = []
+        self._active = True
+        token = query_trace.set(queries)
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Уже работает другой профилировщик
+            query_trace.reset(token)
+            self._active = False
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            query_trace.reset(token)
+            self._active = False
+            request_profiles.inc(trigger=trigger)
+            summary = {
+                "id": profile_id,
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration": duration,
+                "query_count": len(queries),
+                "query_time": sum(query[2] for query in queries),
+                "queries": [
+                    {"engine": engine, "statement": statement, "duration": elapsed}
+                    for engine, statement, elapsed in queries
+                ],
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profiler, summary)
+            except OSError:
+                logger.exception("Failed to save profile %s", profile_id)
+
+
+# Профили в PROFILE_DIR
+profile_store = ProfileStore(Path(PROFILE_DIR), PROFILE_MAX_COUNT)
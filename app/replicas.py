@@ -0,0 +1,112 @@
+import time
+from collections.abc import Callable
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import DATABASE_REPLICA_RETRY_INTERVAL, DATABASE_REPLICA_SELECTION
+from app.database import replica_engines
+from app.metrics import CallbackMetric, Counter, registry
+
+# Способы выбора реплики
+SELECTION_STRATEGIES = ("round_robin", "least_connections")
+
+db_replica_failovers = registry.register(
+    Counter(
+        "db_replica_failovers",
+        "Reads moved from an unavailable replica to the primary",
+        ["replica"],
+    )
+)
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """Ошибка говорит о недоступности базы, а не об ошибке в самом запросе"""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(
+            error, (OperationalError, InterfaceError)
+        )
+    return isinstance(error, (OSError, TimeoutError))
+
+
+class ReplicaSet:
+    """Реплики базы данных для чтения
+
+    Реплика выбирается по кругу или с наименьшим числом занятых соединений
+    пула; при равенстве выбор тоже идёт по кругу. Реплика, на которой чтение
+    не выполнилось из-за её недоступности, пропускается retry_interval
+    секунд, после чего снова получает запросы. Если доступных реплик нет,
+    choose возвращает None и чтение выполняется в основной базе.
+    """
+
+    def __init__(
+        self,
+        engines: dict[str, AsyncEngine],
+        retry_interval: float,
+        strategy: str = "round_robin",
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        if strategy not in SELECTION_STRATEGIES:
+            raise ValueError(f"Unknown replica selection strategy '{strategy}'")
+
+        self.engines = engines
+        self.retry_interval = retry_interval
+        self.strategy = strategy
+        self._timer = timer
+        self._turn = 0
+        self._retry_at: dict[str, float] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def is_available(self, name: str) -> bool:
+        """Реплика не отмечена недоступной или время повторной попытки прошло"""
+        return self._retry_at.get(name, 0) <= self._timer()
+
+    def choose(self) -> AsyncEngine | None:
+        """Выбрать реплику для чтения"""
+        available = [name for name in self.engines if self.is_available(name)]
+        if not available:
+            return None
+
+        self._turn += 1
+        start = self._turn % len(available)
+        ordered = available[start:] + available[:start]
+        if self.strategy == "least_connections":
+            return min(
+                (self.engines[name] for name in ordered),
+                key=lambda engine: engine.pool.checkedout(),
+            )
+        return self.engines[ordered[0]]
+
+    def mark_failed(self, engine: AsyncEngine) -> None:
+        """Исключить недоступную реплику на retry_interval секунд"""
+        for name, replica in self.engines.items():
+            if replica is engine:
+                self._retry_at[name] = self._timer() + self.retry_interval
+                db_replica_failovers.inc(replica=name)
+
+    async def dispose(self) -> None:
+        """Закрыть соединения всех реплик"""
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+# Реплики из DATABASE_REPLICA_URLS
+replica_set = ReplicaSet(
+    replica_engines,
+    retry_interval=DATABASE_REPLICA_RETRY_INTERVAL,
+    strategy=DATABASE_REPLICA_SELECTION,
+)
+
+registry.register(
+    CallbackMetric(
+        "db_replica_available",
+        "Whether a read replica currently receives queries",
+        "gauge",
+        lambda: [
+            ({"replica": name}, float(replica_set.is_available(name)))
+            for name in replica_set.engines
+        ],
+    )
+)
@@ -1,100 +1,881 @@
-from typing import Protocol
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from typing import Any, Protocol
 
-from sqlmodel import Session, select
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    Row,
+    String,
+    Table,
+    Text,
+    and_,
+    cast,
+    column,
+    delete,
+    func,
+    or_,
+    table,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateTable
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.dto import URLCreate, URLUpdate
-from app.models import URL
+from app.bloom import ShortNameFilter
+from app.cache import ExpiringValue, LRUCache, RedirectTarget
+from app.dto import LinkFilter, URLCreate, URLUpdate
+from app.edge_cache import RedirectPurger
+from app.models import URL, URL_VERSION_ID, URLVersion
+from app.replicas import ReplicaSet, is_unavailable
+from app.short_names import ShortNameAllocator
 
+# Сколько раз пробовать сгенерированные имена, если имя уже занято вручную
+SHORT_NAME_ATTEMPTS = 5
 
-class URLRepositoryProtocol(Protocol):
-    """Протокол для репозитория URL"""
+# Столбцы, которые отдаёт список ссылок API. Страницы читаются кортежами
+# этих столбцов без создания ORM-объектов
+LIST_COLUMNS = (
+    URL.id,
+    URL.original_url,
+    URL.short_name,
+    URL.click_count,
+    URL.last_accessed_at,
+    URL.expires_at,
+)
 
-    def get_all(self, offset: int = 0, limit: int | None = None) -> list[URL]:
+# Символ экранирования в шаблонах LIKE фильтра списка ссылок
+LIKE_ESCAPE = "/"
+
+# Ключ session.info: в сессии была запись, и чтения идут в основную базу
+PRIMARY_ONLY = "primary_only"
+
+# Ключ session.info: реплика, выбранная для всех чтений сессии
+READ_REPLICA = "read_replica"
+
+# Столбцы выгрузки: все, кроме служебного дайджеста адреса
+EXPORT_COLUMNS = tuple(
+    column for column in URL.__table__.columns if column.name != "original_url_hash"
+)
+
+# Системный каталог PostgreSQL со статистикой планировщика по таблицам
+pg_class = table("pg_class", column("oid"), column("reltuples"))
+
+# Временная таблица для массового импорта: строки загружаются в неё через COPY
+# и переносятся в url одним запросом
+url_import = Table(
+    "url_import",
+    MetaData(),
+    Column("line", Integer),
+    Column("original_url", Text),
+    Column("short_name", Text),
+    Column("expires_at", DateTime),
+    prefixes=["TEMPORARY"],
+)
+
+
+class ShortNameExistsError(Exception):
+    """Короткое имя уже занято другой ссылкой"""
+
+    def __init__(self, short_name: str):
+        super().__init__(f"Short name '{short_name}' already exists")
+        self.short_name = short_name
+
+
+def not_expired():
+    """Условие для ссылок без срока действия или с ещё не истёкшим сроком
+
+    Время берётся в базе, поэтому все процессы сравнивают с одними часами.
+    """
+    return or_(
+        URL.expires_at.is_(None),
+        URL.expires_at > func.timezone("utc", func.now()),
+    )
+
+
+def cache_original_url(
+    cache: LRUCache[str, RedirectTarget],
+    short_name: str,
+    original_url: str,
+    expires_at: datetime | None,
+) -> None:
+    """Записать адрес перехода в кэш не дольше срока действия ссылки"""
+    target = RedirectTarget(original_url, expires_at)
+    if expires_at is None:
+        cache.set(short_name, target)
+        return
+    ttl = (expires_at - datetime.utcnow()).total_seconds()
+    if ttl > 0:
+        cache.set(short_name, target, ttl=ttl)
+
+
+def insert_url_statement(
+    original_url: str, short_name: str, expires_at: datetime | None = None
+):
+    """INSERT ссылки, который ничего не вставляет, если имя уже занято"""
+    now = datetime.utcnow()
+    return (
+        pg_insert(URL)
+        .values(
+            original_url=original_url,
+            short_name=short_name,
+            created_at=now,
+            updated_at=now,
+            expires_at=expires_at,
+        )
+        .on_conflict_do_nothing(index_elements=["short_name"])
+        .returning(URL)
+    )
+
+
+def update_url_statement(url_id: int, url_data: URLUpdate):
+    """UPDATE ссылки, возвращающий новую строку и прежнее короткое имя
+
+    Прежнее имя читается в CTE с блокировкой строки до изменения.
+    """
+    old_url = (
+        select(URL.id, URL.short_name)
+        .where(URL.id == url_id)
+        .with_for_update()
+        .cte("old_url")
+    )
+    return (
+        update(URL)
+        .where(URL.id == old_url.c.id)
+        .values(
+            original_url=url_data.original_url,
+            short_name=url_data.short_name,
+            expires_at=url_data.expires_at,
+            updated_at=datetime.utcnow(),
+        )
+        .returning(URL, old_url.c.short_name.label("old_short_name"))
+    )
+
+
+def original_url_matches(original_url: str):
+    """Условие точного совпадения адреса через индекс по дайджесту
+
+    Строки, у которых дайджест ещё не заполнен, тоже проверяются: до окончания
+    заполнения их находит отдельный поиск по тому же индексу.
+    """
+    return and_(
+        or_(
+            URL.original_url_hash == func.url_digest(original_url),
+            URL.original_url_hash.is_(None),
+        ),
+        URL.original_url == original_url,
+    )
+
+
+def escape_like(value: str) -> str:
+    """Экранировать спецсимволы LIKE; символ экранирования — LIKE_ESCAPE"""
+    for char in (LIKE_ESCAPE, "%", "_"):
+        value = value.replace(char, LIKE_ESCAPE + char)
+    return value
+
+
+def filter_urls(statement, link_filter: LinkFilter | None):
+    """Добавить к запросу условия фильтра списка ссылок
+
+    Шаблоны LIKE собираются целиком в Python, чтобы база получала префикс
+    и подстроку параметром и могла использовать индексы
+    ix_url_short_name_pattern и ix_url_original_url_trgm.
+    """
+    if link_filter is None:
+        return statement
+    if link_filter.id is not None:
+        statement = statement.where(URL.id.in_(link_filter.id))
+    if link_filter.short_name:
+        statement = statement.where(
+            URL.short_name.like(
+                escape_like(link_filter.short_name) + "%", escape=LIKE_ESCAPE
+            )
+        )
+    if link_filter.original_url:
+        statement = statement.where(
+            URL.original_url.ilike(
+                "%" + escape_like(link_filter.original_url) + "%", escape=LIKE_ESCAPE
+            )
+        )
+    if link_filter.original_url_eq:
+        statement = statement.where(original_url_matches(link_filter.original_url_eq))
+    if link_filter.created_at_gte is not None:
+        statement = statement.where(URL.created_at >= link_filter.created_at_gte)
+    if link_filter.created_at_lte is not None:
+        statement = statement.where(URL.created_at <= link_filter.created_at_lte)
+    return statement
+
+
+def delete_url_statement(url_id: int):
+    """DELETE ссылки, возвращающий её короткое имя"""
+    return delete(URL).where(URL.id == url_id).returning(URL.short_name)
+
+
+def delete_expired_statement(batch_size: int):
+    """DELETE пакета просроченных ссылок, возвращающий их короткие имена
+
+    Строки выбираются по частичному индексу ix_url_expires_at и блокируются
+    с SKIP LOCKED: строки, занятые другими запросами или другим процессом,
+    удаляются следующим пакетом.
+    """
+    expired = (
+        select(URL.id)
+        .where(URL.expires_at <= func.timezone("utc", func.now()))
+        .order_by(URL.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        delete(URL)
+        .where(URL.id.in_(expired.scalar_subquery()))
+        .returning(URL.short_name)
+    )
+
+
+class AsyncURLRepositoryProtocol(Protocol):
+    """Протокол для асинхронного репозитория URL"""
+
+    async def get_all(self, offset: int = 0, limit: int | None = None) -> list[URL]:
         """Получить все URL из базы данных с пагинацией"""
         ...
 
-    def get_total_count(self) -> int:
+    async def get_total_count(self, link_filter: LinkFilter | None = None) -> int:
         """Получить общее количество URL в базе данных"""
         ...
 
-    def get_by_id(self, url_id: int) -> URL | None:
+    async def get_page(
+        self, offset: int, limit: int, link_filter: LinkFilter | None = None
+    ) -> tuple[Sequence[Row], int]:
+        """Получить страницу URL вместе с общим количеством"""
+        ...
+
+    async def get_rows(self, offset: int, limit: int) -> Sequence[Row]:
+        """Получить страницу URL без общего количества"""
+        ...
+
+    async def get_cached_count(self) -> int:
+        """Получить общее количество URL из кэша"""
+        ...
+
+    async def get_after(
+        self, after_id: int | None, limit: int, link_filter: LinkFilter | None = None
+    ) -> Sequence[Row]:
+        """Получить страницу URL, следующих за указанным ID"""
+        ...
+
+    async def get_estimated_count(self) -> int:
+        """Получить оценку количества URL"""
+        ...
+
+    async def get_by_id(self, url_id: int) -> URL | None:
         """Получить URL по ID"""
         ...
 
-    def get_by_short_name(self, short_name: str) -> URL | None:
+    async def get_by_short_name(self, short_name: str) -> URL | None:
         """Получить URL по короткому имени"""
         ...
 
-    def create(self, url_data: URLCreate) -> URL:
-        """Создать новый URL"""
+    async def get_by_original_url(self, original_url: str) -> URL | None:
+        """Получить URL по полному адресу перехода"""
+        ...
+
+    async def get_updated_at(self, url_id: int) -> datetime | None:
+        """Получить время последнего изменения URL"""
+        ...
+
+    async def get_version(self) -> tuple[int, datetime] | None:
+        """Получить версию таблицы URL и время её изменения"""
+        ...
+
+    async def get_redirect_target(self, short_name: str) -> RedirectTarget | None:
+        """Получить адрес перехода и срок действия ссылки по короткому имени"""
+        ...
+
+    async def load_redirect_target(self, short_name: str) -> RedirectTarget | None:
+        """Прочитать адрес перехода из базы и сохранить его в кэше"""
+        ...
+
+    async def get_most_clicked(self, limit: int) -> Sequence[Row]:
+        """Получить короткие имена и адреса самых посещаемых URL"""
         ...
 
-    def update(self, url_id: int, url_data: URLUpdate) -> URL | None:
-        """Обновить существующий URL"""
+    async def create(self, url_data: URLCreate) -> URL:
+        """Создать новый URL
+
+        Если короткое имя занято, выбрасывается ShortNameExistsError.
+        """
+        ...
+
+    async def get_or_create(self, url_data: URLCreate) -> tuple[URL, bool]:
+        """Вернуть URL с тем же адресом или создать новый и признак создания"""
+        ...
+
+    async def update(self, url_id: int, url_data: URLUpdate) -> URL | None:
+        """Обновить существующий URL
+
+        Если новое короткое имя занято, выбрасывается ShortNameExistsError.
+        """
         ...
 
-    def delete(self, url_id: int) -> bool:
+    async def delete(self, url_id: int) -> bool:
         """Удалить URL"""
         ...
 
+    async def import_batch(self, rows: list[tuple[int, URLCreate]]) -> set[str]:
+        """Создать пакет URL, пропустив занятые короткие имена"""
+        ...
 
-class URLRepository(URLRepositoryProtocol):
-    def __init__(self, session: Session):
+    def stream_all(self, batch_size: int) -> AsyncIterator[Sequence[Sequence[Any]]]:
+        """Прочитать все URL пакетами через серверный курсор"""
+        ...
+
+    async def add_clicks(self, clicks: dict[str, tuple[int, datetime]]) -> None:
+        """Добавить накопленные переходы к счётчикам URL"""
+        ...
+
+    async def backfill_original_url_hashes(self, batch_size: int) -> int:
+        """Заполнить дайджест адреса у пакета старых строк"""
+        ...
+
+    async def purge_expired(self, batch_size: int) -> list[str]:
+        """Удалить пакет просроченных URL"""
+        ...
+
+    def stream_short_names(self, batch_size: int) -> AsyncIterator[Sequence[str]]:
+        """Прочитать все короткие имена пакетами через серверный курсор"""
+        ...
+
+
+class AsyncURLRepository(AsyncURLRepositoryProtocol):
+    def __init__(
+        self,
+        session: AsyncSession,
+        cache: LRUCache[str, RedirectTarget] | None = None,
+        count_cache: ExpiringValue[int] | None = None,
+        short_names: ShortNameAllocator | None = None,
+        name_filter: ShortNameFilter | None = None,
+        purger: RedirectPurger | None = None,
+        replicas: ReplicaSet | None = None,
+    ):
         self.session = session
+        self.cache = cache
+        self.count_cache = count_cache
+        self.short_names = short_names
+        self.name_filter = name_filter
+        self.purger = purger
+        self.replicas = replicas
 
-    def get_all(self, offset: int = 0, limit: int | None = None) -> list[URL]:
+    async def get_all(self, offset: int = 0, limit: int | None = None) -> list[URL]:
         """Получить все URL из базы данных с пагинацией"""
-        statement = select(URL)
+        statement = select(URL).order_by(URL.id)
         if limit is not None:
             statement = statement.offset(offset).limit(limit)
         else:
             statement = statement.offset(offset)
-        result = self.session.exec(statement)
+        result = await self._read(statement)
         return result.all()
 
-    def get_total_count(self) -> int:
-        """Получить общее количество URL в базе данных"""
-        statement = select(URL)
-        result = self.session.exec(statement)
-        return len(result.all())
+    async def get_total_count(self, link_filter: LinkFilter | None = None) -> int:
+        """Получить общее количество URL в базе данных, подходящих под фильтр"""
+        statement = filter_urls(select(func.count()).select_from(URL), link_filter)
+        result = await self._read(statement)
+        return result.one()
 
-    def get_by_id(self, url_id: int) -> URL | None:
+    async def get_page(
+        self, offset: int, limit: int, link_filter: LinkFilter | None = None
+    ) -> tuple[Sequence[Row], int]:
+        """Получить страницу URL вместе с общим количеством одним запросом
+
+        Возвращаются кортежи LIST_COLUMNS и столбца total_count. Количество
+        считается оконной функцией по всей отфильтрованной выборке
+        до применения OFFSET/LIMIT. Для пустой страницы строк нет,
+        и количество запрашивается отдельно.
+        """
+        statement = (
+            filter_urls(
+                select(*LIST_COLUMNS, func.count().over().label("total_count")),
+                link_filter,
+            )
+            .order_by(URL.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        result = await self._read(statement)
+        rows = result.all()
+        if not rows:
+            return [], await self.get_total_count(link_filter)
+        return rows, rows[0].total_count
+
+    async def get_rows(self, offset: int, limit: int) -> Sequence[Row]:
+        """Получить страницу URL кортежами LIST_COLUMNS без общего количества"""
+        statement = select(*LIST_COLUMNS).order_by(URL.id).offset(offset).limit(limit)
+        result = await self._read(statement)
+        return result.all()
+
+    async def get_after(
+        self, after_id: int | None, limit: int, link_filter: LinkFilter | None = None
+    ) -> Sequence[Row]:
+        """Получить страницу URL, следующих за указанным ID, кортежами LIST_COLUMNS
+
+        Keyset-пагинация: вместо OFFSET используется условие по первичному
+        ключу, поэтому глубокие страницы читаются так же быстро, как первая.
+        """
+        statement = (
+            filter_urls(select(*LIST_COLUMNS), link_filter)
+            .order_by(URL.id)
+            .limit(limit)
+        )
+        if after_id is not None:
+            statement = statement.where(URL.id > after_id)
+        result = await self._read(statement)
+        return result.all()
+
+    async def get_cached_count(self) -> int:
+        """Получить общее количество URL из кэша, обновив его при необходимости"""
+        if self.count_cache is None:
+            return await self.get_total_count()
+
+        total_count = self.count_cache.get()
+        if total_count is None:
+            total_count = await self.get_total_count()
+            self.count_cache.set(total_count)
+        return total_count
+
+    async def get_estimated_count(self) -> int:
+        """Получить оценку количества URL по статистике планировщика
+
+        Если таблица ещё не анализировалась, оценки нет и выполняется точный
+        подсчёт.
+        """
+        statement = select(cast(pg_class.c.reltuples, BigInteger)).where(
+            pg_class.c.oid == func.to_regclass(URL.__tablename__)
+        )
+        result = await self._read(statement)
+        estimate = result.one_or_none()
+        if estimate is None or estimate < 0:
+            return await self.get_total_count()
+        return estimate
+
+    async def get_by_id(self, url_id: int) -> URL | None:
         """Получить URL по ID"""
         statement = select(URL).where(URL.id == url_id)
-        result = self.session.exec(statement)
+        result = await self._read(statement)
         return result.one_or_none()
 
-    def get_by_short_name(self, short_name: str) -> URL | None:
-        """Получить URL по короткому имени"""
-        statement = select(URL).where(URL.short_name == short_name)
-        result = self.session.exec(statement)
+    async def get_by_short_name(self, short_name: str) -> URL | None:
+        """Получить URL по короткому имени; просроченные считаются удалёнными"""
+        statement = select(URL).where(URL.short_name == short_name, not_expired())
+        result = await self._read(statement)
         return result.one_or_none()
 
-    def create(self, url_data: URLCreate) -> URL:
-        """Создать новый URL"""
-        new_url = URL(
-            original_url=url_data.original_url, short_name=url_data.short_name
+    async def get_by_original_url(self, original_url: str) -> URL | None:
+        """Получить самый ранний непросроченный URL с таким же адресом"""
+        statement = (
+            select(URL)
+            .where(original_url_matches(original_url), not_expired())
+            .order_by(URL.id)
+            .limit(1)
+        )
+        result = await self._read(statement)
+        return result.first()
+
+    async def get_updated_at(self, url_id: int) -> datetime | None:
+        """Получить время последнего изменения URL, не читая строку целиком"""
+        statement = select(URL.updated_at).where(URL.id == url_id)
+        result = await self._read(statement)
+        return result.one_or_none()
+
+    async def get_version(self) -> tuple[int, datetime] | None:
+        """Получить версию таблицы URL и время её последнего изменения
+
+        Версию увеличивает триггер, созданный вместе со схемой. Если схема
+        создана без него, возвращается None.
+        """
+        statement = select(URLVersion.version, URLVersion.changed_at).where(
+            URLVersion.id == URL_VERSION_ID
+        )
+        result = await self._read(statement)
+        row = result.one_or_none()
+        return None if row is None else (row.version, row.changed_at)
+
+    async def get_redirect_target(self, short_name: str) -> RedirectTarget | None:
+        """Получить адрес перехода и срок действия ссылки по короткому имени
+
+        Сначала проверяется кэш редиректов, при промахе адрес читается
+        load_redirect_target.
+        """
+        if self.cache is not None:
+            target = self.cache.get(short_name)
+            if target is not None:
+                return target
+        return await self.load_redirect_target(short_name)
+
+    async def load_redirect_target(self, short_name: str) -> RedirectTarget | None:
+        """Прочитать адрес перехода из базы и сохранить его в кэше
+
+        Сначала проверяется фильтр коротких имён, и только если имя может
+        существовать, из базы читаются original_url и срок действия.
+        Просроченная ссылка не находится, а непросроченная хранится в кэше
+        не дольше своего срока.
+        """
+        if self.name_filter is not None and not self.name_filter.might_contain(
+            short_name
+        ):
+            return None
+
+        statement = select(URL.original_url, URL.expires_at).where(
+            URL.short_name == short_name, not_expired()
+        )
+        result = await self._read(statement)
+        row = result.one_or_none()
+        if row is None:
+            if self.name_filter is not None:
+                self.name_filter.record_false_positive()
+            return None
+
+        original_url, expires_at = row
+        if self.cache is not None:
+            cache_original_url(self.cache, short_name, original_url, expires_at)
+        return RedirectTarget(original_url, expires_at)
+
+    async def get_most_clicked(self, limit: int) -> Sequence[Row]:
+        """Получить короткие имена и адреса самых посещаемых URL
+
+        Возвращаются кортежи (short_name, original_url, expires_at)
+        непросроченных ссылок по убыванию click_count.
+        """
+        statement = (
+            select(URL.short_name, URL.original_url, URL.expires_at)
+            .where(not_expired())
+            .order_by(URL.click_count.desc(), URL.id)
+            .limit(limit)
+        )
+        result = await self._read(statement)
+        return result.all()
+
+    async def create(self, url_data: URLCreate) -> URL:
+        """Создать новый URL одним INSERT ... ON CONFLICT DO NOTHING RETURNING
+
+        Если короткое имя не задано, оно генерируется. Сгенерированное имя
+        может совпасть только с заданным вручную, тогда берётся следующее.
+        """
+        if url_data.short_name:
+            new_url = await self._insert(
+                url_data.original_url, url_data.short_name, url_data.expires_at
+            )
+            if new_url is None:
+                await self.session.rollback()
+                raise ShortNameExistsError(url_data.short_name)
+            return new_url
+
+        if self.short_names is None:
+            raise ValueError("Short name generation is not configured")
+
+        for _ in range(SHORT_NAME_ATTEMPTS):
+            short_name = await self.short_names.allocate(self.session)
+            new_url = await self._insert(
+                url_data.original_url, short_name, url_data.expires_at
+            )
+            if new_url is not None:
+                return new_url
+
+        await self.session.rollback()
+        raise ShortNameExistsError(short_name)
+
+    async def get_or_create(self, url_data: URLCreate) -> tuple[URL, bool]:
+        """Вернуть существующий URL с тем же адресом или создать новый
+
+        Проверка и создание выполняются под advisory-блокировкой по адресу,
+        поэтому одновременные запросы не создадут дубликаты друг друга.
+        Возвращает ссылку и признак того, что она создана.
+        """
+        self._use_primary()
+        await self.session.exec(
+            select(
+                func.pg_advisory_xact_lock(
+                    func.hashtextextended(url_data.original_url, 0)
+                )
+            )
         )
-        self.session.add(new_url)
-        self.session.commit()
-        self.session.refresh(new_url)
+        existing = await self.get_by_original_url(url_data.original_url)
+        if existing is not None:
+            await self.session.commit()
+            return existing, False
+        return await self.create(url_data), True
+
+    async def _insert(
+        self, original_url: str, short_name: str, expires_at: datetime | None
+    ) -> URL | None:
+        """Сохранить новый URL или вернуть None, если имя уже занято"""
+        self._use_primary()
+        result = await self.session.exec(
+            insert_url_statement(original_url, short_name, expires_at)
+        )
+        new_url = result.scalar_one_or_none()
+        if new_url is None:
+            return None
+
+        await self.session.commit()
+        self._refresh_cache(new_url)
+        self._add_to_filter(new_url.short_name)
+        self._purge(new_url.short_name)
+        self._invalidate_count()
         return new_url
 
-    def update(self, url_id: int, url_data: URLUpdate) -> URL | None:
-        """Обновить существующий URL"""
-        url = self.get_by_id(url_id)
-        if url:
-            url.original_url = url_data.original_url
-            url.short_name = url_data.short_name
-            self.session.commit()
-            self.session.refresh(url)
+    async def update(self, url_id: int, url_data: URLUpdate) -> URL | None:
+        """Обновить существующий URL одним UPDATE ... RETURNING"""
+        self._use_primary()
+        try:
+            result = await self.session.exec(update_url_statement(url_id, url_data))
+            row = result.first()
+        except IntegrityError as error:
+            await self.session.rollback()
+            raise ShortNameExistsError(url_data.short_name) from error
+
+        await self.session.commit()
+        if row is None:
+            return None
+
+        url, old_short_name = row
+        self._invalidate_cache(old_short_name)
+        self._refresh_cache(url)
+        self._add_to_filter(url.short_name)
+        self._purge(old_short_name, url.short_name)
         return url
 
-    def delete(self, url_id: int) -> bool:
-        """Удалить URL"""
-        url = self.get_by_id(url_id)
-        if url:
-            self.session.delete(url)
-            self.session.commit()
-            return True
-        return False
+    async def delete(self, url_id: int) -> bool:
+        """Удалить URL одним DELETE ... RETURNING"""
+        self._use_primary()
+        result = await self.session.exec(delete_url_statement(url_id))
+        short_name = result.scalar()
+        await self.session.commit()
+        if short_name is None:
+            return False
+
+        self._invalidate_cache(short_name)
+        self._purge(short_name)
+        self._invalidate_count()
+        return True
+
+    async def import_batch(self, rows: list[tuple[int, URLCreate]]) -> set[str]:
+        """Создать пакет URL, пропустив занятые короткие имена
+
+        Строки копируются во временную таблицу через COPY и переносятся в url
+        одним INSERT ... SELECT ... ON CONFLICT DO NOTHING. Пакет фиксируется
+        отдельной транзакцией. Возвращает созданные короткие имена.
+        """
+        self._use_primary()
+        connection = await self.session.connection()
+        await connection.execute(CreateTable(url_import, if_not_exists=True))
+        await connection.execute(url_import.delete())
+
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            url_import.name,
+            records=[
+                (line, url_data.original_url, url_data.short_name, url_data.expires_at)
+                for line, url_data in rows
+            ],
+            columns=url_import.columns.keys(),
+        )
+
+        statement = (
+            pg_insert(URL)
+            .from_select(
+                [
+                    "original_url",
+                    "short_name",
+                    "expires_at",
+                    "created_at",
+                    "updated_at",
+                ],
+                select(
+                    url_import.c.original_url,
+                    url_import.c.short_name,
+                    url_import.c.expires_at,
+                    func.timezone("utc", func.now()),
+                    func.timezone("utc", func.now()),
+                ).order_by(url_import.c.line),
+            )
+            .on_conflict_do_nothing(index_elements=["short_name"])
+            .returning(URL.short_name)
+        )
+        result = await connection.execute(statement)
+        created = set(result.scalars())
+        await self.session.commit()
+        for short_name in created:
+            self._add_to_filter(short_name)
+        self._invalidate_count()
+        return created
+
+    async def stream_all(
+        self, batch_size: int
+    ) -> AsyncIterator[Sequence[Sequence[Any]]]:
+        """Прочитать все URL пакетами через серверный курсор
+
+        Выбираются столбцы таблицы, а не ORM-объекты, поэтому в памяти
+        находится только текущий пакет из batch_size строк.
+        """
+        statement = (
+            select(*EXPORT_COLUMNS)
+            .order_by(URL.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream(statement)
+        async for batch in result.partitions():
+            yield batch
+
+    async def stream_short_names(self, batch_size: int) -> AsyncIterator[Sequence[str]]:
+        """Прочитать все короткие имена пакетами через серверный курсор"""
+        statement = select(URL.short_name).execution_options(yield_per=batch_size)
+        result = await self.session.stream(statement)
+        async for batch in result.scalars().partitions():
+            yield batch
+
+    async def backfill_original_url_hashes(self, batch_size: int) -> int:
+        """Заполнить дайджест адреса у пакета строк, где он ещё пуст
+
+        Пакет фиксируется отдельной транзакцией; строки, заблокированные
+        другими запросами, пропускаются до следующего пакета. Возвращает
+        число обновлённых строк.
+        """
+        self._use_primary()
+        pending = (
+            select(URL.id)
+            .where(URL.original_url_hash.is_(None))
+            .order_by(URL.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.exec(
+            update(URL)
+            .where(URL.id.in_(pending.scalar_subquery()))
+            .values(original_url_hash=func.url_digest(URL.original_url))
+        )
+        await self.session.commit()
+        return result.rowcount
+
+    async def purge_expired(self, batch_size: int) -> list[str]:
+        """Удалить пакет просроченных URL отдельной короткой транзакцией
+
+        Возвращает короткие имена удалённых ссылок; меньше batch_size имён
+        означает, что просроченных строк больше нет или они заняты.
+        """
+        self._use_primary()
+        result = await self.session.exec(delete_expired_statement(batch_size))
+        short_names = list(result.scalars())
+        await self.session.commit()
+        if short_names:
+            for short_name in short_names:
+                self._invalidate_cache(short_name)
+            self._purge(*short_names)
+            self._invalidate_count()
+        return short_names
+
+    async def add_clicks(self, clicks: dict[str, tuple[int, datetime]]) -> None:
+        """Добавить накопленные переходы к счётчикам URL
+
+        Все счётчики обновляются одним UPDATE ... FROM (VALUES ...).
+        Переходы по именам, которых уже нет, пропускаются. Счётчики входят
+        в ответ API, поэтому updated_at тоже обновляется.
+        """
+        pending = values(
+            column("short_name", String),
+            column("clicks", Integer),
+            column("accessed_at", DateTime),
+            name="pending_clicks",
+        ).data(
+            [
+                (short_name, count, accessed_at)
+                for short_name, (count, accessed_at) in clicks.items()
+            ]
+        )
+        statement = (
+            update(URL)
+            .where(URL.short_name == pending.c.short_name)
+            .values(
+                click_count=URL.click_count + pending.c.clicks,
+                last_accessed_at=func.greatest(
+                    URL.last_accessed_at, pending.c.accessed_at
+                ),
+                updated_at=func.timezone("utc", func.now()),
+            )
+        )
+        self._use_primary()
+        await self.session.exec(statement)
+        await self.session.commit()
+
+    async def _read(self, statement: Any) -> Any:
+        """Выполнить чтение на реплике, если в сессии ещё не было записи
+
+        Реплика выбирается один раз на сессию, чтобы версия таблицы, строки
+        страницы и число ссылок одного запроса не пришли с реплик с разным
+        отставанием. После записи реплика может ещё не получить изменения,
+        поэтому следующие чтения той же сессии идут в основную базу. Если
+        реплика недоступна, она исключается из выбора, а это и дальнейшие
+        чтения сессии выполняются в основной базе.
+        """
+        replica = self._read_replica()
+        if replica is None:
+            return await self.session.exec(statement)
+
+        try:
+            return await self.session.exec(
+                statement, bind_arguments={"bind": replica.sync_engine}
+            )
+        except Exception as error:
+            if not is_unavailable(error):
+                raise
+            self.replicas.mark_failed(replica)
+            self._use_primary()
+        return await self.session.exec(statement)
+
+    def _read_replica(self) -> AsyncEngine | None:
+        """Реплика для чтений сессии или None для основной базы"""
+        if not self.replicas or self.session.info.get(PRIMARY_ONLY):
+            return None
+        if READ_REPLICA not in self.session.info:
+            self.session.info[READ_REPLICA] = self.replicas.choose()
+        return self.session.info[READ_REPLICA]
+
+    def _use_primary(self) -> None:
+        """Направить все дальнейшие чтения сессии в основную базу"""
+        self.session.info[PRIMARY_ONLY] = True
+
+    def _refresh_cache(self, url: URL) -> None:
+        """Записать в кэш актуальный адрес перехода для ссылки"""
+        if self.cache is not None:
+            cache_original_url(
+                self.cache, url.short_name, url.original_url, url.expires_at
+            )
+
+    def _invalidate_cache(self, short_name: str) -> None:
+        """Удалить из кэша адрес перехода по короткому имени"""
+        if self.cache is not None:
+            self.cache.invalidate(short_name)
+
+    def _add_to_filter(self, short_name: str) -> None:
+        """Добавить короткое имя в фильтр существующих имён"""
+        if self.name_filter is not None:
+            self.name_filter.add(short_name)
+
+    def _purge(self, *short_names: str) -> None:
+        """Обновить ответы по коротким именам в кэше nginx
+
+        Новое имя тоже обновляется: до создания по нему мог быть
+        закэширован ответ 404.
+        """
+        if self.purger is not None:
+            self.purger.purge_later(dict.fromkeys(short_names))
+
+    def _invalidate_count(self) -> None:
+        """Сбросить кэшированное количество URL после изменения их числа"""
+        if self.count_cache is not None:
+            self.count_cache.invalidate()
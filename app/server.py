@@ -0,0 +1,297 @@
+"""Многопроцессный запуск приложения для продакшена: python -m app.server
+
+Главный процесс один раз создаёт таблицы, импортирует приложение, открывает
+сокет и запускает рабочие процессы через fork. Рабочие процессы разделяют
+сокет и сбрасывают унаследованные пулы соединений, поэтому соединения
+с базой открываются уже после fork.
+
+Сигналы главному процессу:
+- SIGHUP — поочерёдная замена рабочих процессов без простоя: старый процесс
+  получает SIGTERM только после того, как новый готов принимать запросы;
+- SIGTERM, SIGINT — остановка: рабочие процессы дообрабатывают запросы
+  не дольше --graceful-timeout секунд, затем завершаются принудительно.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import time
+from types import FrameType
+
+import uvicorn
+
+from app.health import readiness, startup_phase
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ждать готовности нового процесса при замене
+WORKER_STARTUP_TIMEOUT = 60
+
+# Запас к --graceful-timeout на остановку процесса после обработки запросов
+SHUTDOWN_MARGIN = 5
+
+# Как часто главный процесс проверяет сигналы и завершившиеся процессы
+POLL_INTERVAL = 0.5
+
+
+def default_workers() -> int:
+    """Число рабочих процессов: WEB_CONCURRENCY или число доступных ядер"""
+    return int(os.getenv("WEB_CONCURRENCY") or os.process_cpu_count() or 1)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the app with several workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("APP_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        help="seconds a stopping worker may spend finishing requests",
+    )
+    args = parser.parse_args(argv)
+    if args.workers is None:
+        args.workers = default_workers()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+
+def prepare_environment(workers: int) -> None:
+    """Настройки рабочих процессов; вызывается до импорта app.config
+
+    Таблицы создаёт главный процесс. Фильтр коротких имён и кэш редиректов
+    живут в памяти процесса и не видят ссылки, созданные, изменённые или
+    удалённые другими процессами, поэтому при нескольких процессах они
+    выключаются, если не заданы явно. Без кэша каждый редирект читает базу;
+    явно заданный REDIRECT_CACHE_SIZE возвращает кэш ценой устаревших
+    переходов в соседних процессах до REDIRECT_CACHE_TTL секунд.
+    """
+    os.environ["CREATE_TABLES_ON_STARTUP"] = "false"
+    if workers > 1:
+        os.environ.setdefault("SHORT_NAME_FILTER_ENABLED", "false")
+        os.environ.setdefault("REDIRECT_CACHE_SIZE", "0")
+
+
+class WorkerServer(uvicorn.Server):
+    """Сервер рабочего процесса
+
+    Сообщает главному процессу о готовности через канал, когда отработал
+    lifespan (пул соединений прогрет), и перестаёт отвечать готовностью
+    на /ready, как только получает сигнал остановки.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        await super().startup(sockets)
+        try:
+            if not self.should_exit:
+                os.write(self.ready_fd, b"1")
+        except OSError:
+            pass
+        finally:
+            os.close(self.ready_fd)
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        readiness.mark_not_ready("shutting down")
+        super().handle_exit(sig, frame)
+
+
+def run_worker(config: uvicorn.Config, sock: socket.socket, ready_fd: int) -> None:
+    """Тело рабочего процесса после fork; из функции процесс не возвращается"""
+    exit_code = 0
+    try:
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+
+        from app.database import async_engine, engine, replica_engines
+
+        # Соединения главного процесса нельзя использовать после fork
+        engine.dispose(close=False)
+        for inherited in (async_engine, *replica_engines.values()):
+            inherited.sync_engine.dispose(close=False)
+
+        WorkerServer(config, ready_fd).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d failed", os.getpid())
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+class Arbiter:
+    """Главный процесс: запускает, заменяет и останавливает рабочие процессы"""
+
+    def __init__(
+        self,
+        config: uvicorn.Config,
+        sock: socket.socket,
+        workers: int,
+        graceful_timeout: int,
+    ):
+        self.config = config
+        self.sock = sock
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers: set[int] = set()
+        # Процессы, которым уже отправлен SIGTERM
+        self.retiring: set[int] = set()
+        self.signals: list[int] = []
+
+    def run(self) -> None:
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+        for _ in range(self.worker_count):
+            pid, ready_fd = self.spawn()
+            os.close(ready_fd)
+        logger.info("Started %d workers", self.worker_count)
+
+        while True:
+            self.reap()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reload()
+                else:
+                    self.stop()
+                    return
+            self.respawn()
+            time.sleep(POLL_INTERVAL)
+
+    def spawn(self) -> tuple[int, int]:
+        """Запустить рабочий процесс; возвращает pid и канал готовности"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            run_worker(self.config, self.sock, write_fd)
+        os.close(write_fd)
+        self.workers.add(pid)
+        return pid, read_fd
+
+    def respawn(self) -> None:
+        """Заменить аварийно завершившиеся процессы"""
+        for _ in range(self.worker_count - len(self.workers)):
+            pid, ready_fd = self.spawn()
+            os.close(ready_fd)
+            logger.warning("Spawned worker %d to replace a failed one", pid)
+
+    def reload(self) -> None:
+        """Поочерёдно заменить рабочие процессы без потери запросов"""
+        logger.info("Reloading workers")
+        for old_pid in list(self.workers):
+            pid, ready_fd = self.spawn()
+            try:
+                ready = self._wait_ready(ready_fd)
+            finally:
+                os.close(ready_fd)
+            if not ready:
+                logger.error("Worker %d did not start, reload aborted", pid)
+                self.retire(pid)
+                return
+            self.retire(old_pid)
+        logger.info("Reloaded workers")
+
+    def retire(self, pid: int) -> None:
+        """Попросить процесс завершиться после обработки текущих запросов"""
+        self.workers.discard(pid)
+        self.retiring.add(pid)
+        self._kill(pid, signal.SIGTERM)
+
+    def stop(self) -> None:
+        """Остановить все процессы, дав им закончить запросы"""
+        logger.info("Stopping workers")
+        for pid in list(self.workers):
+            self.retire(pid)
+        deadline = time.monotonic() + self.graceful_timeout + SHUTDOWN_MARGIN
+        while self.retiring and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(POLL_INTERVAL / 5)
+        for pid in self.retiring:
+            logger.warning("Killing worker %d after graceful timeout", pid)
+            self._kill(pid, signal.SIGKILL)
+        while self.retiring:
+            self.reap(block=True)
+
+    def reap(self, block: bool = False) -> None:
+        """Забрать статусы завершившихся процессов"""
+        while self.workers or self.retiring:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                self.retiring.clear()
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                self.workers.discard(pid)
+                logger.error(
+                    "Worker %d exited unexpectedly with code %d",
+                    pid,
+                    os.waitstatus_to_exitcode(status),
+                )
+            self.retiring.discard(pid)
+            if block:
+                return
+
+    def _wait_ready(self, ready_fd: int) -> bool:
+        """Дождаться сигнала готовности нового процесса"""
+        deadline = time.monotonic() + WORKER_STARTUP_TIMEOUT
+        while (timeout := deadline - time.monotonic()) > 0:
+            readable, _, _ = select.select([ready_fd], [], [], min(timeout, 1))
+            if readable:
+                # Пустое чтение — процесс завершился, не став готовым
+                return os.read(ready_fd, 1) == b"1"
+            if any(signum != signal.SIGHUP for signum in self.signals):
+                return False
+        return False
+
+    def _handle_signal(self, signum: int, frame: FrameType | None) -> None:
+        self.signals.append(signum)
+
+    @staticmethod
+    def _kill(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    prepare_environment(args.workers)
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger.setLevel(logging.INFO)
+
+    # Приложение импортируется до fork, и процессы получают его готовым
+    app = importlib.import_module("app.main").app
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+    from app.database import create_db_and_tables, engine
+
+    with startup_phase("schema"):
+        create_db_and_tables()
+    engine.dispose()
+
+    sock = config.bind_socket()
+    Arbiter(config, sock, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import asyncio
+import string
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import SHORT_NAME_BLOCK_SIZE, short_name_sequence
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def encode_base62(number: int) -> str:
+    """Кодирует неотрицательное число в base62"""
+    if number < 0:
+        raise ValueError("Only non-negative numbers can be encoded")
+
+    digits = []
+    while True:
+        number, remainder = divmod(number, len(BASE62_ALPHABET))
+        digits.append(BASE62_ALPHABET[remainder])
+        if number == 0:
+            return "".join(reversed(digits))
+
+
+def decode_base62(code: str) -> int:
+    """Декодирует число, закодированное encode_base62"""
+    number = 0
+    for char in code:
+        number = number * len(BASE62_ALPHABET) + BASE62_ALPHABET.index(char)
+    return number
+
+
+class ShortNameAllocator:
+    """Генератор коротких имён из заранее зарезервированных блоков номеров
+
+    Процесс берёт из последовательности url_short_name_seq сразу блок номеров
+    и раздаёт их без обращений к базе, пока блок не закончится. Блоки разных
+    процессов не пересекаются, поэтому имена не нужно проверять на занятость.
+    """
+
+    def __init__(self, block_size: int = SHORT_NAME_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, session: AsyncSession) -> str:
+        """Выдать следующее короткое имя, зарезервировав новый блок при нужде"""
+        if self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    await self._reserve_block(session)
+
+        number = self._next
+        self._next += 1
+        return encode_base62(number)
+
+    async def _reserve_block(self, session: AsyncSession) -> None:
+        """Зарезервировать следующий блок номеров"""
+        result = await session.exec(select(short_name_sequence.next_value()))
+        block_start = result.one()
+        self._next, self._end = block_start, block_start + self.block_size
+
+
+# Генератор коротких имён для ссылок, созданных без short_name
+short_name_allocator = ShortNameAllocator()
@@ -0,0 +1,57 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+from app.cache import RedirectTarget
+from app.metrics import Counter, registry
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+single_flight_shared = registry.register(
+    Counter(
+        "single_flight_shared",
+        "Calls that awaited an identical call already in flight",
+        ["group"],
+    )
+)
+
+
+class SingleFlight(Generic[K, V]):
+    """Объединение одновременных вызовов с одним ключом
+
+    Пока вызов по ключу выполняется, остальные вызовы с тем же ключом не
+    запускают свой, а ждут его результата или исключения. Результат не
+    сохраняется: после завершения вызова следующий снова идёт в базу.
+    Вызов выполняется отдельной задачей, поэтому отмена запроса, который
+    его запустил, не отменяет его для остальных.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: dict[K, asyncio.Future[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: K, call: Callable[[], Awaitable[V]]) -> V:
+        """Выполнить call или дождаться уже идущего вызова с тем же ключом"""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            single_flight_shared.inc(group=self.group)
+        return await asyncio.shield(future)
+
+    def _forget(self, key: K, future: asyncio.Future[V]) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Исключение считается полученным, даже если все ожидавшие отменены
+        if not future.cancelled():
+            future.exception()
+
+
+# Чтения адресов перехода для /r/{short_name}, ключ — короткое имя
+redirect_lookups: SingleFlight[str, RedirectTarget | None] = SingleFlight("redirect")
@@ -0,0 +1,121 @@
+import asyncio
+import random
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from benchmarks.report import summarize
+from benchmarks.seed import bench_short_name
+
+Request = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+class ZipfSampler:
+    """Номера ключей 0..n-1 с распределением Ципфа
+
+    Используется обратная функция распределения непрерывного приближения,
+    поэтому память не зависит от числа ключей.
+    """
+
+    def __init__(self, n: int, exponent: float = 1.1, seed: int | None = None):
+        if exponent == 1:
+            raise ValueError("Exponent must differ from 1")
+        self.n = n
+        self.exponent = exponent
+        self._random = random.Random(seed)
+        self._upper = n ** (1 - exponent) - 1
+
+    def __call__(self) -> int:
+        value = (self._upper * self._random.random() + 1) ** (1 / (1 - self.exponent))
+        return min(int(value), self.n) - 1
+
+
+def build_scenarios(rows: int, zipf_exponent: float) -> dict[str, Request]:
+    """Сценарии нагрузки на горячие пути приложения"""
+    sample_key = ZipfSampler(rows, zipf_exponent)
+    deep_start = max(rows - 20, 0)
+
+    async def redirect(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get(f"/r/{bench_short_name(sample_key())}")
+
+    async def list_shallow(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/links", params={"range": "[0,10]"})
+
+    async def list_deep(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get(
+            "/api/links", params={"range": f"[{deep_start},{deep_start + 10}]"}
+        )
+
+    async def create(client: httpx.AsyncClient) -> httpx.Response:
+        short_name = f"load-{uuid.uuid4().hex[:16]}"
+        return await client.post(
+            "/api/links",
+            json={
+                "original_url": f"https://example.com/{short_name}",
+                "short_name": short_name,
+            },
+        )
+
+    return {
+        "redirect": redirect,
+        "list_shallow": list_shallow,
+        "list_deep": list_deep,
+        "create": create,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, request: Request, concurrency: int, duration: float
+) -> dict:
+    """Нагружает приложение сценарием в concurrency потоков duration секунд"""
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await request(client)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run(
+    base_url: str,
+    rows: int,
+    scenarios: list[str],
+    concurrency: int,
+    duration: float,
+    zipf_exponent: float,
+) -> dict:
+    """Прогоняет сценарии по очереди и собирает отчёт"""
+    available = build_scenarios(rows, zipf_exponent)
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    report = {
+        "base_url": base_url,
+        "rows": rows,
+        "concurrency": concurrency,
+        "duration": duration,
+        "scenarios": {},
+    }
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        for name in scenarios:
+            report["scenarios"][name] = await run_scenario(
+                client, available[name], concurrency, duration
+            )
+    return report
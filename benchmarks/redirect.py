@@ -0,0 +1,119 @@
+import time
+from collections.abc import Callable
+
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from fastapi.routing import APIRoute
+from starlette.middleware.exceptions import ExceptionMiddleware
+from starlette.routing import Router
+from starlette.types import ASGIApp, Message
+
+from app.cache import redirect_cache
+from app.clicks import click_buffer
+from app.main import app
+from benchmarks.report import summarize
+from benchmarks.seed import bench_short_name
+
+REQUEST_BODY: Message = {"type": "http.request", "body": b"", "more_body": False}
+
+
+def redirect_routers() -> dict[str, ASGIApp]:
+    """Маршрутизаторы с одним обработчиком /r/{short_name}: быстрым и прежним
+
+    Оба обёрнуты в те же внутренние middleware, что и в приложении: без них
+    не работают зависимости и HTTPException FastAPI. Внешние middleware
+    (CORS, метрики) не участвуют.
+    """
+    fast_routes = [route for route in app.routes if route.name == "redirect_link_fast"]
+    legacy_routes = [
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.name == "redirect_link"
+    ]
+    return {
+        name: ExceptionMiddleware(
+            AsyncExitStackMiddleware(Router(routes=routes)),
+            handlers=app.exception_handlers,
+        )
+        for name, routes in (("fast", fast_routes), ("legacy", legacy_routes))
+    }
+
+
+def make_scope(path: str) -> dict:
+    """Минимальный scope GET-запроса, как его формирует uvicorn"""
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8080),
+        "app": app,
+    }
+
+
+async def call(router: ASGIApp, path: str) -> int:
+    """Выполнить запрос к обработчику и вернуть код ответа"""
+    status_code = 0
+
+    async def receive() -> Message:
+        return REQUEST_BODY
+
+    async def send(message: Message) -> None:
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await router(make_scope(path), receive, send)
+    return status_code
+
+
+async def measure(
+    router: ASGIApp,
+    path: str,
+    requests: int,
+    expected_status: int,
+    before_request: Callable[[], None] = lambda: None,
+) -> dict:
+    """Последовательно выполнить запросы и собрать сводку по задержкам"""
+    latencies = []
+    errors = 0
+    for _ in range(requests):
+        before_request()
+        started = time.perf_counter()
+        status_code = await call(router, path)
+        latencies.append(time.perf_counter() - started)
+        errors += status_code != expected_status
+    return summarize(latencies, errors, sum(latencies))
+
+
+async def run(requests: int) -> dict:
+    """Сравнить быстрый обработчик редиректов с маршрутом FastAPI
+
+    Сценарии: попадание в кэш редиректов, промах кэша с чтением из базы
+    и несуществующее имя. Нужна база, заполненная командой seed.
+    """
+    existing = f"/r/{bench_short_name(0)}"
+    missing = "/r/missing-short-name"
+    report: dict = {"requests": requests, "scenarios": {}}
+
+    for name, router in redirect_routers().items():
+        await call(router, existing)
+        report["scenarios"][f"{name}_cache_hit"] = await measure(
+            router, existing, requests, 307
+        )
+        report["scenarios"][f"{name}_cache_miss"] = await measure(
+            router, existing, requests, 307, before_request=redirect_cache.clear
+        )
+        report["scenarios"][f"{name}_not_found"] = await measure(
+            router, missing, requests, 404
+        )
+
+    redirect_cache.clear()
+    click_buffer.clear()
+    return report
@@ -0,0 +1,54 @@
+import math
+from collections.abc import Sequence
+
+# Показатели, по которым сравнение с эталоном ищет регрессии: для задержек
+# плохо увеличение, для пропускной способности — уменьшение
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_KEYS = ("rps",)
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Перцентиль по методу ближайшего ранга для отсортированных значений"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: Sequence[float], errors: int, duration: float) -> dict:
+    """Сводка по сценарию: перцентили задержки в мс, RPS и число ошибок"""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Находит регрессии отчёта относительно эталона
+
+    Регрессией считается рост задержки или падение RPS больше чем на
+    threshold (доля, например 0.1 — 10%). Сценарии, которых нет в эталоне,
+    пропускаются.
+    """
+    regressions = []
+    for name, result in report["scenarios"].items():
+        expected = baseline["scenarios"].get(name)
+        if expected is None:
+            continue
+
+        for key in LATENCY_KEYS:
+            if expected[key] and result[key] > expected[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {expected[key]} -> {result[key]}")
+        for key in THROUGHPUT_KEYS:
+            if expected[key] and result[key] < expected[key] * (1 - threshold):
+                regressions.append(f"{name}: {key} {expected[key]} -> {result[key]}")
+        if result["errors"] > expected["errors"]:
+            regressions.append(
+                f"{name}: errors {expected['errors']} -> {result['errors']}"
+            )
+    return regressions
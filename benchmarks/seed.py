@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import create_engine, make_url, text
+from sqlmodel import SQLModel
+
+from app.models import URL
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 100_000
+
+
+def bench_short_name(number: int) -> str:
+    """Короткое имя n-й ссылки тестового набора"""
+    return f"bench{number}"
+
+
+def ensure_database(database_url: str) -> None:
+    """Создаёт базу для бенчмарка, если её ещё нет"""
+    url = make_url(database_url)
+    maintenance_engine = create_engine(
+        url.set(database="postgres"), isolation_level="AUTOCOMMIT"
+    )
+    with maintenance_engine.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"),
+            {"name": url.database},
+        ).scalar()
+        if not exists:
+            logger.info("Creating database %s", url.database)
+            connection.execute(text(f'CREATE DATABASE "{url.database}"'))
+    maintenance_engine.dispose()
+
+
+def seed(database_url: str, rows: int) -> None:
+    """Заполняет таблицу url тестовыми ссылками bench0..bench{rows-1}
+
+    Таблица очищается, строки загружаются через COPY порциями по
+    COPY_CHUNK_SIZE, после чего собирается статистика планировщика.
+    """
+    database_url = make_url(database_url).set(drivername="postgresql+psycopg")
+    ensure_database(database_url)
+
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {URL.__tablename__} RESTART IDENTITY"))
+
+    created_at = datetime.utcnow()
+    for chunk_start in range(0, rows, COPY_CHUNK_SIZE):
+        chunk_end = min(chunk_start + COPY_CHUNK_SIZE, rows)
+        with engine.begin() as connection:
+            raw_connection = connection.connection.driver_connection
+            with raw_connection.cursor() as cursor:
+                with cursor.copy(
+                    f"COPY {URL.__tablename__} (original_url, short_name, created_at)"
+                    " FROM STDIN"
+                ) as copy:
+                    for number in range(chunk_start, chunk_end):
+                        copy.write_row(
+                            (
+                                f"https://example.com/bench/{number}",
+                                bench_short_name(number),
+                                created_at,
+                            )
+                        )
+        logger.info("Seeded %d of %d links", chunk_end, rows)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"ANALYZE {URL.__tablename__}"))
+    engine.dispose()
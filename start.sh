@@ -5,8 +5,9 @@ set -e
 PORT=${PORT:-80}
 
 echo "Starting backend on port 8080..."
-# Запускаем backend в фоне на порту 8080
-uv run uvicorn app.main:app --host 0.0.0.0 --port 8080 &
+# Запускаем backend в фоне на порту 8080: по процессу на ядро,
+# число процессов задаёт WEB_CONCURRENCY
+uv run python -m app.server --host 0.0.0.0 --port 8080 &
 
 echo "Starting nginx on port $PORT..."
 
@@ -1,14 +1,22 @@
 import os
-from collections.abc import AsyncIterator, Callable, Iterator
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import nullcontext
 from itertools import count
 
 import pytest
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy import Connection, Engine
-from sqlmodel import Session, SQLModel, create_engine
-
-from app.database import get_session
-from app.main import app
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.bloom import short_name_filter
+from app.cache import links_count_cache, redirect_cache
+from app.clicks import click_buffer
+from app.database import get_async_database_url, get_async_session
+from app.dependencies import get_session_factory
+from app.main import app, redirect_endpoint
 from app.models import URL
 
 TEST_DATABASE_URL = os.getenv(
@@ -28,31 +36,75 @@ def engine() -> Iterator[Engine]:
 
 
 @pytest.fixture
-def connection(engine: Engine) -> Iterator[Connection]:
+async def async_engine(engine: Engine) -> AsyncIterator[AsyncEngine]:
+    """Асинхронный движок тестовой базы данных
+
+    Создаётся на каждый тест, чтобы соединения не переживали цикл событий теста.
+    """
+    async_engine = create_async_engine(
+        get_async_database_url(TEST_DATABASE_URL), poolclass=NullPool
+    )
+    yield async_engine
+    await async_engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> Iterator[None]:
+    """Кэши приложения не должны переносить данные между тестами"""
+    redirect_cache.clear()
+    links_count_cache.invalidate()
+    click_buffer.clear()
+    short_name_filter.clear()
+    yield
+    redirect_cache.clear()
+    links_count_cache.invalidate()
+    click_buffer.clear()
+    short_name_filter.clear()
+
+
+@pytest.fixture
+async def connection(async_engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
     """Соединение с внешней транзакцией, которая откатывается после теста"""
-    with engine.connect() as connection:
-        transaction = connection.begin()
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
         try:
             yield connection
         finally:
-            transaction.rollback()
+            await transaction.rollback()
 
 
 @pytest.fixture
-def db_session(connection: Connection) -> Iterator[Session]:
+async def db_session(connection: AsyncConnection) -> AsyncIterator[AsyncSession]:
     """Сессия внутри внешней транзакции
 
     Коммиты приложения превращаются в savepoint'ы, поэтому изменения теста
     откатываются вместе с внешней транзакцией и не видны другим тестам.
     """
-    with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+    async with AsyncSession(
+        bind=connection,
+        join_transaction_mode="create_savepoint",
+        expire_on_commit=False,
+    ) as session:
         yield session
 
 
 @pytest.fixture
-async def client(db_session: Session) -> AsyncIterator[AsyncClient]:
-    """HTTP-клиент приложения, работающего с тестовой сессией"""
-    app.dependency_overrides[get_session] = lambda: db_session
+async def client(
+    db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[AsyncClient]:
+    """HTTP-клиент приложения, работающего с тестовой сессией
+
+    Быстрый обработчик редиректов не использует зависимости FastAPI, поэтому
+    тестовая сессия передаётся ему отдельно. Фабрика сессий тоже отдаёт
+    тестовую сессию.
+    """
+    app.dependency_overrides[get_async_session] = lambda: db_session
+    app.dependency_overrides[get_session_factory] = lambda: lambda: nullcontext(
+        db_session
+    )
+    monkeypatch.setattr(
+        redirect_endpoint, "session_factory", lambda: nullcontext(db_session)
+    )
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
     ) as client:
@@ -61,37 +113,39 @@ async def client(db_session: Session) -> AsyncIterator[AsyncClient]:
 
 
 @pytest.fixture
-def create_link(db_session: Session) -> Callable[..., URL]:
+def create_link(db_session: AsyncSession) -> Callable[..., Awaitable[URL]]:
     """Фабрика ссылок: сохраняет ссылку в базе и возвращает её"""
     counter = count(1)
 
-    def factory(original_url: str | None = None, short_name: str | None = None) -> URL:
+    async def factory(
+        original_url: str | None = None, short_name: str | None = None
+    ) -> URL:
         number = next(counter)
         link = URL(
             original_url=original_url or f"https://example{number}.com",
             short_name=short_name or f"example{number}",
         )
         db_session.add(link)
-        db_session.commit()
-        db_session.refresh(link)
+        await db_session.commit()
+        await db_session.refresh(link)
         return link
 
     return factory
 
 
 @pytest.fixture
-def link(create_link: Callable[..., URL]) -> URL:
+async def link(create_link: Callable[..., Awaitable[URL]]) -> URL:
     """Одна сохранённая ссылка"""
-    return create_link(original_url="https://example.com", short_name="example")
+    return await create_link(original_url="https://example.com", short_name="example")
 
 
 @pytest.fixture
-def links(create_link: Callable[..., URL]) -> list[URL]:
+async def links(create_link: Callable[..., Awaitable[URL]]) -> list[URL]:
     """Набор ссылок, помещающийся на страницу по умолчанию"""
-    return [create_link() for _ in range(3)]
+    return [await create_link() for _ in range(3)]
 
 
 @pytest.fixture
-def many_links(create_link: Callable[..., URL]) -> list[URL]:
+async def many_links(create_link: Callable[..., Awaitable[URL]]) -> list[URL]:
     """Набор ссылок, который не помещается на страницу по умолчанию"""
-    return [create_link() for _ in range(15)]
+    return [await create_link() for _ in range(15)]
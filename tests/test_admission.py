@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.admission import (
+    AdmissionLimiter,
+    Overloaded,
+    admission_in_flight,
+    admission_queue_depth,
+    admission_rejections,
+)
+from app.bloom import short_name_filter
+from app.main import redirect_endpoint
+from app.models import URL
+from app.name_filter import rebuild_short_name_filter
+from app.repository import AsyncURLRepository
+
+
+class TestAdmissionLimiter:
+    """Ограничение числа запросов, одновременно работающих с базой"""
+
+    async def test_rejects_after_queue_timeout(self) -> None:
+        limiter = AdmissionLimiter("test", limit=1, queue_timeout=0.01, retry_after=3)
+        rejections = admission_rejections.get(budget="test")
+
+        async with limiter.admit():
+            assert admission_in_flight.get(budget="test") == 1
+            with pytest.raises(Overloaded) as error:
+                async with limiter.admit():
+                    pass
+
+        assert error.value.retry_after == 3
+        assert admission_rejections.get(budget="test") == rejections + 1
+        assert admission_in_flight.get(budget="test") == 0
+        assert admission_queue_depth.get(budget="test") == 0
+
+    async def test_waiting_request_is_admitted_when_slot_frees(self) -> None:
+        limiter = AdmissionLimiter("test", limit=1, queue_timeout=1)
+        admitted = asyncio.Event()
+
+        async def wait_for_slot() -> None:
+            async with limiter.admit():
+                admitted.set()
+
+        async with limiter.admit():
+            waiter = asyncio.create_task(wait_for_slot())
+            await asyncio.sleep(0.01)
+            assert admission_queue_depth.get(budget="test") == 1
+            assert not admitted.is_set()
+
+        await waiter
+        assert admitted.is_set()
+
+    async def test_zero_limit_admits_everything(self) -> None:
+        limiter = AdmissionLimiter("test", limit=0, queue_timeout=0)
+
+        async with limiter.admit(), limiter.admit():
+            pass
+
+
+class TestLoadShedding:
+    """Ответ 503 при исчерпании бюджета допуска"""
+
+    @pytest.fixture
+    def api_limiter(self, monkeypatch: pytest.MonkeyPatch) -> AdmissionLimiter:
+        limiter = AdmissionLimiter("api", limit=1, queue_timeout=0, retry_after=2)
+        monkeypatch.setattr("app.dependencies.api_admission", limiter)
+        return limiter
+
+    @pytest.fixture
+    def redirect_limiter(self, monkeypatch: pytest.MonkeyPatch) -> AdmissionLimiter:
+        limiter = AdmissionLimiter("redirect", limit=1, queue_timeout=0)
+        monkeypatch.setattr(redirect_endpoint, "admission", limiter)
+        return limiter
+
+    async def test_api_returns_503_with_retry_after(
+        self, client: AsyncClient, api_limiter: AdmissionLimiter
+    ) -> None:
+        async with api_limiter.admit():
+            response = await client.get("/api/links")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+
+        assert (await client.get("/api/links")).status_code == 200
+
+    async def test_api_storm_does_not_block_redirects(
+        self,
+        client: AsyncClient,
+        api_limiter: AdmissionLimiter,
+        redirect_limiter: AdmissionLimiter,
+        link: URL,
+    ) -> None:
+        async with api_limiter.admit():
+            response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 307
+
+    async def test_redirect_returns_503_on_cache_miss(
+        self, client: AsyncClient, redirect_limiter: AdmissionLimiter, link: URL
+    ) -> None:
+        async with redirect_limiter.admit():
+            response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert "Too many" in response.json()["detail"]
+
+    async def test_filtered_redirect_does_not_wait_for_admission(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        redirect_limiter: AdmissionLimiter,
+        link: URL,
+    ) -> None:
+        await rebuild_short_name_filter(
+            short_name_filter, AsyncURLRepository(db_session)
+        )
+
+        async with redirect_limiter.admit():
+            response = await client.get("/r/nonexistent", follow_redirects=False)
+
+        assert response.status_code == 404
+        assert short_name_filter.stats.rejected == 1
+        assert short_name_filter.stats.false_positives == 0
@@ -1,9 +1,33 @@
-from collections.abc import Callable
+import csv
+import io
+import json
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import nullcontext
+from datetime import datetime
 
-from httpx import AsyncClient
-from sqlmodel import Session
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient, MockTransport, Request, Response
+from sqlalchemy import func, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.backfill import backfill_original_url_hashes
+from app.bloom import short_name_filter
+from app.cache import RedirectTarget, redirect_cache
+from app.clicks import click_buffer, flush_clicks
+from app.dependencies import get_redirect_purger
+from app.dto import URLResponse
+from app.edge_cache import RedirectPurger
+from app.health import readiness
+from app.main import app
+from app.metrics import db_queries
 from app.models import URL
+from app.name_filter import rebuild_short_name_filter
+from app.repository import AsyncURLRepository
+from app.short_names import decode_base62, encode_base62
+from benchmarks.redirect import redirect_routers
 
 UNKNOWN_LINK_ID = 999999
 
@@ -18,6 +42,38 @@ class TestPing:
         assert response.json() == "pong"
 
 
+class TestReady:
+    """Проверка готовности принимать трафик"""
+
+    @pytest.fixture(autouse=True)
+    def restore_readiness(self) -> Iterator[None]:
+        yield
+        readiness.mark_not_ready("starting")
+
+    async def test_not_ready_until_pool_is_warm(self, client: AsyncClient) -> None:
+        response = await client.get("/ready")
+
+        assert response.status_code == 503
+        assert response.json() == {"status": "starting"}
+
+    async def test_ready_after_warm_up(self, client: AsyncClient) -> None:
+        readiness.mark_ready()
+
+        response = await client.get("/ready")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready"}
+
+    async def test_not_ready_while_shutting_down(self, client: AsyncClient) -> None:
+        readiness.mark_ready()
+        readiness.mark_not_ready("shutting down")
+
+        response = await client.get("/ready")
+
+        assert response.status_code == 503
+        assert response.json() == {"status": "shutting down"}
+
+
 class TestLinks:
     """Ресурс /api/links"""
 
@@ -71,6 +127,203 @@ class TestLinks:
         assert len(response.json()) == 10
         assert response.headers["Content-Range"] == "links 0-9/15"
 
+    async def test_list_counts_with_cached_mode(
+        self,
+        client: AsyncClient,
+        monkeypatch: pytest.MonkeyPatch,
+        create_link: Callable[..., Awaitable[URL]],
+        many_links: list[URL],
+    ) -> None:
+        monkeypatch.setattr("app.api.LINKS_COUNT_MODE", "cached")
+        await client.get("/api/links")
+        await create_link()
+
+        cached_response = await client.get("/api/links")
+        await client.post(
+            "/api/links",
+            json={"original_url": "https://example.com", "short_name": "example"},
+        )
+        refreshed_response = await client.get("/api/links")
+
+        assert cached_response.headers["Content-Range"] == "links 0-9/15"
+        assert refreshed_response.headers["Content-Range"] == "links 0-9/17"
+
+    async def test_list_counts_with_estimate_mode(
+        self,
+        client: AsyncClient,
+        monkeypatch: pytest.MonkeyPatch,
+        db_session: AsyncSession,
+        many_links: list[URL],
+    ) -> None:
+        monkeypatch.setattr("app.api.LINKS_COUNT_MODE", "estimate")
+        await db_session.exec(text("ANALYZE url"))
+
+        response = await client.get("/api/links")
+
+        assert response.status_code == 200
+        assert len(response.json()) == 10
+        assert response.headers["Content-Range"] == "links 0-9/15"
+
+    async def test_list_orders_page_by_id(
+        self, client: AsyncClient, many_links: list[URL]
+    ) -> None:
+        response = await client.get("/api/links?range=[5,10]")
+
+        assert [item["id"] for item in response.json()] == [
+            link.id for link in many_links[5:10]
+        ]
+
+    async def test_list_walks_pages_with_cursor(
+        self, client: AsyncClient, many_links: list[URL]
+    ) -> None:
+        first_response = await client.get("/api/links?cursor=")
+        next_cursor = first_response.headers["X-Next-Cursor"]
+        second_response = await client.get(f"/api/links?cursor={next_cursor}")
+
+        assert first_response.status_code == 200
+        assert second_response.status_code == 200
+        ids = [item["id"] for item in first_response.json() + second_response.json()]
+        assert ids == [link.id for link in many_links]
+        assert "X-Next-Cursor" not in second_response.headers
+
+    @pytest.mark.parametrize("cursor", [None, ""])
+    @pytest.mark.parametrize("page_range", ["[0,0]", "[5,5]", "[5,3]"])
+    async def test_list_rejects_empty_range(
+        self,
+        client: AsyncClient,
+        links: list[URL],
+        cursor: str | None,
+        page_range: str,
+    ) -> None:
+        params = {"range": page_range}
+        if cursor is not None:
+            params["cursor"] = cursor
+
+        response = await client.get("/api/links", params=params)
+
+        assert response.status_code == 400
+        assert "Invalid range" in response.json()["detail"]
+
+    async def test_list_rejects_invalid_cursor(self, client: AsyncClient) -> None:
+        response = await client.get("/api/links?cursor=invalid")
+
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+
+    @pytest.mark.parametrize("count_mode", ["exact", "cached", "estimate"])
+    async def test_list_matches_url_response_serialization(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+        create_link: Callable[..., Awaitable[URL]],
+        count_mode: str,
+    ) -> None:
+        monkeypatch.setattr("app.api.LINKS_COUNT_MODE", count_mode)
+        await create_link(original_url='https://пример.рф/?q="a"&b=1')
+        clicked = await create_link()
+        await AsyncURLRepository(db_session).add_clicks(
+            {clicked.short_name: (3, datetime(2024, 1, 2, 3, 4, 5, 678000))}
+        )
+        urls = (await db_session.exec(select(URL).order_by(URL.id))).all()
+        expected = JSONResponse(
+            jsonable_encoder([URLResponse.from_url(url) for url in urls])
+        )
+
+        response = await client.get("/api/links")
+        keyset_response = await client.get("/api/links?cursor=")
+
+        assert response.content == expected.body
+        assert keyset_response.content == expected.body
+        assert response.headers["content-type"] == "application/json"
+
+    async def test_list_returns_304_while_links_unchanged(
+        self, client: AsyncClient, links: list[URL]
+    ) -> None:
+        first_response = await client.get("/api/links")
+        etag = first_response.headers["ETag"]
+
+        response = await client.get("/api/links", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    async def test_list_changes_etag_after_create(
+        self, client: AsyncClient, links: list[URL]
+    ) -> None:
+        first_response = await client.get("/api/links")
+        etag = first_response.headers["ETag"]
+        await client.post(
+            "/api/links",
+            json={"original_url": "https://new.com", "short_name": "new"},
+        )
+
+        response = await client.get("/api/links", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert len(response.json()) == 4
+
+    async def test_list_etag_survives_writes_that_change_no_links(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        etag = (await client.get("/api/links")).headers["ETag"]
+        repository = AsyncURLRepository(db_session)
+
+        await repository.add_clicks({link.short_name: (3, datetime.utcnow())})
+        await db_session.commit()
+        await client.delete(f"/api/links/{UNKNOWN_LINK_ID}")
+        await client.post(
+            "/api/links/import",
+            content='{"original_url": "https://other.com", "short_name": "example"}',
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        unchanged = await client.get("/api/links", headers={"If-None-Match": etag})
+        await client.put(
+            f"/api/links/{link.id}",
+            json={"original_url": "https://updated.com", "short_name": "example"},
+        )
+        changed = await client.get("/api/links", headers={"If-None-Match": etag})
+
+        assert unchanged.status_code == 304
+        assert changed.status_code == 200
+
+    async def test_list_etag_depends_on_query(
+        self, client: AsyncClient, many_links: list[URL]
+    ) -> None:
+        first_page = await client.get("/api/links", params={"range": "[0,5]"})
+        etag = first_page.headers["ETag"]
+
+        same_page = await client.get(
+            "/api/links", params={"range": "[0,5]"}, headers={"If-None-Match": etag}
+        )
+        other_page = await client.get(
+            "/api/links", params={"range": "[5,10]"}, headers={"If-None-Match": etag}
+        )
+        filtered = await client.get(
+            "/api/links",
+            params={"range": "[0,5]", "filter": '{"short_name": "x"}'},
+            headers={"If-None-Match": etag},
+        )
+
+        assert same_page.status_code == 304
+        assert other_page.status_code == 200
+        assert other_page.headers["ETag"] != etag
+        assert filtered.status_code == 200
+
+    @pytest.mark.parametrize(
+        "params", [{"filter": "not json"}, {"cursor": "invalid"}, {"range": "[1,1]"}]
+    )
+    async def test_list_validates_query_before_etag(
+        self, client: AsyncClient, links: list[URL], params: dict[str, str]
+    ) -> None:
+        response = await client.get(
+            "/api/links", params=params, headers={"If-None-Match": "*"}
+        )
+
+        assert response.status_code == 400
+
     async def test_get_returns_link_by_id(self, client: AsyncClient, link: URL) -> None:
         response = await client.get(f"/api/links/{link.id}")
 
@@ -81,6 +334,47 @@ class TestLinks:
         assert data["short_name"] == link.short_name
         assert data["short_url"].endswith(f"/r/{link.short_name}")
 
+    async def test_get_returns_304_for_matching_etag(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        first_response = await client.get(f"/api/links/{link.id}")
+        etag = first_response.headers["ETag"]
+
+        response = await client.get(
+            f"/api/links/{link.id}", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    async def test_get_returns_304_if_not_modified_since(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        first_response = await client.get(f"/api/links/{link.id}")
+        last_modified = first_response.headers["Last-Modified"]
+
+        response = await client.get(
+            f"/api/links/{link.id}", headers={"If-Modified-Since": last_modified}
+        )
+
+        assert response.status_code == 304
+
+    async def test_get_returns_link_after_update_despite_old_etag(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        first_response = await client.get(f"/api/links/{link.id}")
+        etag = first_response.headers["ETag"]
+        payload = {"original_url": "https://updated.com", "short_name": "updated"}
+        await client.put(f"/api/links/{link.id}", json=payload)
+
+        response = await client.get(
+            f"/api/links/{link.id}", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["short_name"] == "updated"
+        assert response.headers["ETag"] != etag
+
     async def test_get_returns_404_for_unknown_link(self, client: AsyncClient) -> None:
         response = await client.get(f"/api/links/{UNKNOWN_LINK_ID}")
 
@@ -88,7 +382,7 @@ class TestLinks:
         assert "not found" in response.json()["detail"]
 
     async def test_create_saves_link(
-        self, client: AsyncClient, db_session: Session
+        self, client: AsyncClient, db_session: AsyncSession
     ) -> None:
         payload = {"original_url": "https://example.com", "short_name": "example"}
 
@@ -99,18 +393,44 @@ class TestLinks:
         assert data["original_url"] == payload["original_url"]
         assert data["short_name"] == payload["short_name"]
 
-        created = db_session.get(URL, data["id"])
+        created = await db_session.get(URL, data["id"])
         assert created is not None
         assert created.original_url == payload["original_url"]
         assert created.short_name == payload["short_name"]
 
-    async def test_create_requires_short_name(self, client: AsyncClient) -> None:
-        payload = {"original_url": "https://example.com", "short_name": ""}
+    async def test_create_generates_short_name(self, client: AsyncClient) -> None:
+        first_response = await client.post(
+            "/api/links", json={"original_url": "https://example.com"}
+        )
+        second_response = await client.post(
+            "/api/links", json={"original_url": "https://example.com", "short_name": ""}
+        )
+
+        assert first_response.status_code == 201
+        assert second_response.status_code == 201
+        first_name = first_response.json()["short_name"]
+        second_name = second_response.json()["short_name"]
+        assert first_name
+        assert second_name
+        assert first_name != second_name
+
+        redirect = await client.get(f"/r/{first_name}", follow_redirects=False)
+        assert redirect.headers["location"] == "https://example.com"
+
+    async def test_create_skips_generated_name_taken_manually(
+        self, client: AsyncClient, create_link: Callable[..., Awaitable[URL]]
+    ) -> None:
+        payload = {"original_url": "https://example.com"}
+        first_response = await client.post("/api/links", json=payload)
+        taken_name = encode_base62(
+            decode_base62(first_response.json()["short_name"]) + 1
+        )
+        await create_link(short_name=taken_name)
 
         response = await client.post("/api/links", json=payload)
 
-        assert response.status_code == 400
-        assert "short_name" in response.json()["detail"]
+        assert response.status_code == 201
+        assert response.json()["short_name"] != taken_name
 
     async def test_create_rejects_duplicate_short_name(
         self, client: AsyncClient, link: URL
@@ -123,7 +443,7 @@ class TestLinks:
         assert "already exists" in response.json()["detail"]
 
     async def test_update_saves_changes(
-        self, client: AsyncClient, db_session: Session, link: URL
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
     ) -> None:
         payload = {"original_url": "https://updated.com", "short_name": "updated"}
 
@@ -134,7 +454,7 @@ class TestLinks:
         assert data["original_url"] == payload["original_url"]
         assert data["short_name"] == payload["short_name"]
 
-        db_session.refresh(link)
+        await db_session.refresh(link)
         assert link.original_url == payload["original_url"]
         assert link.short_name == payload["short_name"]
 
@@ -149,9 +469,11 @@ class TestLinks:
         assert "not found" in response.json()["detail"]
 
     async def test_update_rejects_short_name_of_another_link(
-        self, client: AsyncClient, link: URL, create_link: Callable[..., URL]
+        self, client: AsyncClient, link: URL, create_link: Callable[..., Awaitable[URL]]
     ) -> None:
-        other_link = create_link(original_url="https://google.com", short_name="google")
+        other_link = await create_link(
+            original_url="https://google.com", short_name="google"
+        )
         payload = {
             "original_url": "https://updated.com",
             "short_name": other_link.short_name,
@@ -176,7 +498,7 @@ class TestLinks:
         assert response.json()["short_name"] == link.short_name
 
     async def test_delete_removes_link(
-        self, client: AsyncClient, db_session: Session, link: URL
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
     ) -> None:
         link_id = link.id
 
@@ -184,7 +506,7 @@ class TestLinks:
 
         assert response.status_code == 204
         assert response.content == b""
-        assert db_session.get(URL, link_id) is None
+        assert await db_session.get(URL, link_id) is None
 
     async def test_delete_returns_404_for_unknown_link(
         self, client: AsyncClient
@@ -195,6 +517,399 @@ class TestLinks:
         assert "not found" in response.json()["detail"]
 
 
+class TestLinksFilter:
+    """Фильтр списка ссылок в формате react-admin"""
+
+    @pytest.fixture
+    async def named_links(
+        self, db_session: AsyncSession, create_link: Callable[..., Awaitable[URL]]
+    ) -> list[URL]:
+        links = [
+            await create_link("https://docs.example.com/a", "docs-a"),
+            await create_link("https://Docs.Example.com/b", "docs-b"),
+            await create_link("https://blog.test/post", "blog"),
+            await create_link("https://shop.test/item", "doc_s"),
+        ]
+        for day, link in enumerate(links, start=1):
+            link.created_at = datetime(2024, 1, day)
+            db_session.add(link)
+        await db_session.commit()
+        return links
+
+    async def get(self, client: AsyncClient, link_filter: dict, **params: str):
+        return await client.get(
+            "/api/links", params={"filter": json.dumps(link_filter), **params}
+        )
+
+    async def test_filters_by_short_name_prefix(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(client, {"short_name": "docs"})
+
+        assert response.status_code == 200
+        assert [item["short_name"] for item in response.json()] == ["docs-a", "docs-b"]
+        assert response.headers["Content-Range"] == "links 0-1/2"
+
+    async def test_prefix_escapes_like_wildcards(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(client, {"short_name": "doc_"})
+
+        assert [item["short_name"] for item in response.json()] == ["doc_s"]
+
+    async def test_filters_by_original_url_substring_ignoring_case(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(client, {"original_url": "docs.example"})
+
+        assert [item["short_name"] for item in response.json()] == ["docs-a", "docs-b"]
+
+    async def test_filters_by_created_at_range(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(
+            client,
+            {
+                "created_at_gte": "2024-01-02T00:00:00Z",
+                "created_at_lte": "2024-01-03T00:00:00",
+            },
+        )
+
+        assert [item["short_name"] for item in response.json()] == ["docs-b", "blog"]
+
+    async def test_filters_by_ids(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        ids = [named_links[0].id, named_links[2].id]
+
+        response = await self.get(client, {"id": ids})
+
+        assert [item["id"] for item in response.json()] == ids
+
+    async def test_combines_filters_with_range(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(
+            client, {"short_name": "d", "original_url": "example"}, range="[1,2]"
+        )
+
+        assert [item["short_name"] for item in response.json()] == ["docs-b"]
+        assert response.headers["Content-Range"] == "links 1-1/2"
+
+    async def test_counts_exactly_in_cached_mode(
+        self,
+        client: AsyncClient,
+        monkeypatch: pytest.MonkeyPatch,
+        named_links: list[URL],
+    ) -> None:
+        monkeypatch.setattr("app.api.LINKS_COUNT_MODE", "cached")
+
+        response = await self.get(client, {"short_name": "blog"})
+
+        assert response.headers["Content-Range"] == "links 0-0/1"
+
+    async def test_filters_keyset_pages(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        first = await self.get(client, {"short_name": "doc"}, cursor="", range="[0,2]")
+        cursor = first.headers["X-Next-Cursor"]
+        second = await self.get(client, {"short_name": "doc"}, cursor=cursor)
+
+        assert [item["short_name"] for item in first.json()] == ["docs-a", "docs-b"]
+        assert [item["short_name"] for item in second.json()] == ["doc_s"]
+
+    async def test_empty_filter_returns_all_links(
+        self, client: AsyncClient, named_links: list[URL]
+    ) -> None:
+        response = await self.get(client, {"short_name": "", "q": "ignored"})
+
+        assert len(response.json()) == 4
+
+    async def test_rejects_invalid_filter(self, client: AsyncClient) -> None:
+        response = await client.get("/api/links", params={"filter": "{not json"})
+
+        assert response.status_code == 400
+        assert "Invalid filter" in response.json()["detail"]
+
+
+class TestOriginalUrlDigest:
+    """Поиск ссылок по точному адресу через дайджест original_url"""
+
+    @staticmethod
+    async def digest(db_session: AsyncSession, link: URL) -> bytes | None:
+        result = await db_session.exec(
+            text("SELECT original_url_hash FROM url WHERE id = :id"),
+            params={"id": link.id},
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    async def clear_digests(db_session: AsyncSession) -> None:
+        # Строки, созданные до появления триггера
+        await db_session.exec(
+            text("ALTER TABLE url DISABLE TRIGGER url_set_original_url_hash")
+        )
+        await db_session.exec(text("UPDATE url SET original_url_hash = NULL"))
+        await db_session.exec(
+            text("ALTER TABLE url ENABLE TRIGGER url_set_original_url_hash")
+        )
+
+    async def test_trigger_fills_digest(
+        self, db_session: AsyncSession, link: URL
+    ) -> None:
+        digest = await self.digest(db_session, link)
+        assert digest is not None
+        assert len(digest) == 16
+
+        link.original_url = "https://changed.example.com"
+        db_session.add(link)
+        await db_session.commit()
+
+        assert await self.digest(db_session, link) not in (None, digest)
+
+    async def test_finds_exact_original_url(
+        self, client: AsyncClient, create_link: Callable[..., Awaitable[URL]]
+    ) -> None:
+        await create_link("https://example.com/page/1")
+        target = await create_link("https://example.com/page")
+
+        response = await client.get(
+            "/api/links", params={"original_url": "https://example.com/page"}
+        )
+
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()] == [target.id]
+        assert response.headers["Content-Range"] == "links 0-0/1"
+
+    async def test_finds_rows_without_digest(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        await self.clear_digests(db_session)
+
+        response = await client.get(
+            "/api/links", params={"original_url": link.original_url}
+        )
+
+        assert [item["id"] for item in response.json()] == [link.id]
+
+    async def test_deduplicate_returns_existing_link(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        response = await client.post(
+            "/api/links",
+            params={"deduplicate": "true"},
+            json={"original_url": link.original_url},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["id"] == link.id
+
+    async def test_deduplicate_creates_missing_link(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        response = await client.post(
+            "/api/links",
+            params={"deduplicate": "true"},
+            json={"original_url": "https://new.example.com"},
+        )
+
+        assert response.status_code == 201
+        assert response.json()["id"] != link.id
+
+    async def test_short_name_disables_deduplication(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        response = await client.post(
+            "/api/links",
+            params={"deduplicate": "true"},
+            json={"original_url": link.original_url, "short_name": "another"},
+        )
+
+        assert response.status_code == 201
+        assert response.json()["short_name"] == "another"
+
+    async def test_backfill_fills_digests_in_batches(
+        self,
+        db_session: AsyncSession,
+        create_link: Callable[..., Awaitable[URL]],
+    ) -> None:
+        links = [await create_link() for _ in range(5)]
+        await self.clear_digests(db_session)
+
+        total = await backfill_original_url_hashes(
+            lambda: nullcontext(db_session), batch_size=2
+        )
+
+        assert total >= len(links)
+        for link in links:
+            assert await self.digest(db_session, link) is not None
+
+
+class TestLinksImport:
+    """Ресурс /api/links/import"""
+
+    async def test_imports_ndjson_and_reports_conflicts(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        body = "\n".join(
+            [
+                '{"original_url": "https://one.com", "short_name": "one"}',
+                '{"original_url": "https://other.com", "short_name": "example"}',
+                "",
+                '{"original_url": "https://two.com", "short_name": "two"}',
+                '{"original_url": "https://dup.com", "short_name": "one"}',
+            ]
+        )
+
+        response = await client.post(
+            "/api/links/import",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 2
+        assert data["conflicts_total"] == 2
+        assert [(item["line"], item["short_name"]) for item in data["conflicts"]] == [
+            (2, "example"),
+            (5, "one"),
+        ]
+        one = (await db_session.exec(select(URL).where(URL.short_name == "one"))).one()
+        assert one.original_url == "https://one.com"
+
+    async def test_imports_csv_in_batches(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr("app.api.IMPORT_BATCH_SIZE", 2)
+        rows = [f"https://example{number}.com,example{number}" for number in range(5)]
+        body = "\r\n".join(["original_url,short_name", *rows]) + "\r\n"
+
+        response = await client.post(
+            "/api/links/import", content=body, headers={"Content-Type": "text/csv"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["created"] == 5
+        count = (await db_session.exec(select(func.count()).select_from(URL))).one()
+        assert count == 5
+
+    async def test_imports_expiry(
+        self, client: AsyncClient, db_session: AsyncSession
+    ) -> None:
+        ndjson = "\n".join(
+            [
+                '{"original_url": "https://one.com", "short_name": "one",'
+                ' "expires_at": "2099-01-01T03:00:00+03:00"}',
+                '{"original_url": "https://two.com", "short_name": "two"}',
+            ]
+        )
+        csv_body = (
+            "original_url,short_name,expires_at\r\n"
+            "https://three.com,three,2099-01-01T00:00:00Z\r\n"
+            "https://four.com,four,\r\n"
+        )
+
+        await client.post(
+            "/api/links/import",
+            content=ndjson,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response = await client.post(
+            "/api/links/import", content=csv_body, headers={"Content-Type": "text/csv"}
+        )
+
+        assert response.json()["created"] == 2
+        expiry = dict(
+            (await db_session.exec(select(URL.short_name, URL.expires_at))).all()
+        )
+        assert expiry == {
+            "one": datetime(2099, 1, 1),
+            "two": None,
+            "three": datetime(2099, 1, 1),
+            "four": None,
+        }
+
+    async def test_reports_invalid_rows(self, client: AsyncClient) -> None:
+        body = "\n".join(
+            [
+                '{"original_url": "https://one.com", "short_name": "one"}',
+                "not json",
+                '{"original_url": "https://empty.com", "short_name": ""}',
+            ]
+        )
+
+        response = await client.post(
+            "/api/links/import",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        data = response.json()
+        assert data["created"] == 1
+        assert data["errors_total"] == 2
+        assert [item["line"] for item in data["errors"]] == [2, 3]
+
+    async def test_rejects_csv_without_required_columns(
+        self, client: AsyncClient
+    ) -> None:
+        response = await client.post(
+            "/api/links/import",
+            content="url,name\nhttps://one.com,one\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 400
+        assert "missing columns" in response.json()["detail"]
+
+    async def test_rejects_unsupported_content_type(self, client: AsyncClient) -> None:
+        response = await client.post(
+            "/api/links/import", content="{}", headers={"Content-Type": "text/plain"}
+        )
+
+        assert response.status_code == 415
+
+
+class TestLinksExport:
+    """Ресурс /api/links/export"""
+
+    async def test_exports_ndjson(
+        self,
+        client: AsyncClient,
+        monkeypatch: pytest.MonkeyPatch,
+        many_links: list[URL],
+    ) -> None:
+        monkeypatch.setattr("app.api.EXPORT_BATCH_SIZE", 4)
+
+        response = await client.get("/api/links/export")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in rows] == [link.id for link in many_links]
+        assert rows[0]["short_name"] == many_links[0].short_name
+        assert rows[0]["created_at"] == many_links[0].created_at.isoformat()
+        assert "original_url_hash" not in rows[0]
+
+    async def test_exports_csv(self, client: AsyncClient, links: list[URL]) -> None:
+        response = await client.get("/api/links/export?format=csv")
+
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["short_name"] for row in rows] == [
+            link.short_name for link in links
+        ]
+        assert rows[0]["original_url"] == links[0].original_url
+
+    async def test_rejects_unknown_format(self, client: AsyncClient) -> None:
+        response = await client.get("/api/links/export?format=xml")
+
+        assert response.status_code == 400
+
+
 class TestRedirect:
     """Ресурс /r/{short_name}"""
 
@@ -213,3 +928,204 @@ class TestRedirect:
 
         assert response.status_code == 404
         assert "not found" in response.json()["detail"]
+
+    async def test_serves_repeated_redirect_from_cache(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 307
+        assert response.headers["location"] == link.original_url
+        assert redirect_cache.stats.hits == 1
+
+    async def test_redirects_to_new_target_after_update(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        payload = {"original_url": "https://updated.com", "short_name": "updated"}
+        await client.put(f"/api/links/{link.id}", json=payload)
+
+        old_response = await client.get("/r/example", follow_redirects=False)
+        new_response = await client.get("/r/updated", follow_redirects=False)
+
+        assert old_response.status_code == 404
+        assert new_response.status_code == 307
+        assert new_response.headers["location"] == payload["original_url"]
+
+    async def test_returns_404_after_delete(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        await client.delete(f"/api/links/{link.id}")
+
+        response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 404
+
+    async def test_counts_clicks_after_flush(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        await client.get("/r/nonexistent", follow_redirects=False)
+
+        flushed = await flush_clicks(click_buffer, AsyncURLRepository(db_session))
+        response = await client.get(f"/api/links/{link.id}")
+
+        assert flushed == 1
+        assert len(click_buffer) == 0
+        data = response.json()
+        assert data["click_count"] == 2
+        assert data["last_accessed_at"] is not None
+
+    async def test_rejects_unknown_short_name_by_filter(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        await rebuild_short_name_filter(
+            short_name_filter, AsyncURLRepository(db_session)
+        )
+        queries = db_queries.get(engine="async", operation="SELECT")
+
+        response = await client.get("/r/nonexistent", follow_redirects=False)
+
+        assert response.status_code == 404
+        assert short_name_filter.stats.rejected == 1
+        assert db_queries.get(engine="async", operation="SELECT") == queries
+
+    async def test_filter_learns_created_and_renamed_links(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        await rebuild_short_name_filter(
+            short_name_filter, AsyncURLRepository(db_session)
+        )
+        await client.post(
+            "/api/links",
+            json={"original_url": "https://created.com", "short_name": "created"},
+        )
+        await client.put(
+            f"/api/links/{link.id}",
+            json={"original_url": "https://renamed.com", "short_name": "renamed"},
+        )
+        redirect_cache.clear()
+
+        created = await client.get("/r/created", follow_redirects=False)
+        renamed = await client.get("/r/renamed", follow_redirects=False)
+
+        assert created.status_code == 307
+        assert renamed.status_code == 307
+        assert short_name_filter.stats.rejected == 0
+
+    async def test_redirect_is_not_cacheable_by_default(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert "Cache-Control" not in response.headers
+
+    async def test_emits_cache_headers_and_configured_status(
+        self, client: AsyncClient, monkeypatch: pytest.MonkeyPatch, link: URL
+    ) -> None:
+        monkeypatch.setattr("app.fast_redirect.REDIRECT_MAX_AGE", 300)
+        monkeypatch.setattr("app.fast_redirect.REDIRECT_STATUS_CODE", 301)
+
+        response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+        missing = await client.get("/r/nonexistent", follow_redirects=False)
+
+        assert response.status_code == 301
+        assert response.headers["Cache-Control"] == "public, max-age=300"
+        assert "Expires" in response.headers
+        assert missing.status_code == 404
+        assert missing.headers["Cache-Control"] == "public, max-age=300"
+
+    async def test_refresh_request_is_not_counted_as_click(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        await client.get(
+            f"/r/{link.short_name}",
+            headers={"X-Cache-Refresh": "1"},
+            follow_redirects=False,
+        )
+
+        assert len(click_buffer) == 0
+
+    @pytest.mark.parametrize("router_name", ["fast", "legacy"])
+    async def test_refresh_request_bypasses_process_cache(
+        self, client: AsyncClient, link: URL, router_name: str
+    ) -> None:
+        redirect_cache.set(link.short_name, RedirectTarget("https://stale.com"))
+        router = redirect_routers()[router_name]
+
+        async with AsyncClient(
+            transport=ASGITransport(app=router), base_url="http://test"
+        ) as router_client:
+            response = await router_client.get(
+                f"/r/{link.short_name}",
+                headers={"X-Cache-Refresh": "1"},
+                follow_redirects=False,
+            )
+
+        assert response.headers["location"] == link.original_url
+        assert redirect_cache.get(link.short_name) == RedirectTarget(link.original_url)
+
+    async def test_purges_edge_cache_on_write(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        purged: list[Request] = []
+
+        def handler(request: Request) -> Response:
+            purged.append(request)
+            return Response(307)
+
+        purger = RedirectPurger("http://nginx", transport=MockTransport(handler))
+        app.dependency_overrides[get_redirect_purger] = lambda: purger
+
+        payload = {"original_url": "https://updated.com", "short_name": "updated"}
+        await client.put(f"/api/links/{link.id}", json=payload)
+        await client.delete(f"/api/links/{link.id}")
+        await purger.wait()
+
+        assert [request.url.path for request in purged] == [
+            "/r/example",
+            "/r/updated",
+            "/r/updated",
+        ]
+        assert all(request.headers["X-Cache-Refresh"] == "1" for request in purged)
+
+    async def test_answers_head_without_body(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        response = await client.head(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 307
+        assert response.headers["location"] == link.original_url
+        assert response.content == b""
+
+    async def test_rejects_other_methods(self, client: AsyncClient, link: URL) -> None:
+        response = await client.post(f"/r/{link.short_name}")
+
+        assert response.status_code == 405
+        assert response.json() == {"detail": "Method Not Allowed"}
+
+    @pytest.mark.parametrize("short_name", ["example", "nonexistent"])
+    async def test_fast_path_matches_fastapi_route(
+        self,
+        client: AsyncClient,
+        monkeypatch: pytest.MonkeyPatch,
+        link: URL,
+        short_name: str,
+    ) -> None:
+        monkeypatch.setattr("app.fast_redirect.REDIRECT_MAX_AGE", 60)
+        monkeypatch.setattr("app.main.REDIRECT_MAX_AGE", 60)
+        responses = {}
+        for name, router in redirect_routers().items():
+            async with AsyncClient(
+                transport=ASGITransport(app=router), base_url="http://test"
+            ) as router_client:
+                responses[name] = await router_client.get(f"/r/{short_name}")
+
+        fast, legacy = responses["fast"], responses["legacy"]
+        assert fast.status_code == legacy.status_code
+        assert fast.content == legacy.content
+        for header in ("location", "content-type", "content-length", "cache-control"):
+            assert fast.headers.get(header) == legacy.headers.get(header)
@@ -0,0 +1,51 @@
+from benchmarks.driver import ZipfSampler
+from benchmarks.report import compare, percentile, summarize
+
+
+def make_report(**scenario):
+    result = {"rps": 1000, "p50_ms": 1, "p95_ms": 5, "p99_ms": 10, "errors": 0}
+    return {"scenarios": {"redirect": {**result, **scenario}}}
+
+
+class TestReport:
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.5) == 0
+
+    def test_summarize(self):
+        summary = summarize([0.001, 0.002, 0.003, 0.004], errors=1, duration=2)
+        assert summary == {
+            "requests": 4,
+            "errors": 1,
+            "rps": 2.0,
+            "p50_ms": 2.0,
+            "p95_ms": 4.0,
+            "p99_ms": 4.0,
+        }
+
+    def test_compare_within_threshold(self):
+        report = make_report(p99_ms=10.5, rps=950)
+        assert compare(report, make_report(), threshold=0.1) == []
+
+    def test_compare_flags_regressions(self):
+        report = make_report(p95_ms=6, rps=800, errors=3)
+        assert compare(report, make_report(), threshold=0.1) == [
+            "redirect: p95_ms 5 -> 6",
+            "redirect: rps 1000 -> 800",
+            "redirect: errors 0 -> 3",
+        ]
+
+    def test_compare_skips_new_scenarios(self):
+        report = make_report()
+        assert compare(report, {"scenarios": {}}, threshold=0.1) == []
+
+
+class TestZipfSampler:
+    def test_keys_in_range_and_skewed(self):
+        sample = ZipfSampler(1000, seed=1)
+        keys = [sample() for _ in range(10_000)]
+        assert min(keys) >= 0
+        assert max(keys) < 1000
+        assert keys.count(0) > keys.count(999)
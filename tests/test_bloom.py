@@ -0,0 +1,83 @@
+from collections.abc import AsyncIterator, Iterable
+
+from app.bloom import BloomFilter, ShortNameFilter
+
+
+async def batches(*items: Iterable[str]) -> AsyncIterator[Iterable[str]]:
+    for batch in items:
+        yield batch
+
+
+class TestBloomFilter:
+    """Фильтр Блума для строк"""
+
+    def test_contains_added_items(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        names = [f"name{number}" for number in range(1000)]
+        bloom.update(names)
+
+        assert all(name in bloom for name in names)
+        assert len(bloom) == 1000
+
+    def test_false_positive_rate_close_to_target(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        bloom.update(f"name{number}" for number in range(1000))
+
+        false_positives = sum(f"other{number}" in bloom for number in range(10000))
+
+        assert false_positives / 10000 < 0.03
+        assert 0.005 < bloom.false_positive_rate() < 0.015
+
+    def test_size_depends_on_capacity(self) -> None:
+        bloom = BloomFilter(capacity=100000, error_rate=0.01)
+
+        assert 110000 < bloom.nbytes < 130000
+        assert bloom.hash_count == 7
+
+
+class TestShortNameFilter:
+    """Фильтр существующих коротких имён"""
+
+    def test_passes_everything_before_build(self) -> None:
+        name_filter = ShortNameFilter(error_rate=0.01, min_capacity=100)
+
+        assert name_filter.might_contain("anything")
+        assert name_filter.stats.passed == 0
+
+    async def test_rejects_unknown_names_after_build(self) -> None:
+        name_filter = ShortNameFilter(error_rate=0.01, min_capacity=100)
+        await name_filter.rebuild(batches(["first", "second"], ["third"]), 3)
+
+        assert name_filter.might_contain("second")
+        assert not name_filter.might_contain("unknown")
+        assert name_filter.stats.passed == 1
+        assert name_filter.stats.rejected == 1
+
+    async def test_keeps_names_added_during_rebuild(self) -> None:
+        name_filter = ShortNameFilter(error_rate=0.01, min_capacity=100)
+
+        async def names() -> AsyncIterator[Iterable[str]]:
+            yield ["existing"]
+            name_filter.add("created")
+
+        await name_filter.rebuild(names(), 1)
+
+        assert name_filter.might_contain("existing")
+        assert name_filter.might_contain("created")
+
+    async def test_rebuild_forgets_deleted_names(self) -> None:
+        name_filter = ShortNameFilter(error_rate=0.01, min_capacity=100)
+        await name_filter.rebuild(batches(["deleted", "kept"]), 2)
+        await name_filter.rebuild(batches(["kept"]), 1)
+
+        assert not name_filter.might_contain("deleted")
+
+    async def test_observed_false_positive_rate(self) -> None:
+        name_filter = ShortNameFilter(error_rate=0.01, min_capacity=100)
+        await name_filter.rebuild(batches(["deleted"]), 1)
+
+        name_filter.might_contain("unknown")
+        name_filter.might_contain("deleted")
+        name_filter.record_false_positive()
+
+        assert name_filter.stats.false_positive_rate() == 0.5
@@ -0,0 +1,81 @@
+from app.cache import LRUCache
+
+
+class FakeTimer:
+    """Управляемые часы для проверки времени жизни записей"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestLRUCache:
+    """Кэш с ограничением размера и временем жизни записей"""
+
+    def test_returns_saved_value(self) -> None:
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=60)
+        cache.set("example", "https://example.com")
+
+        assert cache.get("example") == "https://example.com"
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 0
+
+    def test_counts_miss_for_unknown_key(self) -> None:
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=60)
+
+        assert cache.get("unknown") is None
+        assert cache.stats.misses == 1
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=60)
+        cache.set("first", "1")
+        cache.set("second", "2")
+        cache.get("first")
+
+        cache.set("third", "3")
+
+        assert cache.get("second") is None
+        assert cache.get("first") == "1"
+        assert cache.get("third") == "3"
+        assert cache.stats.evictions == 1
+        assert len(cache) == 2
+
+    def test_expires_entries_after_ttl(self) -> None:
+        timer = FakeTimer()
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=10, timer=timer)
+        cache.set("example", "https://example.com")
+
+        timer.now = 10
+
+        assert cache.get("example") is None
+        assert cache.stats.misses == 1
+        assert len(cache) == 0
+
+    def test_entry_ttl_is_capped_by_cache_ttl(self) -> None:
+        timer = FakeTimer()
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=10, timer=timer)
+        cache.set("short", "1", ttl=2)
+        cache.set("long", "2", ttl=100)
+
+        timer.now = 2
+        assert cache.get("short") is None
+        assert cache.get("long") == "2"
+
+        timer.now = 10
+        assert cache.get("long") is None
+
+    def test_invalidate_removes_entry(self) -> None:
+        cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=60)
+        cache.set("example", "https://example.com")
+
+        cache.invalidate("example")
+
+        assert cache.get("example") is None
+
+    def test_zero_size_disables_cache(self) -> None:
+        cache: LRUCache[str, str] = LRUCache(maxsize=0, ttl=60)
+        cache.set("example", "https://example.com")
+
+        assert cache.get("example") is None
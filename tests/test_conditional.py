@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from starlette.requests import Request
+
+from app.conditional import is_not_modified, make_etag
+
+LAST_MODIFIED = datetime(2024, 1, 2, 3, 4, 5, 678000)
+
+
+def make_request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+class TestIsNotModified:
+    """Проверка условных заголовков запроса"""
+
+    def test_matches_weak_etag_from_list(self) -> None:
+        etag = make_etag("links", 5)
+        request = make_request(if_none_match=f'"other", {etag}')
+
+        assert is_not_modified(request, etag, LAST_MODIFIED)
+
+    def test_matches_strong_form_of_weak_etag(self) -> None:
+        request = make_request(if_none_match='"links-5"')
+
+        assert is_not_modified(request, make_etag("links", 5), LAST_MODIFIED)
+
+    def test_etag_takes_precedence_over_date(self) -> None:
+        request = make_request(
+            if_none_match='W/"links-4"',
+            if_modified_since="Tue, 02 Jan 2024 03:04:05 GMT",
+        )
+
+        assert not is_not_modified(request, make_etag("links", 5), LAST_MODIFIED)
+
+    def test_compares_dates_with_second_precision(self) -> None:
+        request = make_request(if_modified_since="Tue, 02 Jan 2024 03:04:05 GMT")
+
+        assert is_not_modified(request, make_etag("links", 5), LAST_MODIFIED)
+
+    def test_modified_after_date(self) -> None:
+        request = make_request(if_modified_since="Tue, 02 Jan 2024 03:04:04 GMT")
+
+        assert not is_not_modified(request, make_etag("links", 5), LAST_MODIFIED)
+
+    def test_ignores_invalid_date(self) -> None:
+        request = make_request(if_modified_since="yesterday")
+
+        assert not is_not_modified(request, make_etag("links", 5), LAST_MODIFIED)
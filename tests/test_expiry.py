@@ -0,0 +1,152 @@
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.cache import LRUCache, RedirectTarget, redirect_cache
+from app.expiry import purge_expired_links
+from app.models import URL
+from app.repository import AsyncURLRepository
+from benchmarks.redirect import redirect_routers
+from tests.test_cache import FakeTimer
+
+
+async def set_expires_at(
+    db_session: AsyncSession, link: URL, expires_at: datetime | None
+) -> None:
+    link.expires_at = expires_at
+    db_session.add(link)
+    await db_session.commit()
+
+
+def hours(count: int) -> datetime:
+    return datetime.utcnow() + timedelta(hours=count)
+
+
+class TestLinkExpiry:
+    """Ссылки со сроком действия"""
+
+    async def test_creates_link_with_expiry_in_utc(self, client: AsyncClient) -> None:
+        response = await client.post(
+            "/api/links",
+            json={
+                "original_url": "https://campaign.example.com",
+                "short_name": "campaign",
+                "expires_at": "2099-01-01T03:00:00+03:00",
+            },
+        )
+
+        assert response.status_code == 201
+        assert response.json()["expires_at"] == "2099-01-01T00:00:00"
+
+        redirect = await client.get("/r/campaign", follow_redirects=False)
+        assert redirect.status_code == 307
+
+    async def test_expired_link_is_not_found(
+        self, client: AsyncClient, db_session: AsyncSession, link: URL
+    ) -> None:
+        await set_expires_at(db_session, link, hours(-1))
+
+        response = await client.get(f"/r/{link.short_name}", follow_redirects=False)
+
+        assert response.status_code == 404
+        repository = AsyncURLRepository(db_session)
+        assert await repository.get_by_short_name(link.short_name) is None
+
+    async def test_cached_redirect_ends_with_expiry(
+        self, db_session: AsyncSession, link: URL
+    ) -> None:
+        await set_expires_at(
+            db_session, link, datetime.utcnow() + timedelta(seconds=30)
+        )
+        timer = FakeTimer()
+        cache: LRUCache[str, RedirectTarget] = LRUCache(maxsize=10, ttl=60, timer=timer)
+        repository = AsyncURLRepository(db_session, cache)
+
+        target = await repository.get_redirect_target(link.short_name)
+        assert target == RedirectTarget(link.original_url, link.expires_at)
+
+        timer.now = 30
+        assert cache.get(link.short_name) is None
+
+    @pytest.mark.parametrize("router_name", ["fast", "legacy"])
+    async def test_edge_cache_ends_with_expiry(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+        create_link: Callable[..., Awaitable[URL]],
+        router_name: str,
+    ) -> None:
+        monkeypatch.setattr("app.fast_redirect.REDIRECT_MAX_AGE", 300)
+        monkeypatch.setattr("app.main.REDIRECT_MAX_AGE", 300)
+        expiring, ending = await create_link(), await create_link()
+        await set_expires_at(
+            db_session, expiring, datetime.utcnow() + timedelta(seconds=100)
+        )
+        await set_expires_at(
+            db_session, ending, datetime.utcnow() + timedelta(seconds=0.9)
+        )
+        router = redirect_routers()[router_name]
+
+        async with AsyncClient(
+            transport=ASGITransport(app=router), base_url="http://test"
+        ) as router_client:
+            # Второй ответ берётся из кэша процесса
+            responses = [
+                await router_client.get(f"/r/{link.short_name}")
+                for link in (expiring, expiring, ending)
+            ]
+
+        for response in responses[:2]:
+            max_age = int(response.headers["Cache-Control"].split("max-age=")[1])
+            assert 95 <= max_age <= 100
+        assert responses[2].status_code == 307
+        assert responses[2].headers["Cache-Control"] == "no-store"
+        assert "Expires" not in responses[2].headers
+
+    async def test_most_clicked_skips_expired_links(
+        self,
+        db_session: AsyncSession,
+        create_link: Callable[..., Awaitable[URL]],
+    ) -> None:
+        active, expired = await create_link(), await create_link()
+        await set_expires_at(db_session, expired, hours(-1))
+
+        rows = await AsyncURLRepository(db_session).get_most_clicked(10)
+
+        assert [row.short_name for row in rows] == [active.short_name]
+
+
+class TestPurgeExpiredLinks:
+    """Фоновое удаление просроченных ссылок"""
+
+    async def test_deletes_expired_links_in_batches(
+        self,
+        db_session: AsyncSession,
+        create_link: Callable[..., Awaitable[URL]],
+    ) -> None:
+        links = [await create_link() for _ in range(7)]
+        for link in links[:5]:
+            await set_expires_at(db_session, link, hours(-1))
+        await set_expires_at(db_session, links[5], hours(1))
+        redirect_cache.set(links[0].short_name, RedirectTarget(links[0].original_url))
+
+        deleted = await purge_expired_links(
+            AsyncURLRepository(db_session, redirect_cache), batch_size=2
+        )
+
+        assert deleted == 5
+        remaining = await db_session.exec(select(URL.id).order_by(URL.id))
+        assert remaining.all() == [links[5].id, links[6].id]
+        assert redirect_cache.get(links[0].short_name) is None
+
+    async def test_nothing_to_delete(self, db_session: AsyncSession, link: URL) -> None:
+        deleted = await purge_expired_links(
+            AsyncURLRepository(db_session), batch_size=10
+        )
+
+        assert deleted == 0
@@ -0,0 +1,68 @@
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import (
+    Counter,
+    Histogram,
+    db_queries,
+    http_requests,
+    instrument_engine,
+)
+from app.models import URL
+
+
+class TestMetricTypes:
+    """Текстовый формат Prometheus"""
+
+    def test_renders_counter_with_labels(self) -> None:
+        counter = Counter("requests", "Requests", ["route"])
+        counter.inc(route='/r/"x"')
+        counter.inc(2, route='/r/"x"')
+
+        assert counter.render() == (
+            "# HELP requests Requests\n"
+            "# TYPE requests counter\n"
+            'requests_total{route="/r/\\"x\\""} 3.0'
+        )
+
+    def test_renders_cumulative_histogram_buckets(self) -> None:
+        histogram = Histogram("latency", "Latency", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        rendered = histogram.render()
+
+        assert 'latency_bucket{le="0.1"} 1' in rendered
+        assert 'latency_bucket{le="1.0"} 2' in rendered
+        assert 'latency_bucket{le="+Inf"} 3' in rendered
+        assert "latency_count 3" in rendered
+        assert "latency_sum 5.55" in rendered
+
+
+class TestMetricsEndpoint:
+    """Ресурс /metrics"""
+
+    async def test_counts_requests_by_route_template(
+        self, client: AsyncClient, link: URL
+    ) -> None:
+        labels = {"method": "GET", "route": "/api/links/{link_id}", "status": "200"}
+        before = http_requests.get(**labels)
+
+        await client.get(f"/api/links/{link.id}")
+        response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert http_requests.get(**labels) == before + 1
+        assert 'route="/api/links/{link_id}"' in response.text
+        assert "http_request_duration_seconds_bucket" in response.text
+
+    async def test_counts_database_queries(self, async_engine: AsyncEngine) -> None:
+        instrument_engine(async_engine.sync_engine, "test")
+
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+        assert db_queries.get(engine="test", operation="SELECT") == 1
@@ -0,0 +1,160 @@
+import cProfile
+import pstats
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.main import app
+from app.metrics import instrument_engine
+from app.models import URL
+from app.profiling import ProfileStore, ProfilingMiddleware
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> ProfileStore:
+    return ProfileStore(tmp_path / "profiles", max_profiles=2)
+
+
+@pytest.fixture
+async def profiled_client(
+    client: AsyncClient, store: ProfileStore
+) -> AsyncIterator[AsyncClient]:
+    """Клиент приложения за middleware профилирования с известным секретом"""
+    middleware = ProfilingMiddleware(app, store, secret=SECRET, sample_rate=0)
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://test"
+    ) as profiled_client:
+        yield profiled_client
+
+
+class TestProfilingMiddleware:
+    """Профилирование отдельных запросов"""
+
+    async def test_profiles_request_with_secret_header(
+        self,
+        profiled_client: AsyncClient,
+        store: ProfileStore,
+        async_engine: AsyncEngine,
+        link: URL,
+    ) -> None:
+        # Тестовый движок, в отличие от движков приложения, создаётся без учёта запросов
+        instrument_engine(async_engine.sync_engine, "test")
+
+        response = await profiled_client.get(
+            "/api/links", headers={"X-Profile": SECRET}
+        )
+
+        assert response.status_code == 200
+        summary = store.get(response.headers["X-Profile-Id"])
+        assert summary is not None
+        assert summary["path"] == "/api/links"
+        assert summary["status"] == 200
+        assert summary["query_count"] == len(summary["queries"]) > 0
+        assert "FROM url" in summary["queries"][0]["statement"]
+        assert "cumulative" in summary["stats"]
+
+    async def test_profiles_request_with_query_flag(
+        self, profiled_client: AsyncClient, store: ProfileStore
+    ) -> None:
+        response = await profiled_client.get("/ping", params={"profile": SECRET})
+
+        assert store.get(response.headers["X-Profile-Id"]) is not None
+
+    async def test_ignores_wrong_secret(
+        self, profiled_client: AsyncClient, store: ProfileStore
+    ) -> None:
+        response = await profiled_client.get("/ping", headers={"X-Profile": "wrong"})
+
+        assert "X-Profile-Id" not in response.headers
+        assert store.summaries() == []
+
+    async def test_samples_requests(
+        self, client: AsyncClient, store: ProfileStore
+    ) -> None:
+        sampled = ProfilingMiddleware(
+            app, store, secret="", sample_rate=0.5, random=lambda: 0.1
+        )
+        skipped = ProfilingMiddleware(
+            app, store, secret="", sample_rate=0.5, random=lambda: 0.9
+        )
+
+        for middleware in (sampled, skipped):
+            async with AsyncClient(
+                transport=ASGITransport(app=middleware), base_url="http://test"
+            ) as sampled_client:
+                await sampled_client.get("/ping")
+
+        assert [summary["trigger"] for summary in store.summaries()] == ["sample"]
+
+
+class TestProfileStore:
+    """Кольцо профилей на диске"""
+
+    @staticmethod
+    def save(store: ProfileStore, profile_id: str) -> None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sum(range(10))
+        profiler.disable()
+        store.save(profiler, {"id": profile_id, "queries": []})
+
+    def test_keeps_latest_profiles(self, store: ProfileStore) -> None:
+        ids = [f"20240101T00000000000{number}-0000000{number}" for number in range(3)]
+        for profile_id in ids:
+            self.save(store, profile_id)
+
+        assert [summary["id"] for summary in store.summaries()] == ids[:0:-1]
+        assert store.stats_path(ids[0]) is None
+        assert pstats.Stats(str(store.stats_path(ids[2]))).total_calls > 0
+
+    def test_rejects_paths_outside_directory(self, store: ProfileStore) -> None:
+        assert store.get("../../etc/passwd") is None
+        assert store.stats_path("../profiles") is None
+
+
+class TestProfilesEndpoints:
+    """Ресурсы /debug/profiles"""
+
+    @pytest.fixture(autouse=True)
+    def configure(self, monkeypatch: pytest.MonkeyPatch, store: ProfileStore) -> None:
+        monkeypatch.setattr("app.main.PROFILE_SECRET", SECRET)
+        monkeypatch.setattr("app.main.profile_store", store)
+
+    async def test_lists_and_downloads_profiles(
+        self, profiled_client: AsyncClient
+    ) -> None:
+        headers = {"X-Profile": SECRET}
+        profiled = await profiled_client.get("/ping", headers=headers)
+        profile_id = profiled.headers["X-Profile-Id"]
+
+        profiles = await profiled_client.get("/debug/profiles", headers=headers)
+        summary = await profiled_client.get(
+            f"/debug/profiles/{profile_id}", headers=headers
+        )
+        download = await profiled_client.get(
+            f"/debug/profiles/{profile_id}/download", headers=headers
+        )
+
+        assert [item["id"] for item in profiles.json()] == [profile_id]
+        assert "X-Profile-Id" not in profiles.headers
+        assert summary.json()["path"] == "/ping"
+        assert download.status_code == 200
+        assert download.headers["content-type"] == "application/octet-stream"
+
+    async def test_hidden_without_secret(self, client: AsyncClient) -> None:
+        response = await client.get("/debug/profiles")
+
+        assert response.status_code == 404
+
+    async def test_unknown_profile(self, client: AsyncClient) -> None:
+        response = await client.get(
+            "/debug/profiles/20240101T000000000000-00000000",
+            headers={"X-Profile": SECRET},
+        )
+
+        assert response.status_code == 404
@@ -0,0 +1,247 @@
+import os
+import signal
+import socket
+import threading
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from types import FrameType
+
+import pytest
+import uvicorn
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import get_async_database_url
+from app.health import warm_up_pool
+from app.server import Arbiter, parse_args, prepare_environment
+
+# Сколько секунд тестовый рабочий процесс дообрабатывает запросы после SIGTERM
+DRAIN_SECONDS = 0.2
+
+
+class TestWarmUpPool:
+    """Прогрев пула соединений перед приёмом трафика"""
+
+    @staticmethod
+    def database_url(engine: Engine) -> str:
+        return get_async_database_url(engine.url.render_as_string(hide_password=False))
+
+    async def test_opens_all_pool_connections(self, engine: Engine) -> None:
+        async_engine = create_async_engine(self.database_url(engine), pool_size=3)
+        try:
+            assert await warm_up_pool(async_engine) == 3
+            assert async_engine.pool.checkedin() == 3
+        finally:
+            await async_engine.dispose()
+
+    async def test_opens_requested_connections(self, engine: Engine) -> None:
+        async_engine = create_async_engine(self.database_url(engine), pool_size=3)
+        try:
+            assert await warm_up_pool(async_engine, connections=2) == 2
+            assert await warm_up_pool(async_engine, connections=10) == 3
+            assert async_engine.pool.checkedin() == 3
+        finally:
+            await async_engine.dispose()
+
+    async def test_skips_pool_without_persistent_connections(
+        self, engine: Engine
+    ) -> None:
+        async_engine = create_async_engine(
+            self.database_url(engine), poolclass=NullPool
+        )
+        try:
+            assert await warm_up_pool(async_engine) == 0
+        finally:
+            await async_engine.dispose()
+
+
+class TestLauncher:
+    """Настройки многопроцессного запуска"""
+
+    @pytest.fixture(autouse=True)
+    def isolate_environment(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        for name in (
+            "CREATE_TABLES_ON_STARTUP",
+            "REDIRECT_CACHE_SIZE",
+            "SHORT_NAME_FILTER_ENABLED",
+            "WEB_CONCURRENCY",
+        ):
+            monkeypatch.delenv(name, raising=False)
+
+    def test_workers_from_environment(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("WEB_CONCURRENCY", "3")
+
+        assert parse_args([]).workers == 3
+        assert parse_args(["--workers", "2"]).workers == 2
+
+    def test_rejects_zero_workers(self) -> None:
+        with pytest.raises(SystemExit):
+            parse_args(["--workers", "0"])
+
+    def test_tables_are_created_once(self) -> None:
+        prepare_environment(workers=1)
+
+        assert os.environ["CREATE_TABLES_ON_STARTUP"] == "false"
+        assert "SHORT_NAME_FILTER_ENABLED" not in os.environ
+        assert "REDIRECT_CACHE_SIZE" not in os.environ
+
+    def test_process_local_caches_disabled_for_several_workers(self) -> None:
+        prepare_environment(workers=4)
+
+        assert os.environ["SHORT_NAME_FILTER_ENABLED"] == "false"
+        assert os.environ["REDIRECT_CACHE_SIZE"] == "0"
+
+    def test_explicit_cache_settings_are_kept(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("SHORT_NAME_FILTER_ENABLED", "true")
+        monkeypatch.setenv("REDIRECT_CACHE_SIZE", "1000")
+
+        prepare_environment(workers=4)
+
+        assert os.environ["SHORT_NAME_FILTER_ENABLED"] == "true"
+        assert os.environ["REDIRECT_CACHE_SIZE"] == "1000"
+
+
+def fake_worker(
+    directory: Path,
+) -> Callable[[uvicorn.Config, socket.socket, int], None]:
+    """Тело рабочего процесса без приложения для проверки главного процесса
+
+    Процесс отмечает запуск файлом <pid>.started, сообщает о готовности и
+    ждёт SIGTERM, после чего «дообрабатывает запросы» DRAIN_SECONDS секунд
+    и отмечает штатное завершение файлом <pid>.stopped.
+    """
+
+    def run_worker(config: uvicorn.Config, sock: socket.socket, ready_fd: int) -> None:
+        try:
+            stopping: list[int] = []
+
+            def handle_term(signum: int, frame: FrameType | None) -> None:
+                stopping.append(signum)
+
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, handle_term)
+            (directory / f"{os.getpid()}.started").touch()
+            # При первом запуске главный процесс готовности не ждёт
+            try:
+                os.write(ready_fd, b"1")
+            except OSError:
+                pass
+            while not stopping:
+                time.sleep(0.01)
+            time.sleep(DRAIN_SECONDS)
+            (directory / f"{os.getpid()}.stopped").touch()
+        finally:
+            os._exit(0)
+
+    return run_worker
+
+
+class TestArbiter:
+    """Запуск, замена и остановка рабочих процессов главным процессом"""
+
+    @pytest.fixture
+    def directory(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> Iterator[Path]:
+        monkeypatch.setattr("app.server.run_worker", fake_worker(tmp_path))
+        monkeypatch.setattr("app.server.POLL_INTERVAL", 0.05)
+        monkeypatch.setattr("app.server.WORKER_STARTUP_TIMEOUT", 5)
+        monkeypatch.setattr("app.server.SHUTDOWN_MARGIN", 1)
+        handlers = {
+            signum: signal.getsignal(signum)
+            for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        }
+        yield tmp_path
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    @staticmethod
+    def pids(directory: Path, state: str) -> set[int]:
+        return {int(path.stem) for path in directory.glob(f"*.{state}")}
+
+    @classmethod
+    def wait_for_pids(cls, directory: Path, state: str, count: int) -> set[int]:
+        deadline = time.monotonic() + 10
+        while len(pids := cls.pids(directory, state)) < count:
+            assert time.monotonic() < deadline, f"expected {count} {state} workers"
+            time.sleep(0.01)
+        return pids
+
+    @staticmethod
+    def run(arbiter: Arbiter, scenario: Callable[[], None]) -> None:
+        """Запустить главный процесс, управляя им сигналами из сценария
+
+        Главный процесс ставит обработчики сигналов и потому работает
+        в основном потоке, а сценарий — в отдельном. Что бы ни случилось
+        в сценарии, в конце главный процесс получает SIGTERM.
+        """
+        errors: list[BaseException] = []
+
+        def drive() -> None:
+            try:
+                scenario()
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        driver = threading.Thread(target=drive)
+        driver.start()
+        try:
+            arbiter.run()
+        finally:
+            driver.join()
+            arbiter.sock.close()
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def arbiter(workers: int, graceful_timeout: int = 5) -> Arbiter:
+        # Без log_config, чтобы не менять настройки логирования остальных тестов
+        config = uvicorn.Config("app.main:app", log_config=None)
+        return Arbiter(config, socket.socket(), workers, graceful_timeout)
+
+    def test_sigterm_drains_workers(self, directory: Path) -> None:
+        arbiter = self.arbiter(workers=2)
+
+        self.run(arbiter, lambda: self.wait_for_pids(directory, "started", 2))
+
+        started = self.pids(directory, "started")
+        assert len(started) == 2
+        assert self.pids(directory, "stopped") == started
+        assert not arbiter.workers and not arbiter.retiring
+
+    def test_sighup_replaces_workers(self, directory: Path) -> None:
+        arbiter = self.arbiter(workers=2)
+        old: set[int] = set()
+
+        def reload() -> None:
+            old.update(self.wait_for_pids(directory, "started", 2))
+            os.kill(os.getpid(), signal.SIGHUP)
+            self.wait_for_pids(directory, "stopped", 2)
+
+        self.run(arbiter, reload)
+
+        started = self.pids(directory, "started")
+        assert len(started - old) == 2
+        # Старые процессы завершились штатно, новые дожили до остановки
+        assert self.pids(directory, "stopped") == started
+
+    def test_respawns_crashed_worker(self, directory: Path) -> None:
+        arbiter = self.arbiter(workers=2)
+        crashed: list[int] = []
+
+        def crash() -> None:
+            crashed.append(min(self.wait_for_pids(directory, "started", 2)))
+            os.kill(crashed[0], signal.SIGKILL)
+            self.wait_for_pids(directory, "started", 3)
+
+        self.run(arbiter, crash)
+
+        started = self.pids(directory, "started")
+        assert len(started) == 3
+        assert self.pids(directory, "stopped") == started - set(crashed)
@@ -0,0 +1,22 @@
+import pytest
+
+from app.short_names import decode_base62, encode_base62
+
+
+class TestBase62:
+    """Кодирование номеров коротких имён"""
+
+    @pytest.mark.parametrize(
+        ("number", "code"), [(0, "0"), (9, "9"), (10, "a"), (61, "Z"), (62, "10")]
+    )
+    def test_encodes_number(self, number: int, code: str) -> None:
+        assert encode_base62(number) == code
+
+    def test_decodes_encoded_number(self) -> None:
+        number = 123456789
+
+        assert decode_base62(encode_base62(number)) == number
+
+    def test_rejects_negative_number(self) -> None:
+        with pytest.raises(ValueError):
+            encode_base62(-1)
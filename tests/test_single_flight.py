@@ -0,0 +1,165 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import get_async_session
+from app.main import app
+from app.models import URL
+from app.repository import AsyncURLRepository
+from app.single_flight import SingleFlight, redirect_lookups, single_flight_shared
+from benchmarks.redirect import redirect_routers
+
+
+class TestSingleFlight:
+    """Объединение одновременных вызовов с одним ключом"""
+
+    async def test_concurrent_calls_share_one_call(self) -> None:
+        lookups: SingleFlight[str, int] = SingleFlight("test")
+        calls = 0
+
+        async def call() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(lookups.do("key", call) for _ in range(10)))
+
+        assert results == [42] * 10
+        assert calls == 1
+        assert len(lookups) == 0
+
+    async def test_different_keys_run_separately(self) -> None:
+        lookups: SingleFlight[str, str] = SingleFlight("test")
+
+        async def call(key: str) -> str:
+            await asyncio.sleep(0)
+            return key
+
+        results = await asyncio.gather(
+            lookups.do("a", lambda: call("a")), lookups.do("b", lambda: call("b"))
+        )
+
+        assert results == ["a", "b"]
+
+    async def test_error_reaches_all_callers(self) -> None:
+        lookups: SingleFlight[str, int] = SingleFlight("test")
+
+        async def call() -> int:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("database is down")
+
+        results = await asyncio.gather(
+            *(lookups.do("key", call) for _ in range(3)), return_exceptions=True
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(lookups) == 0
+
+    async def test_result_is_not_kept(self) -> None:
+        lookups: SingleFlight[str, int] = SingleFlight("test")
+        calls = 0
+
+        async def call() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await lookups.do("key", call) == 1
+        assert await lookups.do("key", call) == 2
+
+    async def test_cancelled_caller_does_not_cancel_others(self) -> None:
+        lookups: SingleFlight[str, int] = SingleFlight("test")
+
+        async def call() -> int:
+            await asyncio.sleep(0.02)
+            return 42
+
+        first = asyncio.create_task(lookups.do("key", call))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(lookups.do("key", call))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == 42
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+
+class TestRedirectCoalescing:
+    """Одновременные редиректы одного имени"""
+
+    async def test_concurrent_redirects_run_one_query(
+        self, client: AsyncClient, connection: AsyncConnection, link: URL
+    ) -> None:
+        queries: list[str] = []
+
+        @event.listens_for(connection.sync_connection, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, many) -> None:
+            queries.append(statement)
+
+        responses = await asyncio.gather(
+            *(
+                client.get(f"/r/{link.short_name}", follow_redirects=False)
+                for _ in range(20)
+            )
+        )
+
+        assert [response.status_code for response in responses] == [307] * 20
+        assert len(queries) == 1
+        assert len(redirect_lookups) == 0
+
+    async def test_cancelled_leader_does_not_fail_followers(
+        self,
+        client: AsyncClient,
+        connection: AsyncConnection,
+        monkeypatch: pytest.MonkeyPatch,
+        link: URL,
+    ) -> None:
+        started, release = asyncio.Event(), asyncio.Event()
+        load = AsyncURLRepository.load_redirect_target
+
+        async def slow_load(self: AsyncURLRepository, short_name: str):
+            started.set()
+            await release.wait()
+            return await load(self, short_name)
+
+        async def request_session() -> AsyncIterator[AsyncSession]:
+            # Сессия запроса после его завершения больше не может читать
+            session = AsyncSession(
+                bind=connection, join_transaction_mode="create_savepoint"
+            )
+            try:
+                yield session
+            finally:
+                await session.close()
+                session.sync_session.bind = None
+
+        monkeypatch.setattr(AsyncURLRepository, "load_redirect_target", slow_load)
+        app.dependency_overrides[get_async_session] = request_session
+        path = f"/r/{link.short_name}"
+
+        async with AsyncClient(
+            transport=ASGITransport(app=redirect_routers()["legacy"]),
+            base_url="http://test",
+        ) as legacy_client:
+            leader = asyncio.create_task(legacy_client.get(path))
+            await started.wait()
+            shared = single_flight_shared.get(group="redirect")
+            followers = [asyncio.create_task(legacy_client.get(path)) for _ in range(3)]
+            # Ведомые запросы дождались чтения, которое запустил ведущий
+            while single_flight_shared.get(group="redirect") < shared + 3:
+                await asyncio.sleep(0.001)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            release.set()
+            responses = await asyncio.gather(*followers)
+
+        assert [response.status_code for response in responses] == [307] * 3
+        assert len(redirect_lookups) == 0
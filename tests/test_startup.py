@@ -0,0 +1,217 @@
+import logging
+from collections.abc import Awaitable, Callable, Iterator
+
+import pytest
+from sqlalchemy import Engine, create_engine, delete, inspect, text
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import database
+from app.cache import LRUCache, RedirectTarget
+from app.database import create_db_and_tables, schema_fingerprint
+from app.health import app_startup_phase, startup_phase
+from app.indexes import create_missing_indexes
+from app.models import URL, URL_VERSION_ID, SchemaVersion, URLVersion
+from app.preload import preload_redirects
+from app.repository import AsyncURLRepository
+from tests.conftest import TEST_DATABASE_URL
+
+# Таблица url в том виде, в каком она была до появления новых столбцов
+BASELINE_URL_TABLE = """
+CREATE TABLE url (
+    original_url varchar(2048) NOT NULL,
+    id serial PRIMARY KEY,
+    short_name varchar(50) NOT NULL,
+    created_at timestamp NOT NULL
+);
+CREATE UNIQUE INDEX ix_url_short_name ON url (short_name);
+INSERT INTO url (original_url, short_name, created_at)
+VALUES ('https://old.example.com', 'old', '2024-01-01');
+"""
+
+
+class TestSchema:
+    """Создание схемы только при изменении моделей"""
+
+    @pytest.fixture(autouse=True)
+    def forget_fingerprint(self, engine: Engine) -> Iterator[None]:
+        yield
+        with Session(engine) as session:
+            session.exec(delete(SchemaVersion))
+            session.commit()
+
+    def test_fingerprint_is_stable(self) -> None:
+        assert schema_fingerprint() == schema_fingerprint()
+        assert len(schema_fingerprint()) == 64
+
+    def test_ddl_skipped_when_schema_is_current(self, engine: Engine) -> None:
+        assert create_db_and_tables(engine) is True
+        assert create_db_and_tables(engine) is False
+
+        with Session(engine) as session:
+            stored = session.get(SchemaVersion, 1)
+        assert stored is not None
+        assert stored.fingerprint == schema_fingerprint()
+
+    def test_ddl_runs_after_model_change(
+        self, engine: Engine, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        create_db_and_tables(engine)
+        monkeypatch.setattr(database, "schema_fingerprint", lambda: "changed")
+
+        assert create_db_and_tables(engine) is True
+        assert create_db_and_tables(engine) is False
+
+
+class TestSchemaUpgrade:
+    """Создание схемы поверх таблицы url, созданной прежней версией"""
+
+    UPGRADE_SCHEMA = "upgrade_test"
+
+    @pytest.fixture
+    def old_engine(self, engine: Engine) -> Iterator[Engine]:
+        """Движок, работающий в отдельной схеме с исходной таблицей url"""
+        with engine.begin() as connection:
+            connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {self.UPGRADE_SCHEMA} CASCADE")
+            )
+            connection.execute(text(f"CREATE SCHEMA {self.UPGRADE_SCHEMA}"))
+        old_engine = create_engine(
+            TEST_DATABASE_URL,
+            connect_args={"options": f"-csearch_path={self.UPGRADE_SCHEMA}"},
+        )
+        with old_engine.begin() as connection:
+            connection.execute(text(BASELINE_URL_TABLE))
+        yield old_engine
+        old_engine.dispose()
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {self.UPGRADE_SCHEMA} CASCADE"))
+
+    def test_adds_missing_columns(self, old_engine: Engine) -> None:
+        create_db_and_tables(old_engine)
+
+        columns = {
+            column["name"]
+            for column in inspect(old_engine).get_columns(
+                "url", schema=self.UPGRADE_SCHEMA
+            )
+        }
+        assert {"click_count", "last_accessed_at"} <= columns
+
+        with Session(old_engine) as session:
+            clicks = session.exec(
+                select(URL.click_count, URL.last_accessed_at).where(
+                    URL.short_name == "old"
+                )
+            ).one()
+        assert tuple(clicks) == (0, None)
+
+    def test_upgraded_table_is_usable(self, old_engine: Engine) -> None:
+        create_db_and_tables(old_engine)
+
+        columns = {
+            column["name"]
+            for column in inspect(old_engine).get_columns(
+                "url", schema=self.UPGRADE_SCHEMA
+            )
+        }
+        assert set(URL.__table__.columns.keys()) <= columns
+
+        with Session(old_engine) as session:
+            old_link = session.exec(select(URL).where(URL.short_name == "old")).one()
+            assert old_link.updated_at is not None
+            version = session.get(URLVersion, URL_VERSION_ID)
+            assert version is not None
+
+            old_link.original_url = "https://new.example.com"
+            session.add(old_link)
+            session.commit()
+            session.refresh(version)
+            assert version.version == 1
+
+    def index_names(self, engine: Engine) -> set[str]:
+        """Имена индексов таблицы url в схеме теста"""
+        return {
+            index["name"]
+            for index in inspect(engine).get_indexes("url", schema=self.UPGRADE_SCHEMA)
+        }
+
+    def test_startup_does_not_index_existing_table(self, old_engine: Engine) -> None:
+        create_db_and_tables(old_engine)
+
+        assert "ix_url_created_at" not in self.index_names(old_engine)
+
+    def test_creates_missing_indexes_concurrently(
+        self, old_engine: Engine, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        create_db_and_tables(old_engine)
+        with old_engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_url_created_at ON url (id)"))
+            connection.execute(
+                text(
+                    "UPDATE pg_index SET indisvalid = false WHERE indexrelid = "
+                    "'ix_url_created_at'::regclass"
+                )
+            )
+
+        with caplog.at_level(logging.INFO, logger="app.indexes"):
+            created = create_missing_indexes(old_engine)
+
+        assert {"ix_url_created_at", "ix_url_expires_at"} <= set(created)
+        assert {index.name for index in URL.__table__.indexes} - {
+            "ix_url_original_url_trgm"
+        } <= self.index_names(old_engine)
+        assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_url_expires_at" in (
+            caplog.text
+        )
+        assert "Rebuilding invalid index ix_url_created_at" in caplog.text
+        with old_engine.connect() as connection:
+            definition = connection.scalar(
+                text("SELECT pg_get_indexdef('ix_url_created_at'::regclass)")
+            )
+        assert "(created_at)" in definition
+
+        assert create_missing_indexes(old_engine) == created
+
+
+class TestPreloadRedirects:
+    """Загрузка самых посещаемых ссылок в кэш редиректов"""
+
+    async def test_loads_most_clicked_links(
+        self,
+        db_session: AsyncSession,
+        create_link: Callable[..., Awaitable[URL]],
+    ) -> None:
+        links = [await create_link() for _ in range(4)]
+        for clicks, link in zip((5, 0, 9, 1), links, strict=True):
+            link.click_count = clicks
+            db_session.add(link)
+        await db_session.commit()
+        cache: LRUCache[str, RedirectTarget] = LRUCache(maxsize=100, ttl=60)
+
+        loaded = await preload_redirects(cache, AsyncURLRepository(db_session), 2)
+
+        assert loaded == 2
+        assert cache.get(links[2].short_name) == RedirectTarget(links[2].original_url)
+        assert cache.get(links[0].short_name) == RedirectTarget(links[0].original_url)
+        assert cache.get(links[3].short_name) is None
+
+    async def test_limited_by_cache_size(
+        self, db_session: AsyncSession, links: list[URL]
+    ) -> None:
+        cache: LRUCache[str, RedirectTarget] = LRUCache(maxsize=1, ttl=60)
+
+        assert await preload_redirects(cache, AsyncURLRepository(db_session), 10) == 1
+        assert len(cache) == 1
+
+
+class TestStartupPhase:
+    """Замер этапов запуска"""
+
+    def test_logs_and_records_duration(self, caplog: pytest.LogCaptureFixture) -> None:
+        with caplog.at_level(logging.INFO, logger="uvicorn.error"):
+            with startup_phase("test"):
+                pass
+
+        assert "Startup phase test took" in caplog.text
+        assert app_startup_phase.get(phase="test") >= 0